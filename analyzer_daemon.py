@@ -0,0 +1,286 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+from metrics import REGISTRY
+
+CONNECT_TIMEOUT_SECONDS = 1.0
+# Environment variables the analysis reads; each job runs with the submitting client's values
+JOB_ENV_PREFIXES = (
+    "OPENAI_", "LLM_", "LOCAL_LLM_", "USE_LOCAL_LLM", "PROMPT_", "JFR_", "REPORT_", "STACK_PROFILE_", "HF_",
+    "TRANSFORMERS_")
+# Settings of process-wide objects the daemon keeps warm (response cache, batch scheduler,
+# local model pool); a job asking for other values is declined and runs in the client instead
+PROCESS_ENV_KEYS = (
+    "LLM_CACHE_PATH", "LLM_CACHE_MAX_MB", "LLM_CACHE_TTL_HOURS", "LOCAL_LLM_BATCH_SIZE", "LOCAL_LLM_BATCH_WAIT_MS",
+    "LOCAL_LLM_POOL_SIZE", "LOCAL_LLM_POOL_MEMORY_MB")
+
+
+def default_socket_path():
+    """$JFR_ANALYZER_SOCKET, or daemon.sock next to the parse and LLM caches."""
+    return os.getenv("JFR_ANALYZER_SOCKET") or os.path.join(
+        os.path.expanduser("~"), ".cache", "llm_jfr_analyzer", "daemon.sock")
+
+
+def job_environment(environ=None):
+    """The JOB_ENV_PREFIXES variables of `environ` (default: os.environ)."""
+    environ = os.environ if environ is None else environ
+    return {key: value for key, value in environ.items() if key.startswith(JOB_ENV_PREFIXES)}
+
+
+def _connect(socket_path):
+    """A connected socket to a live daemon, or None if there is none (or no Unix sockets)."""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def _request(sock, message):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+    return sock.makefile("r", encoding="utf-8")
+
+
+def submit(argv, cwd=None, socket_path=None, stdout=None, stderr=None, env=None):
+    """
+    Runs `main.py <argv>` inside a running daemon, relaying its output as it is produced.
+    Returns the job's exit status, or None when no daemon is listening or it declined the job
+    (run in-process then). Relative paths in argv are resolved against `cwd`, and the job sees
+    `env` (default: this process's job_environment()) instead of the daemon's own settings.
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    sock = _connect(socket_path or default_socket_path())
+    if sock is None:
+        return None
+    with sock:
+        replies = _request(sock, {
+            "command": "run", "argv": list(argv), "cwd": cwd or os.getcwd(),
+            "env": job_environment() if env is None else dict(env)})
+        for line in replies:
+            reply = json.loads(line)
+            if "declined" in reply:
+                stderr.write(f"Analyzer daemon not used: {reply['declined']}\n")
+                return None
+            if "out" in reply:
+                stdout.write(reply["out"])
+                stdout.flush()
+            elif "err" in reply:
+                stderr.write(reply["err"])
+                stderr.flush()
+            elif "exit" in reply:
+                return reply["exit"]
+    stderr.write("Analyzer daemon closed the connection before the job finished\n")
+    return 1
+
+
+def stop(socket_path=None):
+    """Asks a running daemon to exit; returns False if none is listening."""
+    sock = _connect(socket_path or default_socket_path())
+    if sock is None:
+        return False
+    with sock:
+        _request(sock, {"command": "stop"}).readline()
+    return True
+
+
+class _ReplyStream(io.TextIOBase):
+    """File-like object that forwards writes to the client as {"out"|"err": text} lines."""
+
+    def __init__(self, send, key):
+        self._send = send
+        self._key = key
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self._send({self._key: text})
+        return len(text)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        send_lock = threading.Lock()
+
+        def send(message):
+            with send_lock:
+                try:
+                    self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                except OSError:
+                    # The client went away; let the job finish so caches are still filled
+                    pass
+
+        command = request.get("command")
+        if command == "run":
+            env = request.get("env")
+            declined = self.server.analyzer.conflicting_settings(env)
+            if declined:
+                send({"declined": f"it was started with different {', '.join(declined)}"})
+            else:
+                send({"exit": self.server.analyzer.run_job(request["argv"], request["cwd"], send, env)})
+        elif command == "stop":
+            send({"stopped": os.getpid()})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            send({"err": f"Unknown command: {command}\n"})
+            send({"exit": 2})
+
+
+class AnalyzerDaemon:
+    """
+    Long-lived process that runs CLI jobs with the pipeline modules already imported and the
+    local model pool, parse cache and LLM cache warm between runs.
+
+    Jobs run one at a time: each gets the client's working directory and environment (the
+    JOB_ENV_PREFIXES variables, restored afterwards) and has its stdout/stderr streamed back
+    over the socket, all of which are process-wide. They still use the parallelism inside a
+    job (--workers, --parseprocs, batched inference). Jobs whose PROCESS_ENV_KEYS differ from
+    the daemon's are declined, since the warm objects those configure can't change per job.
+    """
+
+    def __init__(self, socket_path=None, warmup_models=()):
+        self.socket_path = socket_path or default_socket_path()
+        self.warmup_models = list(warmup_models)
+        self._job_lock = threading.Lock()
+        self._server = None
+        self._process_env = {}
+
+    def preload(self):
+        import main  # noqa: F401
+        import event_store  # noqa: F401
+        import feature_extractor  # noqa: F401
+        import jfr_parser  # noqa: F401
+        import jinja2  # noqa: F401
+        import llm_prompter
+        if self.warmup_models:
+            print(f"Warming up local LLMs: {', '.join(self.warmup_models)}")
+            llm_prompter.warm_up_local_llms(self.warmup_models)
+
+    def conflicting_settings(self, env):
+        """PROCESS_ENV_KEYS whose value in a job's `env` differs from the daemon's."""
+        if env is None:
+            return []
+        return [key for key in PROCESS_ENV_KEYS if env.get(key) != self._process_env.get(key)]
+
+    def run_job(self, argv, cwd, send, env=None):
+        import main
+
+        with self._job_lock:
+            previous = os.getcwd()
+            saved_env = dict(os.environ)
+            REGISTRY.reset()
+            out, err = _ReplyStream(send, "out"), _ReplyStream(send, "err")
+            try:
+                if env is not None:
+                    for key in job_environment():
+                        del os.environ[key]
+                    os.environ.update(env)
+                with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                    os.chdir(cwd)
+                    main.execute(main.build_parser().parse_args(argv))
+                return 0
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    return e.code or 0
+                err.write(f"{e.code}\n")
+                return 1
+            except Exception:
+                err.write(traceback.format_exc())
+                return 1
+            finally:
+                os.chdir(previous)
+                # Nothing a job sets (main.run sets USE_LOCAL_LLM, for one) carries over
+                os.environ.clear()
+                os.environ.update(saved_env)
+
+    def serve_forever(self):
+        if _connect(self.socket_path) is not None:
+            raise RuntimeError(f"An analyzer daemon is already listening on {self.socket_path}")
+        if os.path.exists(self.socket_path):
+            # Left behind by a daemon that didn't shut down cleanly
+            os.remove(self.socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        self.preload()
+        self._process_env = {key: os.environ[key] for key in PROCESS_ENV_KEYS if key in os.environ}
+        # Jobs can read any file this user can, so only this user may submit them: the socket
+        # is created with mode 0600 rather than restricted after bind
+        umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, _Handler)
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+        self._server.analyzer = self
+        print(f"Analyzer daemon {os.getpid()} listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Keep the JFR analyzer warm; main.py submits its jobs here while this runs")
+    parser.add_argument(
+        '--socket', type=str, default=None,
+        help='Unix socket to listen on (default: $JFR_ANALYZER_SOCKET or ~/.cache/llm_jfr_analyzer/daemon.sock)')
+    parser.add_argument(
+        '--warmup', type=str, default=None,
+        help='Comma-separated local models to load at startup, or 1 for $LOCAL_LLM_MODEL (default: $LOCAL_LLM_WARMUP)')
+    parser.add_argument('--stop', action="store_true", help="Stop the running daemon")
+    args = parser.parse_args(argv)
+
+    if not hasattr(socket, "AF_UNIX"):
+        parser.error("The analyzer daemon needs Unix domain sockets")
+    if args.stop:
+        if not stop(args.socket):
+            print("No analyzer daemon is running.")
+            return 1
+        print("Analyzer daemon stopped.")
+        return 0
+    from dotenv import load_dotenv
+    from main import SUPPORTED_LLM_MODELS
+
+    load_dotenv()
+    requested = (args.warmup if args.warmup is not None else os.getenv("LOCAL_LLM_WARMUP", "")).strip()
+    models = []
+    if requested.lower() in ("1", "true", "yes"):
+        models = [os.getenv("LOCAL_LLM_MODEL", SUPPORTED_LLM_MODELS[0][0])]
+    elif requested.lower() not in ("", "0", "false", "no"):
+        models = [m.strip() for m in requested.split(",") if m.strip()]
+    try:
+        AnalyzerDaemon(args.socket, warmup_models=models).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_BATCH_WAIT_MS = 50
+
+
+class _Request:
+    __slots__ = ("prompt", "future", "enqueued_at")
+
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchScheduler:
+    """
+    In-process dynamic batching for local model inference.
+
+    Concurrent callers submit single prompts; a dispatcher thread groups pending prompts for
+    the same model and generation params into batches of up to `max_batch_size`, waiting at
+    most `max_wait_ms` after the oldest prompt arrived for the batch to fill, and then runs
+    run_batch(model_name, prompts, **params) -> list of completions. Each caller gets its own
+    completion (or the batch's exception) back through a Future.
+    Defaults come from LOCAL_LLM_BATCH_SIZE and LOCAL_LLM_BATCH_WAIT_MS.
+    """
+
+    def __init__(self, run_batch, max_batch_size=None, max_wait_ms=None):
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("LOCAL_LLM_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("LOCAL_LLM_BATCH_WAIT_MS", DEFAULT_BATCH_WAIT_MS))
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._run_batch = run_batch
+        self._groups = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes = Counter()
+
+    def _ensure_dispatcher(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch, name="llm-batch-scheduler", daemon=True)
+            self._thread.start()
+
+    def submit(self, model_name, prompt, **params):
+        """Queues one prompt and returns a Future resolving to its completion."""
+        request = _Request(prompt)
+        key = (model_name, json.dumps(params, sort_keys=True))
+        with self._cond:
+            self._ensure_dispatcher()
+            self._groups.setdefault(key, deque()).append(request)
+            self._queue_depth += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+            self._cond.notify_all()
+        return request.future
+
+    def generate(self, model_name, prompt, **params):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(model_name, prompt, **params).result()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._groups:
+                self._cond.wait()
+            # Serve the group whose oldest prompt has waited longest
+            key = min(self._groups, key=lambda k: self._groups[k][0].enqueued_at)
+            group = self._groups[key]
+            deadline = group[0].enqueued_at + self.max_wait
+            while len(group) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [group.popleft() for _ in range(min(len(group), self.max_batch_size))]
+            if not group:
+                del self._groups[key]
+            self._queue_depth -= len(batch)
+            self._batches += 1
+            self._requests += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            return key, batch
+
+    def _dispatch(self):
+        while True:
+            (model_name, params_json), batch = self._next_batch()
+            try:
+                results = self._run_batch(model_name, [r.prompt for r in batch], **json.loads(params_json))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch of {len(batch)} prompts returned {len(results)} results")
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            for r, result in zip(batch, results):
+                r.future.set_result(result)
+
+    def stats(self):
+        """Queue depth and batch-size statistics since startup."""
+        with self._cond:
+            return {
+                "queue_depth": self._queue_depth,
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "requests": self._requests,
+                "mean_batch_size": self._requests / self._batches if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
@@ -0,0 +1,188 @@
+import glob
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from report_generator import write_report
+
+RECORDING_EXTENSIONS = (".jfr", ".json")
+DEFAULT_LLM_CONCURRENCY = 4
+
+
+def discover_recordings(patterns):
+    """
+    Expands directories (their .jfr/.json files, non-recursively) and glob patterns into a
+    sorted, de-duplicated list of recording paths.
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern) or ([pattern] if os.path.exists(pattern) else [])
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(RECORDING_EXTENSIONS):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+class RateLimiter:
+    """Spaces calls at least 60/requests_per_minute seconds apart; 0 or None disables it."""
+
+    def __init__(self, requests_per_minute=None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def summarize_recording(jfr_path, options):
+    """
+    Parse + feature extraction for one recording; runs in a pool worker process.
+    `options` holds the CLI parsing options (chunkthresh, workers, native, columnar, cachedir,
+    nocache, events, categories, fields, autoselect, memorybudget, window, time_from, time_to).
+    """
+    from event_selection import resolve_selection
+    from jfr_parser import iter_jfr_events
+    from parse_cache import ParseCache
+    from feature_extractor import extract_features, extract_features_columnar
+
+    cache = None if options.get("nocache") else ParseCache(cache_dir=options.get("cachedir"))
+    events = iter_jfr_events(
+        jfr_path, chunking_threshold_mb=options.get("chunkthresh"), workers=options.get("workers", 1),
+        native=options.get("native", False), cache=cache,
+        selection=resolve_selection(
+            events=options.get("events"), categories=options.get("categories"), fields=options.get("fields"),
+            auto=options.get("autoselect", False)))
+    if options.get("window") or options.get("time_from") or options.get("time_to"):
+        from event_store import memory_budget_bytes
+        from time_index import extract_windowed_features
+        return extract_windowed_features(
+            events, window_seconds=options.get("window"), start=options.get("time_from"),
+            end=options.get("time_to"), workers=options.get("workers", 1),
+            memory_budget=memory_budget_bytes(options.get("memorybudget")))
+    if options.get("columnar"):
+        from event_store import memory_budget_bytes
+        return extract_features_columnar(events, memory_budget=memory_budget_bytes(options.get("memorybudget")))
+    return extract_features(events)
+
+
+def report_path_for(output_dir, jfr_path, taken):
+    """Report file for a recording, disambiguating recordings that share a base name."""
+    name = os.path.splitext(os.path.basename(jfr_path))[0]
+    candidate = name
+    n = 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{name}_{n}"
+    taken.add(candidate)
+    return os.path.join(output_dir, f"{candidate}.md")
+
+
+class BatchPipeline:
+    """
+    Analyzes many recordings as a three-stage pipeline: parsing and feature extraction run
+    on a process pool (`parse_workers` processes), LLM analysis on `llm_concurrency` threads
+    sharing this process's model pool and response cache, and OpenAI calls are spaced by a
+    RateLimiter (local models are not rate limited). LLM errors fail the recording rather
+    than becoming its report. At most `max_in_flight` recordings are between parse start and report
+    write at any time, which bounds the queues between stages. A failure in any stage only
+    fails that recording. Writes one report per recording plus index.md and index.json.
+    """
+
+    def __init__(self, output_dir, options=None, parse_workers=None, llm_concurrency=None,
+                 max_in_flight=None, requests_per_minute=None, analyze=None, summarize=None, use_local=None):
+        from llm_prompter import analyze_with_llm
+
+        if use_local is None:
+            use_local = os.getenv("USE_LOCAL_LLM", "0").lower() in ("1", "true", "yes")
+        self.output_dir = output_dir
+        self.options = options or {}
+        self.parse_workers = max(1, parse_workers or os.cpu_count() or 1)
+        self.llm_concurrency = max(1, llm_concurrency or DEFAULT_LLM_CONCURRENCY)
+        self.max_in_flight = max(1, max_in_flight or 2 * (self.parse_workers + self.llm_concurrency))
+        self.rate_limiter = RateLimiter(None if use_local else requests_per_minute)
+        self.analyze = analyze or (lambda summary: analyze_with_llm(summary, raise_errors=True))
+        self.summarize = summarize or summarize_recording
+
+    def run(self, jfr_paths, progress=print):
+        os.makedirs(self.output_dir, exist_ok=True)
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        taken = set()
+        results = [
+            {"recording": path, "report": report_path_for(self.output_dir, path, taken), "status": "pending"}
+            for path in jfr_paths
+        ]
+        started = time.time()
+
+        def finish(result, status, error=None):
+            result["status"] = status
+            result["error"] = error
+            result["seconds"] = round(time.time() - result["started"], 3)
+            del result["started"]
+            slots.release()
+            progress(f"[{status}] {result['recording']}" + (f": {error}" if error else ""))
+
+        def analyze(result, summary):
+            try:
+                self.rate_limiter.acquire()
+                findings = self.analyze(summary)
+                write_report(findings, result["report"])
+                finish(result, "done")
+            except Exception as e:
+                traceback.print_exc()
+                finish(result, "failed", f"analysis: {e}")
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as parse_pool, \
+                ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="jfr-batch-llm") as llm_pool:
+
+            def parsed(result, future):
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    finish(result, "failed", f"parsing: {e}")
+                    return
+                llm_pool.submit(analyze, result, summary)
+
+            for result in results:
+                slots.acquire()
+                result["started"] = time.time()
+                future = parse_pool.submit(self.summarize, result["recording"], self.options)
+                future.add_done_callback(lambda f, result=result: parsed(result, f))
+            # Wait until every recording has released its slot
+            for _ in range(self.max_in_flight):
+                slots.acquire()
+
+        self.write_index(results, time.time() - started)
+        return results
+
+    def write_index(self, results, elapsed):
+        with open(os.path.join(self.output_dir, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"elapsed_seconds": round(elapsed, 3), "recordings": results}, f, indent=2)
+        done = sum(1 for r in results if r["status"] == "done")
+        lines = [
+            "# JFR Batch Analysis",
+            "",
+            f"{done} of {len(results)} recordings analyzed in {elapsed:.1f}s.",
+            "",
+            "| Recording | Status | Seconds | Report |",
+            "|---|---|---|---|",
+        ]
+        for r in results:
+            report = f"[{os.path.basename(r['report'])}]({os.path.basename(r['report'])})" if r["status"] == "done" else ""
+            status = r["status"] if not r.get("error") else f"{r['status']}: {r['error']}"
+            lines.append(f"| {r['recording']} | {status.replace('|', '/')} | {r.get('seconds', '')} | {report} |")
+        with open(os.path.join(self.output_dir, "index.md"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
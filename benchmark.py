@@ -0,0 +1,194 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+STAGES = ("parse", "features", "columnar", "windows", "prompt", "llm")
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.2
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _FakePipeline:
+    """Stands in for a HuggingFace text-generation pipeline so the LLM stage runs offline."""
+
+    def __call__(self, prompt, **kwargs):
+        return [{"generated_text": prompt + "\n1. Long GC pauses.\n2. Threads stuck in JDBC calls."}]
+
+
+def _run_stage(stage, path, summary):
+    """Runs one stage; returns the number of events it processed (None if not event-based)."""
+    from jfr_parser import iter_jfr_events
+
+    if stage == "parse":
+        return sum(1 for _ in iter_jfr_events(path))
+    if stage == "features":
+        from feature_extractor import StreamingAggregator
+        return StreamingAggregator().update(iter_jfr_events(path)).num_events
+    if stage == "columnar":
+        from event_store import build_event_table
+        from feature_extractor import compute_columnar_features
+        return compute_columnar_features(build_event_table(iter_jfr_events(path)))["num_events"]
+    if stage == "windows":
+        from time_index import TimeIndex, analyze_windows
+        index = TimeIndex(iter_jfr_events(path))
+        analyze_windows(index, 60, workers=os.cpu_count() or 1)
+        return len(index) + len(index.untimed)
+    if stage == "prompt":
+        from llm_prompter import build_prompt, DEFAULT_LOCAL_PROMPT_TOKENS
+        build_prompt(summary, token_budget=DEFAULT_LOCAL_PROMPT_TOKENS)
+        return None
+    if stage == "llm":
+        from unittest import mock
+        import llm_prompter
+        with mock.patch.object(llm_prompter, "ensure_local_llm", return_value=True), \
+                mock.patch.object(llm_prompter.local_model_pool, "get", return_value=_FakePipeline()):
+            llm_prompter.analyze_with_local_llm(summary, model_name="benchmark/fake", use_cache=False)
+        return None
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _stage_worker(stage, path, summary, conn):
+    try:
+        start = time.perf_counter()
+        events = _run_stage(stage, path, summary)
+        wall = time.perf_counter() - start
+        conn.send({"wall_seconds": wall, "events": events, "peak_rss_mb": _peak_rss_mb()})
+    except Exception as e:
+        conn.send({"error": f"{e.__class__.__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def measure_stage(stage, path, summary=None):
+    """
+    Runs a stage in a freshly spawned interpreter, so its peak RSS is its own, and returns
+    {"wall_seconds", "peak_rss_mb", "events_per_second"}.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_stage_worker, args=(stage, path, summary, child))
+    proc.start()
+    child.close()
+    result = parent.recv()
+    proc.join()
+    if "error" in result:
+        raise RuntimeError(f"Stage {stage} failed: {result['error']}")
+    events = result.pop("events")
+    result["events_per_second"] = events / result["wall_seconds"] if events and result["wall_seconds"] else None
+    return result
+
+
+def run_benchmarks(path, stages=STAGES, repeat=1, progress=print):
+    """Measures each stage `repeat` times on the recording at `path`, keeping the fastest run."""
+    from feature_extractor import extract_features
+    from jfr_parser import iter_jfr_events
+
+    summary = extract_features(iter_jfr_events(path)) if {"prompt", "llm"} & set(stages) else None
+    results = {}
+    for stage in stages:
+        runs = [measure_stage(stage, path, summary) for _ in range(max(1, repeat))]
+        best = min(runs, key=lambda r: r["wall_seconds"])
+        best["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+        results[stage] = best
+        progress(format_result(stage, best))
+    return results
+
+
+def format_result(stage, result):
+    rate = f"{result['events_per_second']:,.0f} events/s" if result.get("events_per_second") else "-"
+    return f"{stage:<10} {result['wall_seconds']:>9.3f}s {result['peak_rss_mb']:>9.1f} MB  {rate}"
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a list of regression messages: stages whose wall time or peak RSS exceeds the
+    baseline by more than `threshold` (a fraction, e.g. 0.2 = 20%).
+    """
+    regressions = []
+    for stage, result in results.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        for metric, unit in (("wall_seconds", "s"), ("peak_rss_mb", " MB")):
+            if base.get(metric) and result[metric] > base[metric] * (1 + threshold):
+                change = result[metric] / base[metric] - 1
+                regressions.append(
+                    f"{stage}: {metric} {result[metric]:.3f}{unit} vs baseline {base[metric]:.3f}{unit} (+{change:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the JFR analysis stages on a synthetic recording")
+    parser.add_argument('--events', type=int, default=100_000, help='Number of synthetic events (default: 100000)')
+    parser.add_argument('--seed', type=int, default=0, help='Generator seed (default: 0)')
+    parser.add_argument('--stackdepth', type=int, default=16, help='Frames per stack trace (default: 16)')
+    parser.add_argument('--input', type=str, default=None, help='Benchmark this recording instead of a synthetic one')
+    parser.add_argument('--keep', type=str, default=None, help='Write the synthetic recording here and keep it')
+    parser.add_argument(
+        '--stages', type=str, default=",".join(STAGES), help=f'Comma-separated stages (default: {",".join(STAGES)})')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage; the fastest is reported (default: 1)')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help=f'Baseline file (default: {DEFAULT_BASELINE})')
+    parser.add_argument('--savebaseline', action="store_true", help='Store these results as the new baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='Flag regressions beyond this fraction of the baseline (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    path = args.input
+    generated = None
+    if path is None:
+        from synthetic_jfr import SyntheticRecording
+        if args.keep:
+            path = args.keep
+        else:
+            fd, path = tempfile.mkstemp(suffix=".json", prefix="synthetic_jfr_")
+            os.close(fd)
+            generated = path
+        print(f"Generating {args.events:,} synthetic events (seed {args.seed}) into {path} ...")
+        SyntheticRecording(args.events, seed=args.seed, stack_depth=args.stackdepth).write(path)
+
+    try:
+        results = run_benchmarks(path, stages, repeat=args.repeat)
+    finally:
+        if generated:
+            os.remove(generated)
+
+    config = {"input": args.input, "events": args.events, "seed": args.seed, "stackdepth": args.stackdepth}
+    status = 0
+    if os.path.exists(args.baseline) and not args.savebaseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"Baseline {args.baseline} was recorded with {baseline.get('config')}; not comparing.")
+        else:
+            regressions = compare(results, baseline.get("stages", {}), args.threshold)
+            for message in regressions:
+                print(f"REGRESSION {message}")
+            if regressions:
+                status = 1
+            else:
+                print(f"No regressions beyond {args.threshold:.0%} of {args.baseline}.")
+    if args.savebaseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "stages": results}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+
+from feature_extractor import QUANTILES, QuantileSketch, StreamingAggregator, render_summary
+
+PROFILE_FORMAT = "jfr-analyzer-profile/1"
+# Methods kept per profile; a method outside a profile's list counts as 0 samples there
+HOT_METHOD_LIMIT = 100
+# A difference is reported only if it is both statistically significant and large enough to matter
+Z_CRITICAL = 3.0
+KS_ALPHA = 0.001
+MIN_RELATIVE_CHANGE = 0.25
+MIN_SHARE_CHANGE = 0.02
+MAX_DIFFERENCES = 15
+
+
+class RecordingProfile:
+    """
+    Compact, mergeable per-recording aggregate for regression comparisons: event counts per
+    type, GC pause and thread event duration sketches, and sample counts of the hottest
+    methods. A few KB of JSON regardless of recording size.
+    """
+
+    def __init__(self, num_events=0, duration_seconds=0.0, time_range=None, event_counts=None,
+                 gc_pauses=None, durations=None, hot_methods=None, samples=0):
+        self.num_events = num_events
+        self.duration_seconds = duration_seconds
+        self.time_range = time_range
+        self.event_counts = dict(event_counts or {})
+        self.gc_pauses = gc_pauses or QuantileSketch()
+        self.durations = durations or QuantileSketch()
+        self.hot_methods = dict(hot_methods or {})
+        self.samples = samples
+
+    @classmethod
+    def from_aggregator(cls, aggregator):
+        lo, hi = aggregator.time_bounds()
+        duration = 0.0
+        if lo is not None:
+            try:
+                duration = (hi - lo).total_seconds()
+            except TypeError:
+                pass
+        return cls(
+            num_events=aggregator.num_events,
+            duration_seconds=duration,
+            time_range=f"{lo} --> {hi}" if lo is not None else None,
+            event_counts={str(t): n for t, n in aggregator.event_counts.items()},
+            gc_pauses=aggregator.gc_pauses,
+            durations=aggregator.thread_durations,
+            hot_methods=dict(aggregator.stacks.hot_methods(HOT_METHOD_LIMIT)),
+            samples=aggregator.stacks.samples,
+        )
+
+    def merge(self, other):
+        """Folds another profile in, e.g. to build a baseline from several recordings."""
+        self.num_events += other.num_events
+        self.duration_seconds += other.duration_seconds
+        for event_type, n in other.event_counts.items():
+            self.event_counts[event_type] = self.event_counts.get(event_type, 0) + n
+        self.gc_pauses.merge(other.gc_pauses)
+        self.durations.merge(other.durations)
+        for method, n in other.hot_methods.items():
+            self.hot_methods[method] = self.hot_methods.get(method, 0) + n
+        self.hot_methods = dict(sorted(self.hot_methods.items(), key=lambda item: -item[1])[:HOT_METHOD_LIMIT])
+        self.samples += other.samples
+        return self
+
+    def to_dict(self):
+        # "format" goes first so a profile file can be told from a recording by its first bytes
+        return {
+            "format": PROFILE_FORMAT,
+            "num_events": self.num_events,
+            "duration_seconds": self.duration_seconds,
+            "time_range": self.time_range,
+            "event_counts": self.event_counts,
+            "gc_pauses": self.gc_pauses.to_dict(),
+            "durations": self.durations.to_dict(),
+            "hot_methods": self.hot_methods,
+            "samples": self.samples,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("format") != PROFILE_FORMAT:
+            raise ValueError(f"Not a recording profile (format {data.get('format')!r})")
+        return cls(
+            num_events=data["num_events"],
+            duration_seconds=data["duration_seconds"],
+            time_range=data["time_range"],
+            event_counts=data["event_counts"],
+            gc_pauses=QuantileSketch.from_dict(data["gc_pauses"]),
+            durations=QuantileSketch.from_dict(data["durations"]),
+            hot_methods=data["hot_methods"],
+            samples=data["samples"],
+        )
+
+    def save(self, path):
+        """Writes the profile as JSON, atomically."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def is_profile_file(path):
+    """True for files written by RecordingProfile.save (as opposed to recordings)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            head = f.read(64)
+    except (OSError, UnicodeDecodeError):
+        return False
+    return head.replace(" ", "").startswith('{"format":"jfr-analyzer-profile')
+
+
+class ProfileStore:
+    """
+    Directory of recording profiles keyed by the recording's content digest, so a recording
+    used as a baseline is parsed once. Lives in $JFR_PROFILE_DIR (default
+    ~/.cache/llm_jfr_analyzer/profiles).
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv("JFR_PROFILE_DIR") or os.path.join(
+            os.path.expanduser("~"), ".cache", "llm_jfr_analyzer", "profiles")
+
+    @staticmethod
+    def key_for(digest, options=None):
+        """Key of the profile of a recording with content `digest`, parsed with `options`."""
+        meta = json.dumps({"digest": digest, "options": options, "format": PROFILE_FORMAT}, sort_keys=True)
+        return hashlib.sha256(meta.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        if not re.fullmatch(r"[0-9a-f]{64}", key or ""):
+            raise ValueError(f"Invalid profile id: {key!r}")
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return RecordingProfile.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable profile {path}: {e}")
+            return None
+
+    def put(self, key, profile):
+        profile.save(self._path(key))
+
+
+def load_baseline(path, build, store=None, options=None):
+    """
+    The profile to compare against. A profile file (see RecordingProfile.save) is loaded as is;
+    for a recording, the stored profile is used, or build(path) makes one and stores it, so a
+    baseline recording is only parsed once. `options` are the parser options it is built with.
+    """
+    if is_profile_file(path):
+        return RecordingProfile.load(path)
+    from parse_cache import file_digest
+
+    store = store or ProfileStore()
+    key = ProfileStore.key_for(file_digest(path), options)
+    profile = store.get(key)
+    if profile is not None:
+        print(f"Using the stored profile of baseline recording {path}")
+        return profile
+    print(f"Profiling baseline recording {path} ...")
+    profile = build(path)
+    store.put(key, profile)
+    return profile
+
+
+def profile_recording(events):
+    """
+    One pass over the events that returns (feature summary text, RecordingProfile), so the
+    profile costs no extra parse.
+    """
+    aggregator = StreamingAggregator().update(events)
+    features = aggregator.features()
+    return render_summary(features, features["num_stuck_threads"]), RecordingProfile.from_aggregator(aggregator)
+
+
+def _rate_z(current, baseline, exposure_current, exposure_baseline):
+    """
+    z-score of `current` events against `baseline` events under equal rates: conditional on
+    their sum, current ~ Binomial(current + baseline, exposure share of current).
+    """
+    n = current + baseline
+    p = exposure_current / (exposure_current + exposure_baseline)
+    if n == 0 or p <= 0 or p >= 1:
+        return 0.0
+    return (current - n * p) / math.sqrt(n * p * (1 - p))
+
+
+def _ks_distance(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic evaluated at the sketches' shared bucket edges."""
+    seen_a, seen_b = a.zero_count, b.zero_count
+    distance = abs(seen_a / a.count - seen_b / b.count)
+    for index in sorted(set(a.buckets) | set(b.buckets)):
+        seen_a += a.buckets.get(index, 0)
+        seen_b += b.buckets.get(index, 0)
+        distance = max(distance, abs(seen_a / a.count - seen_b / b.count))
+    return distance
+
+
+def _relative_change(current, baseline):
+    if not baseline:
+        return math.inf if current else 0.0
+    return current / baseline - 1
+
+
+def _compare_distribution(name, current, baseline):
+    if current.count < 2 or baseline.count < 2 or current.relative_accuracy != baseline.relative_accuracy:
+        return None
+    distance = _ks_distance(current, baseline)
+    n, m = current.count, baseline.count
+    critical = math.sqrt(-math.log(KS_ALPHA / 2) / 2) * math.sqrt((n + m) / (n * m))
+    before = [baseline.quantile(q) for q in QUANTILES]
+    after = [current.quantile(q) for q in QUANTILES]
+    if distance <= critical or max(abs(_relative_change(x, y)) for x, y in zip(after, before)) < MIN_RELATIVE_CHANGE:
+        return None
+    return {
+        "kind": "distribution", "metric": name, "baseline": before, "current": after,
+        "change": _relative_change(after[1], before[1]), "statistic": distance,
+        "score": distance / critical,
+    }
+
+
+def _unlisted_count(hot_methods):
+    return min(hot_methods.values()) if len(hot_methods) >= HOT_METHOD_LIMIT else 0
+
+
+def compare_profiles(current, baseline):
+    """
+    Statistically significant differences of `current` against `baseline`, most significant
+    first: shifts in the GC pause and thread event duration distributions (Kolmogorov-Smirnov
+    test on the sketches), changed event rates per type (binomial test on the counts, per
+    second of recording, or per event if either recording has no time range) and changed
+    shares of samples in hot methods (two-proportion z-test).
+    """
+    differences = []
+    for name, a, b in (("GC pause (ms)", current.gc_pauses, baseline.gc_pauses),
+                       ("Thread event duration (ms)", current.durations, baseline.durations)):
+        difference = _compare_distribution(name, a, b)
+        if difference:
+            differences.append(difference)
+
+    if current.duration_seconds > 0 and baseline.duration_seconds > 0:
+        exposure, unit = (current.duration_seconds, baseline.duration_seconds), "/s"
+    else:
+        exposure, unit = (current.num_events, baseline.num_events), " of events"
+    if all(exposure):
+        for event_type in sorted(set(current.event_counts) | set(baseline.event_counts)):
+            a, b = current.event_counts.get(event_type, 0), baseline.event_counts.get(event_type, 0)
+            rate_a, rate_b = a / exposure[0], b / exposure[1]
+            z = _rate_z(a, b, *exposure)
+            change = _relative_change(rate_a, rate_b)
+            if abs(z) >= Z_CRITICAL and abs(change) >= MIN_RELATIVE_CHANGE:
+                differences.append({
+                    "kind": "rate", "metric": event_type, "baseline": rate_b, "current": rate_a, "unit": unit,
+                    "change": change, "statistic": z, "score": abs(z) / Z_CRITICAL,
+                })
+
+    if current.samples and baseline.samples:
+        # A method missing from a full top list may still have up to that list's smallest count;
+        # assuming it has that much keeps the test conservative
+        floor_a, floor_b = _unlisted_count(current.hot_methods), _unlisted_count(baseline.hot_methods)
+        for method in sorted(set(current.hot_methods) | set(baseline.hot_methods)):
+            a, b = current.hot_methods.get(method, floor_a), baseline.hot_methods.get(method, floor_b)
+            share_a, share_b = a / current.samples, b / baseline.samples
+            pooled = (a + b) / (current.samples + baseline.samples)
+            spread = math.sqrt(pooled * (1 - pooled) * (1 / current.samples + 1 / baseline.samples))
+            if not spread:
+                continue
+            z = (share_a - share_b) / spread
+            if abs(z) >= Z_CRITICAL and abs(share_a - share_b) >= MIN_SHARE_CHANGE:
+                differences.append({
+                    "kind": "hot_method", "metric": method, "baseline": share_b, "current": share_a,
+                    "change": _relative_change(share_a, share_b), "statistic": z, "score": abs(z) / Z_CRITICAL,
+                })
+
+    differences.sort(key=lambda d: d["score"], reverse=True)
+    for d in differences:
+        # Growth from zero has no finite relative change
+        if math.isinf(d["change"]):
+            d["change"] = None
+    return differences
+
+
+def _format_change(change):
+    return "new" if change is None else f"{change:+.0%}"
+
+
+def render_comparison(differences, current, baseline, limit=MAX_DIFFERENCES):
+    """
+    Formats the differences as the summary sent to the LLM. Each change is its own
+    "Significant Change" section, so prompt compaction drops the least significant first.
+    """
+    summary = f"""
+JFR Comparison Against Baseline:
+Baseline: {baseline.num_events} events, {baseline.time_range}
+Current: {current.num_events} events, {current.time_range}
+"""
+    if not differences:
+        return summary + "No statistically significant changes.\n"
+    for d in differences[:limit]:
+        if d["kind"] == "distribution":
+            before = "/".join(f"{v:.1f}" for v in d["baseline"])
+            after = "/".join(f"{v:.1f}" for v in d["current"])
+            text = f"{d['metric']} p50/p95/p99 {before} -> {after} (p95 {_format_change(d['change'])}, KS D={d['statistic']:.2f})"
+        elif d["kind"] == "rate":
+            text = (f"{d['metric']} rate {d['baseline']:.3g}{d['unit']} -> {d['current']:.3g}{d['unit']} "
+                    f"({_format_change(d['change'])}, z={d['statistic']:.1f})")
+        else:
+            text = (f"{d['metric']} in {d['baseline']:.1%} -> {d['current']:.1%} of samples "
+                    f"(z={d['statistic']:.1f})")
+        summary += f"Significant Change: {text}\n"
+    if len(differences) > limit:
+        summary += f"({len(differences) - limit} smaller significant changes not shown)\n"
+    return summary
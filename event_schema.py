@@ -0,0 +1,292 @@
+from operator import itemgetter
+
+from stack_profile import frame_names, stack_frames
+from utils import NAT_NS, parse_timestamp_ns, to_millis
+
+# Fields that hold durations even as plain numbers (milliseconds, as in the JSON snippets)
+DURATION_FIELDS = frozenset({"duration", "longestPause", "sumOfPauses", "pauseTime"})
+# Layouts learned per event type; events of further layouts are normalized without caching
+MAX_SCHEMAS_PER_TYPE = 8
+
+# Field kinds
+RAW = "raw"
+DURATION = "duration"
+TIMESTAMP = "timestamp"
+
+
+# Epoch seconds of recently seen "YYYY-MM-DDTHH:MM:SS" prefixes (events share their second)
+_SECONDS = {}
+_SECONDS_CACHE_SIZE = 100_000
+
+
+def timestamp_ns(value):
+    """
+    utils.parse_timestamp_ns, with a fast path for the UTC timestamps `jfr print` writes
+    ("2025-01-01T00:00:00.123456Z"): the date and time are parsed once per second.
+    """
+    if type(value) is str and len(value) > 20 and value[19] == "." and value[-1] == "Z":
+        prefix = value[:19]
+        seconds = _SECONDS.get(prefix)
+        if seconds is None:
+            ns = parse_timestamp_ns(prefix + "Z")
+            if ns == NAT_NS:
+                return parse_timestamp_ns(value)
+            if len(_SECONDS) >= _SECONDS_CACHE_SIZE:
+                _SECONDS.clear()
+            seconds = _SECONDS[prefix] = ns // 1_000_000_000
+        fraction = value[20:-1]
+        if fraction.isdigit():
+            # Truncated to microseconds, like datetime.fromisoformat
+            return seconds * 1_000_000_000 + int(fraction[:6].ljust(6, "0")) * 1000
+    return parse_timestamp_ns(value)
+
+
+def duration_ns(value):
+    """A duration (ISO-8601 string or milliseconds) as int nanoseconds, or None if it isn't one."""
+    if type(value) is str and value[:2] == "PT" and value[-1:] == "S":
+        try:
+            return int(round(float(value[2:-1]) * 1e9))
+        except ValueError:
+            # Hours or minutes ("PT1M2.5S")
+            pass
+    ms = to_millis(value)
+    return None if ms != ms else int(round(ms * 1_000_000))
+
+
+def _duration_field(value):
+    ns = duration_ns(value)
+    return value if ns is None else ns
+
+
+def _timestamp_field(value):
+    ns = timestamp_ns(value)
+    return value if ns == NAT_NS else ns
+
+
+def _frame_names(stack):
+    return tuple(frame_names(stack_frames(stack)))
+
+
+def _coalesce(value, fallback):
+    return fallback if value is None else value
+
+
+def _field_kind(name, value):
+    if name in DURATION_FIELDS or (isinstance(value, str) and value.startswith("PT") and duration_ns(value) is not None):
+        return DURATION
+    if isinstance(value, str) and "T" in value and "-" in value and timestamp_ns(value) != NAT_NS:
+        return TIMESTAMP
+    return RAW
+
+
+class _Mismatch(Exception):
+    """An event doesn't have the layout a compiled accessor was built for."""
+
+
+class EventRecord(tuple):
+    """
+    A normalized event: one tuple holding the common fields with fixed types, its schema, and
+    the values of its remaining fields in schema order.
+    - event_type: str (or None)
+    - start_ns: int epoch nanoseconds (NAT_NS = missing)
+    - duration_ns: int nanoseconds, or None
+    - thread: threadName / eventThread.javaName, or None
+    - stack: frame names, leaf first (empty when the event has no stack trace)
+    Other fields are flattened ("eventThread.javaThreadId"); durations become int nanoseconds
+    and timestamps int epoch nanoseconds, and values that don't parse are kept as they were.
+    """
+
+    __slots__ = ()
+
+    event_type = property(itemgetter(0))
+    start_ns = property(itemgetter(1))
+    duration_ns = property(itemgetter(2))
+    thread = property(itemgetter(3))
+    stack = property(itemgetter(4))
+    schema = property(itemgetter(5))
+    values = property(itemgetter(6))
+
+    def get(self, name, default=None):
+        i = self[5].index.get(name)
+        return default if i is None else self[6][i]
+
+    def fields(self):
+        """(name, kind, value) of every field besides the common ones."""
+        schema = self[5]
+        return zip(schema.names, schema.kinds, self[6])
+
+    def to_dict(self):
+        """Flat dict of every field, like utils.flatten_dict but with typed values and `stack` as frame names."""
+        d = {"event": self[0], "startTime": self[1], "duration": self[2], "thread": self[3], "stack": list(self[4])}
+        d.update(zip(self[5].names, self[6]))
+        return d
+
+    def __repr__(self):
+        return f"EventRecord({self.to_dict()!r})"
+
+
+class EventSchema:
+    """
+    The field layout of one event type: which keys it has, how nested objects are flattened,
+    and each field's kind. Learned from one event and compiled into an accessor function that
+    reads every field by direct lookup and checks the event still has this exact layout.
+    """
+
+    def __init__(self, event_type, nested, fields):
+        self.event_type = event_type
+        self.nested = nested
+        self.names = tuple(".".join(path) for path, _ in fields)
+        self.kinds = tuple(kind for _, kind in fields)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.paths = tuple(path for path, _ in fields)
+
+    def __repr__(self):
+        return f"EventSchema({self.event_type!r}, {list(self.names)!r})"
+
+    @classmethod
+    def learn(cls, event_type, values, nested):
+        """
+        Schema of `values` (an event's fields). Returns (schema, accessor); the accessor maps an
+        event (with "type"/"values" when `nested`, flat otherwise) to an EventRecord, or raises
+        _Mismatch (or KeyError/TypeError) for an event of another layout.
+        """
+        lines = ["def access(e):", "    v0 = e['values']" if nested else "    v0 = e"]
+        fields = []
+        common = {}
+        variables = ["v0"]
+
+        def walk(var, obj, path):
+            # Same key count plus every key present = same layout
+            lines.append(f"    if len({var}) != {len(obj)}: raise _Mismatch")
+            for key, value in obj.items():
+                full = path + (key,)
+                expr = f"{var}[{key!r}]"
+                if not path:
+                    if key == "event" and not nested:
+                        continue
+                    if key == "startTime":
+                        common["start"] = f"_ts({expr})"
+                        continue
+                    if key == "duration":
+                        common["duration"] = f"_dur({expr})"
+                        continue
+                    if key == "stackTrace":
+                        common["stack"] = f"_frames({expr})"
+                        continue
+                    if key == "threadName":
+                        common["thread"] = expr
+                        continue
+                if isinstance(value, dict) and value:
+                    child = f"v{len(variables)}"
+                    variables.append(child)
+                    lines.append(f"    {child} = {expr}")
+                    walk(child, value, full)
+                    continue
+                kind = _field_kind(key, value)
+                fields.append((full, kind, {DURATION: f"_durf({expr})", TIMESTAMP: f"_tsf({expr})"}.get(kind, expr)))
+                if path == ("eventThread",) and key == "javaName":
+                    common["java_name"] = expr
+
+        walk("v0", values, ())
+        thread = common.get("thread") or common.get("java_name") or "None"
+        if "thread" in common and "java_name" in common:
+            thread = f"_coalesce({common['thread']}, {common['java_name']})"
+        schema = cls(event_type, nested, [(path, kind) for path, kind, _ in fields])
+        lines.append(
+            f"    return _new(EventRecord, (_type, {common.get('start', '_NAT')}, {common.get('duration', 'None')}, "
+            f"{thread}, {common.get('stack', '()')}, _schema, ({''.join(expr + ', ' for _, _, expr in fields)})))")
+        namespace = {
+            "_Mismatch": _Mismatch, "_new": tuple.__new__, "EventRecord": EventRecord, "_type": event_type,
+            "_schema": schema, "_NAT": NAT_NS, "_ts": timestamp_ns, "_dur": duration_ns,
+            "_frames": _frame_names, "_coalesce": _coalesce, "_durf": _duration_field, "_tsf": _timestamp_field,
+        }
+        # Field names from the recording only ever appear in the source as repr() string literals
+        exec(compile("\n".join(lines), f"<event schema {event_type!r}>", "exec"), namespace)
+        return schema, namespace["access"]
+
+
+def _generic_record(event_type, values, nested):
+    """
+    The EventRecord EventSchema.learn's accessor would build for `values`, by walking the
+    event directly: for layouts past MAX_SCHEMAS_PER_TYPE, which would cost a compile per event.
+    """
+    common = {}
+    fields = []
+
+    def walk(obj, path):
+        for key, value in obj.items():
+            if not path:
+                if key == "event" and not nested:
+                    continue
+                if key in ("startTime", "duration", "stackTrace", "threadName"):
+                    common[key] = value
+                    continue
+            if isinstance(value, dict) and value:
+                walk(value, path + (key,))
+                continue
+            fields.append((path + (key,), _field_kind(key, value), value))
+            if path == ("eventThread",) and key == "javaName":
+                common["javaName"] = value
+
+    walk(values, ())
+    schema = EventSchema(event_type, nested, [(path, kind) for path, kind, _ in fields])
+    converted = tuple(
+        _duration_field(value) if kind == DURATION else _timestamp_field(value) if kind == TIMESTAMP else value
+        for _, kind, value in fields)
+    thread = common.get("threadName")
+    if thread is None:
+        thread = common.get("javaName")
+    return tuple.__new__(EventRecord, (
+        event_type,
+        timestamp_ns(common["startTime"]) if "startTime" in common else NAT_NS,
+        duration_ns(common["duration"]) if "duration" in common else None,
+        thread,
+        _frame_names(common["stackTrace"]) if "stackTrace" in common else (),
+        schema,
+        converted))
+
+
+class EventNormalizer:
+    """
+    Turns events (`jfr print --json` or flat snippet layout) into EventRecords.
+
+    The first event of each type and layout is inspected once to learn its schema, and every
+    later event of that layout goes through the compiled accessor, so no per-event key probing,
+    recursion or new string keys. An event with extra, missing or differently nested fields gets
+    its own schema (up to MAX_SCHEMAS_PER_TYPE per type; beyond that it is normalized by a
+    plain walk over its fields, without compiling), so unexpected fields are never dropped
+    or misread.
+    """
+
+    def __init__(self):
+        self._accessors = {}
+
+    def __len__(self):
+        """Number of learned schemas."""
+        return sum(len(accessors) for accessors in self._accessors.values())
+
+    def normalize(self, e):
+        if "values" in e and "type" in e:
+            key = (e["type"], True)
+        else:
+            key = (e.get("event"), False)
+        accessors = self._accessors.get(key)
+        if accessors:
+            for access in accessors:
+                try:
+                    return access(e)
+                except (_Mismatch, KeyError, TypeError):
+                    continue
+            if len(accessors) >= MAX_SCHEMAS_PER_TYPE:
+                return _generic_record(key[0], e["values"] if key[1] else e, key[1])
+        else:
+            accessors = self._accessors[key] = []
+        _, access = EventSchema.learn(key[0], e["values"] if key[1] else e, key[1])
+        accessors.append(access)
+        return access(e)
+
+    def normalize_all(self, events):
+        """Normalizes a stream of events lazily."""
+        normalize = self.normalize
+        for e in events:
+            yield normalize(e)
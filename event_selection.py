@@ -0,0 +1,90 @@
+DEFAULT_CATEGORIES = "Java Application,Threads,GC,Socket,IO,JVM"
+
+
+def _names(value):
+    """Accepts a comma-separated string or a collection of names."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    names = sorted({name.strip() for name in value if name and name.strip()})
+    return tuple(names) or None
+
+
+class EventSelection:
+    """
+    Which events, and which of their fields, to decode from a recording.
+
+    The selection is pushed down as far as each decoder allows: `jfr print` only emits the
+    selected event types (--events) or categories (--categories), the native reader skips
+    unselected events undecoded and doesn't resolve unselected fields, and every decoded
+    event is projected onto `fields` before anything else (cache, aggregators) holds it.
+
+    - events: event type names (e.g. "jdk.GarbageCollection"); None keeps every type
+    - categories: `jfr print` category filter (default DEFAULT_CATEGORIES when no events are
+      given). JSON inputs and the native reader carry no categories and ignore it.
+    - fields: top-level event fields to keep; None keeps all of them
+    """
+
+    def __init__(self, events=None, categories=None, fields=None):
+        self.events = _names(events)
+        self.categories = categories if categories or self.events else DEFAULT_CATEGORIES
+        self.fields = _names(fields)
+        self._event_set = frozenset(self.events) if self.events else None
+        self._field_set = frozenset(self.fields) if self.fields else None
+
+    def __repr__(self):
+        return f"EventSelection(events={self.events!r}, categories={self.categories!r}, fields={self.fields!r})"
+
+    def options(self):
+        """Plain-data form, part of the parse cache key."""
+        return {"events": self.events, "categories": self.categories, "fields": self.fields}
+
+    def jfr_print_args(self):
+        args = []
+        if self.categories:
+            args += ["--categories", self.categories]
+        if self.events:
+            args += ["--events", ",".join(self.events)]
+        return args
+
+    def wants_type(self, event_type):
+        return self._event_set is None or event_type in self._event_set
+
+    def project(self, e):
+        """The event with only the selected fields (both `jfr print --json` and flat snippet layouts)."""
+        fields = self._field_set
+        if fields is None:
+            return e
+        if "values" in e and "type" in e:
+            values = e["values"]
+            return {"type": e["type"], "values": {k: v for k, v in values.items() if k in fields}}
+        return {k: v for k, v in e.items() if k in fields or k == "event"}
+
+    def apply(self, events):
+        """Filters and projects a stream of decoded events."""
+        if self._event_set is None and self._field_set is None:
+            yield from events
+            return
+        for e in events:
+            event_type = e.get("type") if "values" in e else e.get("event")
+            if self.wants_type(event_type):
+                yield self.project(e)
+
+
+def resolve_selection(events=None, categories=None, fields=None, auto=False):
+    """
+    The selection described by CLI-style options, or None when nothing was asked for.
+    With `auto`, starts from what the feature extractors read (feature_extractor.feature_selection)
+    and adds any explicitly listed events and fields to it.
+    """
+    if not auto:
+        if not (events or categories or fields):
+            return None
+        return EventSelection(events=events, categories=categories, fields=fields)
+    from feature_extractor import feature_selection
+
+    needed = feature_selection()
+    return EventSelection(
+        events=needed.events + (_names(events) or ()), categories=categories,
+        fields=needed.fields + (_names(fields) or ()))
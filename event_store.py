@@ -0,0 +1,290 @@
+import math
+import os
+import shutil
+import sys
+import tempfile
+import weakref
+from array import array
+
+import numpy as np
+
+from event_schema import DURATION, TIMESTAMP, EventNormalizer
+from utils import NAT_NS, to_millis
+
+RESERVED_FIELDS = {"event", "type", "startTime", "duration", "threadName", "eventThread", "stackTrace", "sql"}
+# 0 = no limit: decoded events stay in memory
+DEFAULT_MEMORY_BUDGET_MB = 0
+# Rows written per step when back-filling a spilled column
+_FILL_ROWS = 1 << 16
+# Estimated bytes a StringPool spends per entry besides the value: dict slot, list slot, code
+_POOL_ENTRY_BYTES = 64
+# Share of the memory budget rows may still be buffered in once the string pools take up the
+# rest, so a pool-heavy recording doesn't spill on every append
+_MIN_BUFFER_SHARE = 1 / 16
+
+
+def memory_budget_bytes(memory_budget_mb=None):
+    """
+    Bytes of decoded events to hold in memory before spilling to disk (`memory_budget_mb`,
+    default $JFR_MEMORY_BUDGET_MB), or None for no limit.
+    """
+    if memory_budget_mb is None:
+        memory_budget_mb = float(os.getenv("JFR_MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB))
+    return int(memory_budget_mb * 1024 * 1024) if memory_budget_mb and memory_budget_mb > 0 else None
+
+
+def make_spill_dir():
+    """A fresh directory for spilled events under $JFR_SPILL_DIR (default: the system temp dir)."""
+    parent = os.getenv("JFR_SPILL_DIR") or None
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix="jfr_spill_", dir=parent)
+
+
+def release_spill_dir(directory, owner):
+    """
+    Removes a spill directory once nothing reads it. Open memory maps and SQLite handles keep
+    unlinked files readable on POSIX, so it goes right away there; elsewhere when `owner` is collected.
+    """
+    if os.name == "posix":
+        shutil.rmtree(directory, ignore_errors=True)
+    else:
+        weakref.finalize(owner, shutil.rmtree, directory, True)
+
+
+class StringPool:
+    """
+    Dictionary encoding for repeated strings: each distinct value is stored once and
+    referenced by a small integer code (-1 for missing). `nbytes` estimates its memory use.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self.values = []
+        self.nbytes = 0
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+            self.nbytes += sys.getsizeof(value) + _POOL_ENTRY_BYTES
+        return code
+
+    def code(self, value):
+        return self._codes.get(value, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class EventTable:
+    """
+    Columnar view of a recording. Every event is one row; `columns` maps column names to
+    equal-length NumPy arrays:
+    - event, thread, stack, sql: int32 codes into the matching StringPool (-1 = missing)
+    - start_ns: int64 epoch nanoseconds (NAT_NS = missing)
+    - duration_ms: float64 (NaN = missing)
+    - any other numeric event field (e.g. longestPause, bytesWritten): float64, NaN-filled
+    Stacks are interned as tuples of frame codes, so identical stacks share one code.
+    When built over a memory budget the columns are read-only np.memmap arrays over spill files.
+    """
+
+    def __init__(self, columns, event_types, threads, frames, stacks, sql):
+        self.columns = columns
+        self.event_types = event_types
+        self.threads = threads
+        self.frames = frames
+        self.stacks = stacks
+        self.sql = sql
+
+    def __len__(self):
+        return len(self.columns["event"])
+
+    def stack_frames(self, stack_code):
+        """Returns the frame strings of an interned stack, outermost call last."""
+        if stack_code < 0:
+            return []
+        return [self.frames.values[c] for c in self.stacks.values[stack_code]]
+
+    @property
+    def spilled(self):
+        return isinstance(self.columns["event"], np.memmap)
+
+    def start_times(self):
+        """start_ns as datetime64[ns] (a view, not a copy)."""
+        return self.columns["start_ns"].view("datetime64[ns]")
+
+    def to_pandas(self):
+        """
+        Builds a DataFrame over the column arrays without copying them. Interned columns
+        become Categoricals that reuse the code arrays directly.
+        """
+        import pandas as pd
+        data = {}
+        for name, values in self.columns.items():
+            if name in ("event", "thread", "sql"):
+                pool = {"event": self.event_types, "thread": self.threads, "sql": self.sql}[name]
+                data[name] = pd.Categorical.from_codes(values, categories=pd.Index(pool.values, dtype=object))
+            elif name == "start_ns":
+                data["start_time"] = self.start_times()
+            else:
+                data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+
+class EventTableBuilder:
+    """
+    Appends events one at a time into typed arrays, so building a table from the streaming
+    parser never holds the event dicts themselves. Events are read through an
+    event_schema.EventNormalizer, so each event type's layout is worked out once.
+
+    With a `memory_budget` (bytes), the arrays are appended to one file per column whenever
+    they and the string pools outgrow it, and build() memory-maps those files, so the table of
+    a recording larger than RAM is paged in by the OS as it is read. The pools (threads, SQL,
+    frames, stacks) stay in memory, so they shrink the room left for buffered rows.
+    """
+
+    def __init__(self, memory_budget=None):
+        self.event_types = StringPool()
+        self.threads = StringPool()
+        self.frames = StringPool()
+        self.stacks = StringPool()
+        self.sql = StringPool()
+        self._event = array("i")
+        self._thread = array("i")
+        self._stack = array("i")
+        self._sql = array("i")
+        self._start = array("q")
+        self._duration = array("d")
+        self._numeric = {}
+        self._rows = 0
+        self._normalizer = EventNormalizer()
+        self._plans = {}
+        self.memory_budget = memory_budget
+        self._spill_dir = None
+        self._spill_files = {}
+        self._spilled_rows = 0
+
+    def _arrays(self):
+        """(column name, array, dtype) for every column."""
+        yield "event", self._event, np.int32
+        yield "thread", self._thread, np.int32
+        yield "stack", self._stack, np.int32
+        yield "sql", self._sql, np.int32
+        yield "start_ns", self._start, np.int64
+        yield "duration_ms", self._duration, np.float64
+        for name, column in self._numeric.items():
+            yield name, column, np.float64
+
+    def _row_bytes(self):
+        return 32 + 8 * len(self._numeric)
+
+    def _pool_bytes(self):
+        return (self.event_types.nbytes + self.threads.nbytes + self.frames.nbytes + self.stacks.nbytes
+                + self.sql.nbytes)
+
+    def _over_budget(self):
+        buffered = self._rows * self._row_bytes()
+        room = max(self.memory_budget - self._pool_bytes(), self.memory_budget * _MIN_BUFFER_SHARE)
+        return buffered >= room
+
+    def _intern_stack(self, names):
+        if not names:
+            return -1
+        return self.stacks.intern(tuple(self.frames.intern(name) for name in names))
+
+    def _numeric_fields(self, schema):
+        """(column, value index, kind) of the top-level fields of a schema that may hold numbers."""
+        plan = self._plans.get(schema)
+        if plan is None:
+            plan = self._plans[schema] = [
+                (name, i, kind) for i, (path, name, kind) in enumerate(zip(schema.paths, schema.names, schema.kinds))
+                if len(path) == 1 and name not in RESERVED_FIELDS and kind != TIMESTAMP]
+        return plan
+
+    def append(self, e):
+        record = self._normalizer.normalize(e)
+        sql = record.get("sql")
+        duration = record.duration_ns
+
+        self._event.append(self.event_types.intern(record.event_type))
+        self._thread.append(self.threads.intern(record.thread))
+        self._stack.append(self._intern_stack(record.stack))
+        self._sql.append(self.sql.intern(sql if isinstance(sql, str) else None))
+        self._start.append(record.start_ns)
+        self._duration.append(math.nan if duration is None else duration / 1e6)
+
+        rows = self._rows
+        values = record.values
+        for name, i, kind in self._numeric_fields(record.schema):
+            value = values[i]
+            if kind == DURATION:
+                # Parsed durations are int nanoseconds; anything left as it was isn't a duration
+                number = value / 1e6 if type(value) is int else math.nan
+            else:
+                number = to_millis(value)
+            if math.isnan(number):
+                continue
+            column = self._numeric.get(name)
+            if column is None:
+                column = self._numeric[name] = array("d", [math.nan]) * rows
+            column.append(number)
+        self._rows = rows + 1
+        for column in self._numeric.values():
+            if len(column) < self._rows:
+                column.append(math.nan)
+        if self.memory_budget is not None and self._over_budget():
+            self._spill()
+
+    def extend(self, events):
+        for e in events:
+            self.append(e)
+        return self
+
+    def _spill(self):
+        """Appends the in-memory rows to the column files and empties the arrays."""
+        if self._spill_dir is None:
+            self._spill_dir = make_spill_dir()
+        for name, column, _ in self._arrays():
+            f = self._spill_files.get(name)
+            if f is None:
+                # Field names come from the recording, so files are numbered rather than named
+                f = self._spill_files[name] = open(
+                    os.path.join(self._spill_dir, f"{len(self._spill_files)}.col"), "wb")
+                # A column first seen now is missing (NaN) in every row already spilled
+                remaining = self._spilled_rows
+                while remaining:
+                    step = min(remaining, _FILL_ROWS)
+                    (array("d", [math.nan]) * step).tofile(f)
+                    remaining -= step
+            column.tofile(f)
+            del column[:]
+        self._spilled_rows += self._rows
+        self._rows = 0
+
+    def build(self):
+        if self._spill_dir is None:
+            # np.frombuffer wraps the array buffers, so no column is copied
+            columns = {name: np.frombuffer(column, dtype=dtype) for name, column, dtype in self._arrays()}
+            return EventTable(columns, self.event_types, self.threads, self.frames, self.stacks, self.sql)
+        self._spill()
+        columns = {}
+        for name, _, dtype in self._arrays():
+            f = self._spill_files[name]
+            f.close()
+            columns[name] = np.memmap(f.name, dtype=dtype, mode="r", shape=(self._spilled_rows,))
+        table = EventTable(columns, self.event_types, self.threads, self.frames, self.stacks, self.sql)
+        release_spill_dir(self._spill_dir, table)
+        return table
+
+
+def build_event_table(events, memory_budget=None):
+    """
+    Builds an EventTable from any iterable of events (e.g. jfr_parser.iter_jfr_events),
+    consuming it in a single pass. Past `memory_budget` bytes the columns spill to disk.
+    """
+    return EventTableBuilder(memory_budget=memory_budget).extend(events).build()
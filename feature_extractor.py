@@ -1,58 +1,452 @@
 import datetime
+import heapq
+import math
+
+from event_selection import EventSelection
+from stack_profile import StackProfile
+from utils import to_millis
+
+TOP_K = 5
+QUANTILES = (0.5, 0.95, 0.99)
+# Rows compute_columnar_features processes per step
+COLUMNAR_BLOCK_ROWS = 1 << 20
+
+# Event types the extractors summarize: stuck threads, GC pauses, hot methods (execution
+# samples), SQL, and the blocking/I/O events behind the thread event durations
+FEATURE_EVENT_TYPES = (
+    "jdk.ThreadStuck",
+    "jdk.GarbageCollection",
+    "jdk.ExecutionSample",
+    "jdk.SQLExecution",
+    "jdk.JavaMonitorEnter",
+    "jdk.JavaMonitorWait",
+    "jdk.ThreadPark",
+    "jdk.ThreadSleep",
+    "jdk.SocketRead",
+    "jdk.SocketWrite",
+    "jdk.FileRead",
+    "jdk.FileWrite",
+)
+# Fields read by StreamingAggregator, the columnar EventTable, StackProfile and TimeIndex
+FEATURE_FIELDS = ("startTime", "duration", "longestPause", "eventThread", "threadName", "sql", "stackTrace")
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch-style log buckets).
+    Memory grows with the logarithm of the value range, not with the number of values,
+    and two sketches built over separate chunks merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge quantile sketches with different accuracy")
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0)
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                estimate = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        """JSON-safe state; QuantileSketch.from_dict restores it."""
+        return {
+            "relative_accuracy": self.relative_accuracy, "zero_count": self.zero_count, "count": self.count,
+            "min": self.min, "max": self.max, "buckets": {str(i): n for i, n in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(relative_accuracy=data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.buckets = {int(i): n for i, n in data["buckets"].items()}
+        return sketch
+
+def _event_fields(e):
+    """Returns (event type, fields) for both flat snippets and `jfr print --json` events."""
+    if "values" in e and "type" in e:
+        return e["type"], e["values"]
+    return e.get("event"), e
+
+def _is_sql_event(event_type, fields):
+    # Only look at the event type, field names and top-level string values, never stack traces
+    if "sql" in fields or (event_type and "SQL" in event_type):
+        return True
+    for k, v in fields.items():
+        if "SQL" in k or (isinstance(v, str) and "SQL" in v):
+            return True
+    return False
+
+def _looks_like_utc(ts):
+    return len(ts) > 19 and ts[-1] == "Z" and ts[4] == "-" and ts[10] == "T"
+
+def _parse_time(ts):
+    try:
+        return datetime.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+def _as_utc(t):
+    """An aware UTC datetime; naive timestamps are taken to be UTC already, as utils.parse_timestamp_ns does."""
+    if t.tzinfo is None:
+        return t.replace(tzinfo=datetime.timezone.utc)
+    return t.astimezone(datetime.timezone.utc)
+
+def _plain_number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+class StreamingAggregator:
+    """
+    One-pass, bounded-memory feature aggregation over a stream of events.
+    Keeps running min/max start times, counts per event type, the first stuck threads, top-K
+    SQL events by duration, quantile sketches for GC pauses and thread event durations, and a StackProfile of every
+    stack trace seen. Aggregators built over separate chunks can be combined with merge().
+    """
+
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.num_events = 0
+        self.event_counts = {}
+        self.num_stuck_threads = 0
+        self.stuck_threads = []
+        self.longest_gc_pause = None
+        self.gc_pauses = QuantileSketch()
+        self.thread_durations = QuantileSketch()
+        self.stacks = StackProfile()
+        self._sql_heap = []
+        self._seq = 0
+        # UTC "...Z" timestamps of one fixed width sort lexicographically, so they are only
+        # parsed once at the end; anything else is parsed as it arrives
+        self._utc_width = None
+        self._utc_min = None
+        self._utc_max = None
+        self._min_time = None
+        self._max_time = None
+
+    def _observe_time(self, ts):
+        if isinstance(ts, str) and _looks_like_utc(ts) and self._utc_width in (None, len(ts)):
+            self._utc_width = len(ts)
+            if self._utc_min is None or ts < self._utc_min:
+                self._utc_min = ts
+            if self._utc_max is None or ts > self._utc_max:
+                self._utc_max = ts
+            return
+        self._observe_datetime(_parse_time(ts) if isinstance(ts, str) else None)
+
+    def _observe_datetime(self, t):
+        if t is None:
+            return
+        # Naive and aware timestamps can't be ordered against each other
+        t = _as_utc(t)
+        if self._min_time is None or t < self._min_time:
+            self._min_time = t
+        if self._max_time is None or t > self._max_time:
+            self._max_time = t
+
+    def _push_sql(self, duration, seq, e):
+        item = (duration, -seq, e)
+        if len(self._sql_heap) < self.top_k:
+            heapq.heappush(self._sql_heap, item)
+        elif item[:2] > self._sql_heap[0][:2]:
+            heapq.heapreplace(self._sql_heap, item)
+
+    def add(self, e):
+        self.num_events += 1
+        event_type, fields = _event_fields(e)
+        self.event_counts[event_type] = self.event_counts.get(event_type, 0) + 1
+        if "startTime" in fields:
+            self._observe_time(fields["startTime"])
+
+        if event_type == 'jdk.ThreadStuck':
+            self.num_stuck_threads += 1
+            if len(self.stuck_threads) < self.top_k:
+                self.stuck_threads.append(e)
+
+        if "stackTrace" in fields:
+            self.stacks.add_event(fields)
+
+        duration = to_millis(fields.get("duration"))
+        if not math.isnan(duration) and ("threadName" in fields or "eventThread" in fields):
+            self.thread_durations.add(duration)
+
+        if _is_sql_event(event_type, fields):
+            self._push_sql(0.0 if math.isnan(duration) else duration, self._seq, e)
+
+        if isinstance(event_type, str) and event_type.startswith("jdk.GarbageCollection"):
+            pause = fields.get('longestPause', 0)
+            if pause:
+                pause_ms = pause if isinstance(pause, (int, float)) else to_millis(pause)
+                if not math.isnan(pause_ms):
+                    self.gc_pauses.add(pause_ms)
+                    if self.longest_gc_pause is None or pause_ms > self.longest_gc_pause:
+                        self.longest_gc_pause = pause_ms
+        self._seq += 1
+
+    def update(self, events):
+        for e in events:
+            self.add(e)
+        return self
+
+    def merge(self, other):
+        """
+        Folds another aggregator's state into this one, as if its events had been added
+        after ours (used to combine per-chunk partial aggregates).
+        """
+        self.num_events += other.num_events
+        for event_type, n in other.event_counts.items():
+            self.event_counts[event_type] = self.event_counts.get(event_type, 0) + n
+        self.num_stuck_threads += other.num_stuck_threads
+        self.stuck_threads = (self.stuck_threads + other.stuck_threads)[:self.top_k]
+        if other.longest_gc_pause is not None and (
+                self.longest_gc_pause is None or other.longest_gc_pause > self.longest_gc_pause):
+            self.longest_gc_pause = other.longest_gc_pause
+        self.gc_pauses.merge(other.gc_pauses)
+        self.thread_durations.merge(other.thread_durations)
+        self.stacks.merge(other.stacks)
+        for duration, neg_seq, e in other._sql_heap:
+            self._push_sql(duration, self._seq - neg_seq, e)
+        self._seq += other._seq
+        for ts in (other._utc_min, other._utc_max):
+            if ts is not None:
+                self._observe_time(ts)
+        self._observe_datetime(other._min_time)
+        self._observe_datetime(other._max_time)
+        return self
+
+    def time_bounds(self):
+        lo, hi = self._min_time, self._max_time
+        if self._utc_min is not None:
+            for t in (_parse_time(self._utc_min), _parse_time(self._utc_max)):
+                if t is None:
+                    continue
+                t = _as_utc(t)
+                if lo is None or t < lo:
+                    lo = t
+                if hi is None or t > hi:
+                    hi = t
+        return lo, hi
+
+    def top_sql(self):
+        """SQL-bearing events, longest duration first (ties in arrival order)."""
+        return [e for _, _, e in sorted(self._sql_heap, reverse=True)]
+
+    def features(self):
+        lo, hi = self.time_bounds()
+        return {
+            "num_events": self.num_events,
+            "time_range": f"{lo} --> {hi}" if lo is not None else None,
+            "num_stuck_threads": self.num_stuck_threads,
+            "stuck_threads": list(self.stuck_threads),
+            "hot_threads": [],
+            "longest_gc_pause": None if self.longest_gc_pause is None else _plain_number(self.longest_gc_pause),
+            "gc_pause_quantiles": {q: self.gc_pauses.quantile(q) for q in QUANTILES} if self.gc_pauses.count else None,
+            "thread_duration_quantiles": (
+                {q: self.thread_durations.quantile(q) for q in QUANTILES} if self.thread_durations.count else None),
+            "top_sql": [str(e) for e in self.top_sql()],
+            "hot_methods": self.stacks.hot_methods(),
+            "top_leaf_frames": self.stacks.top_leaf_frames(),
+            "high_usage_periods": []
+        }
+
+def feature_selection():
+    """
+    The EventSelection covering everything the feature extractors read; passing it to
+    iter_jfr_events keeps the decoder from producing events and fields they would ignore.
+    """
+    return EventSelection(events=FEATURE_EVENT_TYPES, fields=FEATURE_FIELDS)
 
 def extract_features(events):
     """
     Given parsed JFR events or stack traces, extracts features or key event sequences
     to summarize as LLM input.
+    Accepts any iterable of events, including the generator from jfr_parser.iter_jfr_events,
+    and consumes it in a single pass with bounded memory (see StreamingAggregator).
     Returns a cleaned/summarized dictionary or string for LLM prompt injection.
     """
+    features = StreamingAggregator().update(events).features()
+    # For the LLM, we can return BOTH a feature dict and a plain summary string
+    return render_summary(features, features["num_stuck_threads"])
+
+def render_summary(features, num_stuck_threads):
+    """
+    Formats a feature dict as the plain-text summary injected into the LLM prompt.
+    """
+    summary = f"""
+JFR Summary:
+Events: {features['num_events']}
+Time Range: {features['time_range']}
+Stuck Threads: {num_stuck_threads}
+Example Top SQL: {features['top_sql'][:2]}
+Longest GC Pause(ms): {features['longest_gc_pause']}
+"""
+    for key, label in (("gc_pause_quantiles", "GC Pause"), ("thread_duration_quantiles", "Thread Event Duration")):
+        quantiles = features.get(key)
+        if quantiles:
+            values = "/".join(f"{quantiles[q]:.1f}" for q in QUANTILES)
+            summary += f"{label} p50/p95/p99(ms): {values}\n"
+    for key, label in (("hot_methods", "Hot Methods (samples)"), ("top_leaf_frames", "Top Leaf Frames (samples)")):
+        ranked = features.get(key)
+        if ranked:
+            summary += f"{label}: {', '.join(f'{name} ({n})' for name, n in ranked[:5])}\n"
+    for period in features.get("high_usage_periods") or []:
+        summary += (
+            f"Flagged Window: {period['start']} --> {period['end']} ({', '.join(period['reasons'])}): "
+            f"events={period['num_events']}, stuck threads={period['num_stuck_threads']}, "
+            f"longest GC pause(ms)={period['longest_gc_pause']}\n"
+        )
+    return summary
+
+def _ns_to_datetime(ns):
+    return datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(microseconds=int(ns) // 1000)
+
+def _code_counts(codes, size):
+    """Occurrences of each code in 0..size-1 (missing values, -1, are skipped)."""
+    import numpy as np
+    codes = codes[codes >= 0]
+    return np.bincount(codes, minlength=size) if len(codes) else np.zeros(size, dtype=np.int64)
+
+def _top_codes(counts, pool, n):
+    """Most frequent interned values given their counts, most common first."""
+    import numpy as np
+    order = np.argsort(counts, kind="stable")[::-1][:n]
+    return [pool.values[c] for c in order if counts[c] > 0]
+
+def compute_columnar_features(table):
+    """
+    Vectorized counterpart of extract_features over an event_store.EventTable.
+    Computes the time range, GC pause statistics, stuck threads and top-N SQL/threads
+    with array operations instead of a per-event Python loop. Rows are processed
+    COLUMNAR_BLOCK_ROWS at a time, so temporaries stay small and memory-mapped (spilled)
+    columns are paged through rather than read in whole.
+    """
+    import numpy as np
+    from event_store import NAT_NS
+
+    columns = table.columns
     features = {
-        "num_events": len(events),
+        "num_events": len(table),
         "time_range": None,
         "stuck_threads": [],
         "hot_threads": [],
         "longest_gc_pause": None,
+        "gc_pause_count": 0,
+        "gc_pause_total": None,
+        "gc_pause_mean": None,
         "top_sql": [],
         "high_usage_periods": []
     }
-    # This is a minimal MVP, you can add mechanisms to filter large input for LLMs:
-    times = []
-    top_sql = []
-    stuck_threads = []
-    gc_pauses = []
-
-    for e in events:
-        if 'startTime' in e:
-            # Convert ISO string to datetime if present
-            try:
-                times.append(datetime.datetime.fromisoformat(e['startTime'].replace("Z", "+00:00")))
-            except Exception:
-                pass
-
-        if e.get('event') == 'jdk.ThreadStuck':
-            stuck_threads.append(e)
-        # Hot SQL (rough): look for JDBC or SQL fields
-        if 'sql' in e or 'SQL' in str(e):
-            top_sql.append(str(e))
-        # GC pause
-        if e.get('event', '').startswith("jdk.GarbageCollection"):
-            pause = e.get('longestPause', 0)
-            if pause:
-                gc_pauses.append(pause)
 
-    if times:
-        features["time_range"] = f"{min(times)} --> {max(times)}"
-    features["stuck_threads"] = stuck_threads[:5]
-    features["top_sql"] = top_sql[:5]
-    features["longest_gc_pause"] = max(gc_pauses) if gc_pauses else None
+    stuck_code = table.event_types.code("jdk.ThreadStuck")
+    gc_codes = [i for i, name in enumerate(table.event_types.values)
+                if isinstance(name, str) and name.startswith("jdk.GarbageCollection")]
+    if "longestPause" not in columns:
+        gc_codes = []
+    first = last = None
+    num_stuck = 0
+    pauses = []
+    stack_counts = np.zeros(len(table.stacks), dtype=np.int64)
+    sql_counts = np.zeros(len(table.sql), dtype=np.int64)
+    thread_counts = np.zeros(len(table.threads), dtype=np.int64)
+    for lo in range(0, len(table), COLUMNAR_BLOCK_ROWS):
+        block = slice(lo, lo + COLUMNAR_BLOCK_ROWS)
+        event_codes = columns["event"][block]
+        threads = columns["thread"][block]
 
-    # For the LLM, we can return BOTH a feature dict and a plain summary string
-    summary = f"""
-JFR Summary:
-Events: {features['num_events']}
-Time Range: {features['time_range']}
-Stuck Threads: {len(stuck_threads)}
-Example Top SQL: {features['top_sql'][:2]}
-Longest GC Pause(ms): {features['longest_gc_pause']}
-"""
-    return summary
+        start = columns["start_ns"][block]
+        start = start[start != NAT_NS]
+        if len(start):
+            first = start.min() if first is None else min(first, start.min())
+            last = start.max() if last is None else max(last, start.max())
+
+        if stuck_code >= 0:
+            stuck_rows = np.flatnonzero(event_codes == stuck_code)
+            num_stuck += len(stuck_rows)
+            wanted = 5 - len(features["stuck_threads"])
+            features["stuck_threads"] += [
+                table.threads.values[c] if c >= 0 else None for c in threads[stuck_rows[:wanted]]]
+
+        if gc_codes:
+            block_pauses = columns["longestPause"][block][np.isin(event_codes, gc_codes)]
+            pauses.append(block_pauses[~np.isnan(block_pauses) & (block_pauses != 0)])
+
+        stack_counts += _code_counts(columns["stack"][block], len(table.stacks))
+        sql_counts += _code_counts(columns["sql"][block], len(table.sql))
+        thread_counts += _code_counts(threads, len(table.threads))
+
+    if first is not None:
+        features["time_range"] = f"{_ns_to_datetime(first)} --> {_ns_to_datetime(last)}"
+    features["num_stuck_threads"] = num_stuck
+
+    pauses = np.concatenate(pauses) if pauses else np.empty(0)
+    if len(pauses):
+        features["longest_gc_pause"] = _plain_number(pauses.max())
+        features["gc_pause_count"] = len(pauses)
+        features["gc_pause_total"] = _plain_number(pauses.sum())
+        features["gc_pause_mean"] = float(pauses.mean())
+        features["gc_pause_quantiles"] = dict(zip(QUANTILES, np.quantile(pauses, QUANTILES).tolist()))
+
+    # Identical stacks share one code, so each distinct stack is profiled once with its count
+    if stack_counts.any():
+        profile = StackProfile()
+        for code in np.flatnonzero(stack_counts):
+            profile.add(table.stack_frames(code), weight=int(stack_counts[code]))
+        features["hot_methods"] = profile.hot_methods()
+        features["top_leaf_frames"] = profile.top_leaf_frames()
+
+    features["top_sql"] = _top_codes(sql_counts, table.sql, 5)
+    features["hot_threads"] = _top_codes(thread_counts, table.threads, 5)
+    return features
+
+def extract_features_columnar(events, memory_budget=None):
+    """
+    Same summary as extract_features, computed over a columnar event table.
+    Accepts an event_store.EventTable or any iterable of events, which is loaded into one first
+    (spilling to disk past `memory_budget` bytes).
+    Top SQL lists the most frequent statements rather than the first ones seen.
+    """
+    from event_store import EventTable, build_event_table
+    table = events if isinstance(events, EventTable) else build_event_table(events, memory_budget=memory_budget)
+    features = compute_columnar_features(table)
+    return render_summary(features, features["num_stuck_threads"])
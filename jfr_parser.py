@@ -3,6 +3,16 @@ import json
 import os
 import tempfile
 import glob
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from event_selection import DEFAULT_CATEGORIES, EventSelection
+from jfr_reader import read_jfr_events
+from metrics import REGISTRY, StageRecord, stage, timed_iter
+
+JFR_PRINT_CATEGORIES = DEFAULT_CATEGORIES
+STREAM_READ_SIZE = 64 * 1024
 
 def disassemble_jfr(jfr_path, output_dir=None, max_size_mb=50):
     """
@@ -25,7 +35,8 @@ def disassemble_jfr(jfr_path, output_dir=None, max_size_mb=50):
         ]
         try:
             print(f"Disassembling {jfr_path} into chunks (directory {output_dir}) ...")
-            subprocess.run(dis_cmd, check=True)
+            with stage("disassemble"):
+                subprocess.run(dis_cmd, check=True)
             chunk_files = sorted(glob.glob(os.path.join(output_dir, "*.jfr")))
             print(f"Chunked into {len(chunk_files)} files.")
         except Exception as e:
@@ -35,40 +46,239 @@ def disassemble_jfr(jfr_path, output_dir=None, max_size_mb=50):
         chunk_files = [jfr_path]
     return chunk_files
 
-def parse_jfr(jfr_path, chunking_threshold_mb=None):
+def iter_json_array(stream, read_size=STREAM_READ_SIZE):
     """
-    Extracts events or stack traces from a JFR file using `jfr print` (JDK 17+ recommended).
-    If the file is a .json/text file, loads the JSON or text directly.
-    For large .jfr files, chunks and aggregates from all chunks.
+    Incrementally decodes the first JSON array found in a text stream and yields
+    its elements one at a time, so only one event is held in memory at once.
+    Works for both a bare top-level list and the `jfr print --json` layout
+    ({"recording": {"events": [...]}}).
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = stream.read(read_size)
+        if not data:
+            eof = True
+            return
+        buf = buf[pos:] + data
+        pos = 0
+
+    # Seek to the opening bracket of the event array
+    while True:
+        idx = buf.find("[", pos)
+        if idx >= 0:
+            pos = idx + 1
+            break
+        pos = len(buf)
+        if eof:
+            return
+        fill()
+
+    while True:
+        # Skip separators between elements
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+        if pos >= len(buf) or buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            # Element is split across reads; pull in more data and retry
+            fill()
+            continue
+        if end == len(buf) and not eof:
+            # A scalar at the buffer edge may be truncated (e.g. a number); re-read to be sure
+            fill()
+            continue
+        pos = end
+        yield obj
+
+def _iter_chunk_events(cfile, selection=None):
+    """
+    Streams events for a single .jfr chunk straight from the `jfr print --json` stdout pipe.
+    The selection's event types/categories are passed to `jfr print`; its fields are
+    projected as each event is decoded.
+    """
+    selection = selection or EventSelection()
+    print(f"Streaming {cfile} through jfr print")
+    proc = subprocess.Popen(
+        ["jfr", "print", "--json", *selection.jfr_print_args(), cfile],
+        stdout=subprocess.PIPE,
+        text=True,
+        encoding="utf-8"
+    )
+    try:
+        yield from timed_iter("jfr_print", selection.apply(iter_json_array(proc.stdout)))
+    finally:
+        # Make sure an abandoned generator doesn't leave a JVM running
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode > 0:
+        raise subprocess.CalledProcessError(returncode, "jfr print")
+
+def _load_chunk_events(cfile, selection=None):
+    """
+    Decodes a whole chunk into a list; runs in a worker process in parallel mode. Returns
+    (events, "jfr_print" StageRecord), since the worker's metrics never reach the parent.
+    """
+    record = StageRecord("jfr_print")
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    events = list(_iter_chunk_events(cfile, selection))
+    record.wall = time.perf_counter() - wall_start
+    record.cpu = time.process_time() - cpu_start
+    record.events = len(events)
+    return events, record
+
+def _iter_chunks_parallel(chunk_files, workers, errors, selection=None):
+    """
+    Converts chunks concurrently on a bounded process pool (each worker drives its own
+    `jfr print` process and decodes its JSON, which would serialize on the GIL in threads)
+    and yields their events in chunk order. At most `workers` chunks are in flight at once,
+    so memory stays bounded by the chunk size times the pool size.
+    """
+    files = iter(chunk_files)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            for cfile in files:
+                pending.append((cfile, pool.submit(_load_chunk_events, cfile, selection)))
+                if len(pending) >= workers:
+                    break
+            while pending:
+                cfile, future = pending.popleft()
+                next_file = next(files, None)
+                if next_file is not None:
+                    pending.append((next_file, pool.submit(_load_chunk_events, next_file, selection)))
+                try:
+                    events, record = future.result()
+                except Exception as e:
+                    print(f"Error processing JFR chunk {cfile}: {e}")
+                    errors.append(cfile)
+                    continue
+                REGISTRY.record(record)
+                yield from events
+        finally:
+            # Don't start chunks nobody will read if the consumer stops early
+            for _, future in pending:
+                future.cancel()
+
+def _iter_native_events(jfr_path, errors, selection=None):
+    """
+    Decodes a .jfr recording in-process with jfr_reader, without a JDK or the JSON round trip.
+    Unselected events are skipped undecoded and unselected fields are never resolved.
+    """
+    print(f"Reading {jfr_path} with the native JFR reader")
+    event_types = selection.events if selection else None
+    fields = selection.fields if selection else None
+    try:
+        yield from timed_iter("decode_native", read_jfr_events(jfr_path, event_types=event_types, fields=fields))
+    except Exception as e:
+        print(f"Error reading JFR recording {jfr_path}: {e}")
+        errors.append(jfr_path)
+
+def _iter_binary_events(jfr_path, chunking_threshold_mb, workers, native, errors, selection=None):
+    """
+    Decodes a .jfr recording, recording failed chunks in `errors` instead of raising.
+    """
+    if native:
+        yield from _iter_native_events(jfr_path, errors, selection)
+        return
+
+    # For .jfr, disassemble if large
+    chunk_files = disassemble_jfr(jfr_path, max_size_mb=chunking_threshold_mb)
+    if workers and workers > 1 and len(chunk_files) > 1:
+        yield from _iter_chunks_parallel(chunk_files, workers, errors, selection)
+        return
+    for cfile in chunk_files:
+        try:
+            yield from _iter_chunk_events(cfile, selection)
+        except Exception as e:
+            print(f"Error processing JFR chunk {cfile}: {e}")
+            errors.append(cfile)
+            continue
+
+def iter_jfr_events(jfr_path, chunking_threshold_mb=None, workers=1, native=False, cache=None, content_digest=None,
+                    selection=None):
+    """
+    Streaming counterpart of parse_jfr: yields events one at a time instead of building a list.
+    .json inputs are decoded incrementally from disk; .jfr inputs are chunked if large and
+    decoded straight from the `jfr print` stdout pipe. Errors are isolated per chunk.
 
     Parameters:
     - jfr_path: Path to the JFR or JSON file
     - chunking_threshold_mb: Threshold size in MB above which to chunk (default 50 MB)
+    - workers: Number of chunks to convert concurrently (default 1, i.e. serial streaming)
+    - native: Decode .jfr files with the pure-Python jfr_reader instead of the `jfr` CLI
+    - cache: Optional parse_cache.ParseCache; .jfr results are reused across runs of the same content
+    - content_digest: SHA-256 hex of the file if already known (e.g. hashed during upload)
+    - selection: Optional event_selection.EventSelection of event types and fields to decode
     """
     if chunking_threshold_mb is None:
         chunking_threshold_mb = 50
+    if not os.path.exists(jfr_path):
+        print(f"JFR file not found: {jfr_path}")
+        return
+
     # If a .json, read as already-prepared snippet
     if jfr_path.endswith('.json'):
         with open(jfr_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            events = iter_json_array(f)
+            yield from timed_iter("decode_json", selection.apply(events) if selection else events)
+        return
 
-    # For .jfr, disassemble if large
-    chunk_files = disassemble_jfr(jfr_path, max_size_mb=chunking_threshold_mb)
-    all_events = []
-    for cfile in chunk_files:
-        output_file = cfile + ".json"
-        try:
-            print(f"Converting {cfile} to JSON: {output_file}")
-            subprocess.run(
-                ["jfr", "print", "--json", "--categories", "Java Application,Threads,GC,Socket,IO,JVM", cfile],
-                check=True,
-                stdout=open(output_file, "w", encoding="utf-8")
-            )
-            with open(output_file, "r", encoding="utf-8") as f:
-                raw = json.load(f)
-                all_events.extend(raw)
-            os.remove(output_file)
-        except Exception as e:
-            print(f"Error processing JFR chunk {cfile}: {e}")
-            continue
-    return all_events
+    errors = []
+    events = _iter_binary_events(jfr_path, chunking_threshold_mb, workers, native, errors, selection)
+    if cache is None:
+        yield from events
+        return
+
+    # Worker count doesn't change the decoded events, so it isn't part of the key
+    options = {"categories": JFR_PRINT_CATEGORIES}
+    if selection is not None:
+        options = {"selection": selection.options()}
+    key = cache.key_for(
+        jfr_path,
+        digest=content_digest,
+        chunking_threshold_mb=chunking_threshold_mb,
+        native=native,
+        **options
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"Loading parsed events for {jfr_path} from cache")
+        yield from timed_iter("cache_read", cached)
+        return
+    # Only publish the entry if every chunk decoded cleanly
+    yield from cache.store(key, events, should_commit=lambda: not errors)
+
+def parse_jfr(jfr_path, chunking_threshold_mb=None, workers=1, native=False, cache=None, selection=None):
+    """
+    Extracts events or stack traces from a JFR file using `jfr print` (JDK 17+ recommended).
+    If the file is a .json/text file, loads the JSON or text directly.
+    For large .jfr files, chunks and aggregates from all chunks.
+    Use iter_jfr_events to consume events without materializing the full list.
+
+    Parameters:
+    - jfr_path: Path to the JFR or JSON file
+    - chunking_threshold_mb: Threshold size in MB above which to chunk (default 50 MB)
+    - workers: Number of chunks to convert concurrently (default 1)
+    - native: Decode .jfr files with the pure-Python jfr_reader instead of the `jfr` CLI
+    - cache: Optional parse_cache.ParseCache to reuse decoded .jfr events
+    - selection: Optional event_selection.EventSelection of event types and fields to decode
+    """
+    return list(iter_jfr_events(
+        jfr_path, chunking_threshold_mb=chunking_threshold_mb, workers=workers, native=native, cache=cache,
+        selection=selection))
@@ -0,0 +1,468 @@
+import datetime
+import struct
+
+CHUNK_MAGIC = b"FLR\0"
+CHUNK_HEADER_SIZE = 68
+METADATA_TYPE_ID = 0
+CONSTANT_POOL_TYPE_ID = 1
+COMPRESSED_INTS_FLAG = 1
+# Frames kept per stack trace, as `jfr print` does by default (its --stack-depth)
+DEFAULT_STACK_DEPTH = 5
+
+PRIMITIVE_TYPES = {
+    "boolean", "char", "byte", "short", "int", "long", "float", "double", "java.lang.String"
+}
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _shortest_float(value):
+    """
+    The shortest decimal that reads back as the same 32-bit float, as Java's Float.toString
+    prints it (not the float's exact, much longer double expansion).
+    """
+    if value != value or value in (float("inf"), float("-inf")):
+        return value
+    packed = struct.pack(">f", value)
+    for digits in range(1, 10):
+        shortest = float(f"{value:.{digits}g}")
+        if struct.pack(">f", shortest) == packed:
+            return shortest
+    return value
+
+
+class JfrFormatError(ValueError):
+    """Raised when a file does not look like a JFR recording or a chunk is truncated."""
+
+
+class _PoolRef:
+    """Unresolved constant pool reference; replaced by the pooled value once all pools are read."""
+    __slots__ = ("type_id", "key")
+
+    def __init__(self, type_id, key):
+        self.type_id = type_id
+        self.key = key
+
+
+class _Type:
+    __slots__ = ("id", "name", "super_type", "fields", "annotations")
+
+    @property
+    def simple(self):
+        """
+        One field and no super type (e.g. jdk.types.Symbol): the JDK represents such values by
+        their field's value alone.
+        """
+        return len(self.fields) == 1 and self.super_type is None
+
+    def __init__(self, type_id, name, super_type):
+        self.id = type_id
+        self.name = name
+        self.super_type = super_type
+        self.fields = []
+        self.annotations = {}
+
+
+class _Field:
+    __slots__ = ("name", "type_id", "constant_pool", "array", "annotations")
+
+    def __init__(self, name, type_id, constant_pool, array):
+        self.name = name
+        self.type_id = type_id
+        self.constant_pool = constant_pool
+        self.array = array
+        self.annotations = {}
+
+
+class _Input:
+    """
+    Cursor over the bytes of one chunk. Integers are LEB128 varints when the chunk header
+    has the compressed-integers flag set (the JDK default) and big-endian otherwise.
+    """
+
+    def __init__(self, data, compressed):
+        self.data = data
+        self.pos = 0
+        self.compressed = compressed
+
+    def read_varlong(self):
+        data = self.data
+        pos = self.pos
+        result = 0
+        for shift in range(0, 56, 7):
+            b = data[pos]
+            pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                self.pos = pos
+                return result
+        # Ninth byte carries a full 8 bits
+        result |= data[pos] << 56
+        self.pos = pos + 1
+        return result
+
+    def _read_fixed(self, fmt, size):
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += size
+        return value
+
+    def read_long(self):
+        if not self.compressed:
+            return self._read_fixed(">q", 8)
+        v = self.read_varlong()
+        return v - (1 << 64) if v >= 1 << 63 else v
+
+    def read_int(self):
+        if not self.compressed:
+            return self._read_fixed(">i", 4)
+        v = self.read_varlong() & 0xFFFFFFFF
+        return v - (1 << 32) if v >= 1 << 31 else v
+
+    def read_short(self):
+        if not self.compressed:
+            return self._read_fixed(">h", 2)
+        v = self.read_varlong() & 0xFFFF
+        return v - (1 << 16) if v >= 1 << 15 else v
+
+    def read_char(self):
+        if not self.compressed:
+            return chr(self._read_fixed(">H", 2))
+        return chr(self.read_varlong() & 0xFFFF)
+
+    def read_byte(self):
+        return self._read_fixed(">b", 1)
+
+    def read_boolean(self):
+        return self._read_fixed(">B", 1) != 0
+
+    def read_float(self):
+        return _shortest_float(self._read_fixed(">f", 4))
+
+    def read_double(self):
+        return self._read_fixed(">d", 8)
+
+    def read_string(self, string_type_id=None):
+        encoding = self.read_byte()
+        if encoding == 0:
+            return None
+        if encoding == 1:
+            return ""
+        if encoding == 2:
+            return _PoolRef(string_type_id, self.read_long())
+        if encoding == 3 or encoding == 5:
+            length = self.read_int()
+            raw = bytes(self.data[self.pos:self.pos + length])
+            self.pos += length
+            return raw.decode("utf-8" if encoding == 3 else "latin-1")
+        if encoding == 4:
+            return "".join(self.read_char() for _ in range(self.read_int()))
+        raise JfrFormatError(f"Unknown string encoding {encoding} at offset {self.pos - 1}")
+
+
+def _read_metadata(inp, offset):
+    """
+    Decodes the metadata event at `offset`: a string table followed by an element tree
+    whose <class> nodes describe every event and constant pool type in the chunk.
+    """
+    inp.pos = offset
+    inp.read_int()  # event size
+    if inp.read_long() != METADATA_TYPE_ID:
+        raise JfrFormatError("Metadata offset does not point at a metadata event")
+    inp.read_long()  # start time
+    inp.read_long()  # duration
+    inp.read_long()  # metadata id
+    strings = [inp.read_string() for _ in range(inp.read_int())]
+
+    def element():
+        name = strings[inp.read_int()]
+        attributes = {}
+        for _ in range(inp.read_int()):
+            key = strings[inp.read_int()]
+            attributes[key] = strings[inp.read_int()]
+        children = [element() for _ in range(inp.read_int())]
+        return name, attributes, children
+
+    root = element()
+    types = {}
+    classes = []
+
+    def walk(node):
+        name, attributes, children = node
+        if name == "class":
+            classes.append(node)
+        for child in children:
+            walk(child)
+
+    walk(root)
+    for name, attributes, children in classes:
+        t = _Type(int(attributes["id"]), attributes["name"], attributes.get("superType"))
+        for child_name, child_attributes, _ in children:
+            if child_name == "field":
+                t.fields.append(_Field(
+                    child_attributes["name"],
+                    int(child_attributes["class"]),
+                    child_attributes.get("constantPool") == "true",
+                    child_attributes.get("dimension") == "1",
+                ))
+        types[t.id] = t
+    # Annotations reference other classes by id, so resolve them once all types are known
+    for (_, attributes, children) in classes:
+        t = types[int(attributes["id"])]
+        for child_name, child_attributes, grandchildren in children:
+            if child_name == "annotation":
+                _add_annotation(t.annotations, types, child_attributes)
+            elif child_name == "field":
+                field = next(f for f in t.fields if f.name == child_attributes["name"])
+                for gc_name, gc_attributes, _ in grandchildren:
+                    if gc_name == "annotation":
+                        _add_annotation(field.annotations, types, gc_attributes)
+    return types
+
+
+def _add_annotation(target, types, attributes):
+    annotation_type = types.get(int(attributes["class"]))
+    if annotation_type is not None:
+        target[annotation_type.name] = attributes.get("value")
+
+
+def _copy_resolved(value):
+    if isinstance(value, dict):
+        return {k: _copy_resolved(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_resolved(v) for v in value]
+    return value
+
+
+class JfrChunk:
+    """
+    One self-contained chunk of a JFR recording: header, metadata, constant pools and events.
+    """
+
+    def __init__(self, data):
+        if bytes(data[:4]) != CHUNK_MAGIC:
+            raise JfrFormatError("Not a JFR chunk (bad magic)")
+        if len(data) < CHUNK_HEADER_SIZE:
+            raise JfrFormatError("Truncated JFR chunk header")
+        (self.major, self.minor, self.size, cp_offset, metadata_offset, self.start_nanos,
+         self.duration_nanos, self.start_ticks, self.ticks_per_second,
+         features) = struct.unpack_from(">HHqqqqqqqi", data, 4)
+        if len(data) < self.size:
+            raise JfrFormatError("Truncated JFR chunk")
+        self._input = _Input(data, bool(features & COMPRESSED_INTS_FLAG))
+        self.types = _read_metadata(self._input, metadata_offset)
+        self._type_ids = {t.name: t.id for t in self.types.values()}
+        self._string_type_id = self._type_ids.get("java.lang.String")
+        self._stack_trace_type_id = self._type_ids.get("jdk.types.StackTrace")
+        self._pools = {}
+        self._resolved = {}
+        self._read_constant_pools(cp_offset)
+
+    def _read_constant_pools(self, offset):
+        inp = self._input
+        while True:
+            inp.pos = offset
+            inp.read_int()  # event size
+            if inp.read_long() != CONSTANT_POOL_TYPE_ID:
+                raise JfrFormatError("Constant pool chain points at a non-pool event")
+            inp.read_long()  # start time
+            inp.read_long()  # duration
+            delta = inp.read_long()
+            inp.read_boolean()  # flush
+            for _ in range(inp.read_int()):
+                t = self.types[inp.read_long()]
+                pool = self._pools.setdefault(t.id, {})
+                for _ in range(inp.read_int()):
+                    key = inp.read_long()
+                    pool[key] = self._read_value(t, False)
+            if delta == 0:
+                return
+            offset += delta
+
+    def _read_value(self, t, constant_pool):
+        inp = self._input
+        if constant_pool:
+            return _PoolRef(t.id, inp.read_long())
+        name = t.name
+        if name in PRIMITIVE_TYPES:
+            if name == "long":
+                return inp.read_long()
+            if name == "int":
+                return inp.read_int()
+            if name == "java.lang.String":
+                return inp.read_string(self._string_type_id)
+            if name == "boolean":
+                return inp.read_boolean()
+            if name == "double":
+                return inp.read_double()
+            if name == "float":
+                return inp.read_float()
+            if name == "short":
+                return inp.read_short()
+            if name == "byte":
+                return inp.read_byte()
+            return inp.read_char()
+        if t.simple:
+            return self._read_field(t.fields[0])
+        values = {}
+        for field in t.fields:
+            values[field.name] = self._read_field(field)
+        return values
+
+    def _read_field(self, field):
+        ft = self.types[field.type_id]
+        if field.array:
+            return [self._read_value(ft, field.constant_pool) for _ in range(self._input.read_int())]
+        return self._read_value(ft, field.constant_pool)
+
+    def _lookup(self, ref):
+        """
+        The resolved value of a constant pool entry. Entries are resolved once per chunk and
+        cached; every caller gets its own copy, so an event's thread or stack trace can be
+        modified downstream without changing other events that share the entry.
+        """
+        cache_key = (ref.type_id, ref.key)
+        if cache_key in self._resolved:
+            return _copy_resolved(self._resolved[cache_key])
+        # Guard against self-referencing pool entries (e.g. class loaders of class loaders)
+        self._resolved[cache_key] = None
+        value = self._resolve(self._pools.get(ref.type_id, {}).get(ref.key))
+        self._resolved[cache_key] = value
+        return _copy_resolved(value)
+
+    def _resolve(self, value):
+        if isinstance(value, _PoolRef):
+            return self._lookup(value)
+        if isinstance(value, dict):
+            return {k: self._resolve(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(v) for v in value]
+        return value
+
+    def _ticks_to_nanos(self, ticks):
+        # Same double arithmetic as the JDK's TimeConverter, so results match to the nanosecond
+        return self.start_nanos + int((ticks - self.start_ticks) / (self.ticks_per_second / 1e9))
+
+    def _format(self, field, value):
+        """Renders tick-based timestamps and timespans the way `jfr print --json` does."""
+        if value is None or not field.annotations:
+            return value
+        if "jdk.jfr.Timestamp" in field.annotations and isinstance(value, int):
+            unit = field.annotations["jdk.jfr.Timestamp"]
+            if unit == "MILLISECONDS_SINCE_EPOCH":
+                nanos = value * 1_000_000
+            else:
+                nanos = self._ticks_to_nanos(value)
+            return _format_timestamp(nanos)
+        if "jdk.jfr.Timespan" in field.annotations and isinstance(value, int):
+            unit = field.annotations["jdk.jfr.Timespan"]
+            scale = {"NANOSECONDS": 1, "MICROSECONDS": 1_000, "MILLISECONDS": 1_000_000,
+                     "SECONDS": 1_000_000_000}.get(unit)
+            if scale is None:
+                nanos = int(value / (self.ticks_per_second / 1e9))
+            else:
+                nanos = value * scale
+            return _format_duration(nanos)
+        return value
+
+    def _event_positions(self, wanted):
+        """
+        (offset, type) of the chunk's events in `jfr print` order: by end time (start time plus
+        duration), ties in file order. Only each event's header and first two fields are read.
+        """
+        inp = self._input
+        positions = []
+        pos = CHUNK_HEADER_SIZE
+        while pos < self.size:
+            inp.pos = pos
+            size = inp.read_int()
+            if size <= 0:
+                raise JfrFormatError(f"Invalid event size {size} at offset {pos}")
+            type_id = inp.read_long()
+            t = self.types.get(type_id)
+            if (t is not None and type_id not in (METADATA_TYPE_ID, CONSTANT_POOL_TYPE_ID)
+                    and (wanted is None or type_id in wanted)):
+                end = self.start_ticks
+                if t.fields and t.fields[0].name == "startTime":
+                    end = inp.read_long()
+                    if len(t.fields) > 1 and t.fields[1].name == "duration":
+                        end += inp.read_long()
+                positions.append((self._ticks_to_nanos(end), pos, t))
+            pos += size
+        positions.sort(key=lambda p: p[0])
+        return [(pos, t) for _, pos, t in positions]
+
+    def events(self, event_types=None, fields=None, stack_depth=DEFAULT_STACK_DEPTH):
+        """
+        Yields {"type": ..., "values": {...}} dicts for every event in the chunk, in the order
+        `jfr print` sorts them (by end time). Events are decoded one at a time; only their
+        offsets are held for sorting. When `event_types` is given, events of other types are
+        skipped without decoding. When `fields` is given, other fields are read past but not
+        resolved or kept. Stack traces keep their top `stack_depth` frames (None = all).
+        """
+        inp = self._input
+        wanted = None
+        if event_types is not None:
+            wanted = {self._type_ids[name] for name in event_types if name in self._type_ids}
+        wanted_fields = frozenset(fields) if fields is not None else None
+        for pos, t in self._event_positions(wanted):
+            inp.pos = pos
+            inp.read_int()  # event size
+            inp.read_long()  # type id
+            values = {}
+            for field in t.fields:
+                value = self._read_field(field)
+                if wanted_fields is None or field.name in wanted_fields:
+                    value = self._format(field, self._resolve(value))
+                    if stack_depth is not None and field.type_id == self._stack_trace_type_id and value:
+                        value["frames"] = value["frames"][:stack_depth]
+                    values[field.name] = value
+            yield {"type": t.name, "values": values}
+
+
+def _format_timestamp(nanos):
+    """Like java.time.Instant.toString(): nanoseconds in groups of three digits, as needed."""
+    seconds, rem = divmod(nanos, 1_000_000_000)
+    ts = (_EPOCH + datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%S")
+    if rem == 0:
+        return ts + "Z"
+    fraction = f"{rem:09d}"
+    while fraction.endswith("000"):
+        fraction = fraction[:-3]
+    return f"{ts}.{fraction}Z"
+
+
+def _format_duration(nanos):
+    seconds, rem = divmod(nanos, 1_000_000_000)
+    if rem == 0:
+        return f"PT{seconds}S"
+    return f"PT{seconds}.{rem:09d}".rstrip("0") + "S"
+
+
+def iter_chunks(jfr_path):
+    """
+    Yields a JfrChunk for every chunk in a recording file, reading one chunk into memory at a time.
+    """
+    with open(jfr_path, "rb") as f:
+        while True:
+            header = f.read(CHUNK_HEADER_SIZE)
+            if not header:
+                return
+            if len(header) < CHUNK_HEADER_SIZE or header[:4] != CHUNK_MAGIC:
+                raise JfrFormatError(f"Not a JFR chunk at offset {f.tell() - len(header)}")
+            size = struct.unpack_from(">q", header, 8)[0]
+            body = f.read(size - CHUNK_HEADER_SIZE)
+            yield JfrChunk(header + body)
+
+
+def read_jfr_events(jfr_path, event_types=None, fields=None):
+    """
+    Decodes a binary .jfr recording directly, without the `jfr` CLI or a JDK.
+    Yields the same event dicts as `jfr print --json` ({"type": ..., "values": {...}}).
+
+    Parameters:
+    - jfr_path: Path to the .jfr recording
+    - event_types: Optional collection of event type names (e.g. "jdk.GarbageCollection") to keep
+    - fields: Optional collection of top-level field names to keep (e.g. "startTime")
+    """
+    for chunk in iter_chunks(jfr_path):
+        yield from chunk.events(event_types=event_types, fields=fields)
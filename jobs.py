@@ -0,0 +1,159 @@
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(RuntimeError):
+    """Raised by JobQueue.submit when the backlog is at capacity."""
+
+
+class Job:
+    """
+    State of one background analysis. `stage` names the pipeline step currently running
+    (e.g. "parsing", "analyzing") and `progress` holds step-specific counters. `output`
+    collects partial results (e.g. streamed LLM text) published while the job runs.
+    """
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = QUEUED
+        self.stage = None
+        self.progress = {}
+        self.output = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded background job runner.
+
+    Jobs wait in a queue of at most `max_queued` entries (submit raises QueueFullError beyond
+    that) and run on `workers` daemon threads. Within a job, `stage()` additionally limits how
+    many jobs may be in a given stage at once, so e.g. CPU-heavy parsing and memory-heavy
+    inference can be throttled separately. Only the last `history` finished jobs are kept.
+    Defaults come from JOB_WORKERS, JOB_QUEUE_SIZE, JOB_PARSE_CONCURRENCY,
+    JOB_INFERENCE_CONCURRENCY (default: LOCAL_LLM_BATCH_SIZE) and JOB_HISTORY.
+    """
+
+    def __init__(self, workers=None, max_queued=None, stage_limits=None, history=None):
+        if workers is None:
+            workers = int(os.getenv("JOB_WORKERS", "2"))
+        if max_queued is None:
+            max_queued = int(os.getenv("JOB_QUEUE_SIZE", "8"))
+        if stage_limits is None:
+            stage_limits = {
+                "parsing": int(os.getenv("JOB_PARSE_CONCURRENCY", "2")),
+                # With dynamic batching, let as many jobs reach inference as fit in one batch
+                "analyzing": int(os.getenv("JOB_INFERENCE_CONCURRENCY", os.getenv("LOCAL_LLM_BATCH_SIZE", "1"))),
+            }
+        if history is None:
+            history = int(os.getenv("JOB_HISTORY", "100"))
+        self.workers = max(1, workers)
+        self.history = history
+        self._queue = queue.Queue(maxsize=max(1, max_queued))
+        self._stages = {name: threading.BoundedSemaphore(max(1, n)) for name, n in stage_limits.items()}
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"jfr-job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def has_capacity(self):
+        return not self._queue.full()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(job, *args, **kwargs) and returns its Job immediately.
+        The function's return value becomes job.result; an exception marks the job failed.
+        """
+        self._ensure_workers()
+        job = Job(uuid.uuid4().hex)
+        try:
+            self._queue.put_nowait((job, fn, args, kwargs))
+        except queue.Full:
+            raise QueueFullError("Analysis queue is full, try again later")
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queued(self):
+        return self._queue.qsize()
+
+    @contextmanager
+    def stage(self, job, name):
+        """Runs a block as pipeline stage `name`, waiting for a free slot if the stage is limited."""
+        semaphore = self._stages.get(name)
+        job.stage = f"waiting for {name}" if semaphore is not None else name
+        if semaphore is not None:
+            semaphore.acquire()
+        try:
+            job.stage = name
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def _work(self):
+        while True:
+            job, fn, args, kwargs = self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = fn(job, *args, **kwargs)
+                job.status = DONE
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e) or e.__class__.__name__
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+                job.stage = None
+                self._queue.task_done()
+                self._prune()
+
+    def _prune(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+            for job_id in finished[:max(0, len(finished) - self.history)]:
+                del self._jobs[job_id]
@@ -0,0 +1,104 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from parse_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIR, "llm_responses.sqlite")
+DEFAULT_LLM_CACHE_TTL_HOURS = 24 * 7
+DEFAULT_LLM_CACHE_MAX_MB = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def response_key(provider, model, prompt, **params):
+    """Hash of everything that determines an LLM response: provider, model, prompt and generation params."""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "prompt": prompt, "params": params},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of LLM responses. Entries expire after `ttl_hours`; when the stored
+    responses exceed `max_size_mb` the least recently used ones are deleted.
+    Defaults come from LLM_CACHE_PATH, LLM_CACHE_TTL_HOURS and LLM_CACHE_MAX_MB.
+    """
+
+    def __init__(self, path=None, ttl_hours=None, max_size_mb=None):
+        if path is None:
+            path = os.getenv("LLM_CACHE_PATH", DEFAULT_LLM_CACHE_PATH)
+        if ttl_hours is None:
+            ttl_hours = float(os.getenv("LLM_CACHE_TTL_HOURS", DEFAULT_LLM_CACHE_TTL_HOURS))
+        if max_size_mb is None:
+            max_size_mb = float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_LLM_CACHE_MAX_MB))
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        # One short-lived connection per call keeps the cache safe to use from worker threads.
+        # Callers close it; its own context manager only commits or rolls back the transaction.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        """Returns the cached response for `key`, or None if missing or expired."""
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            return response
+
+    def put(self, key, response):
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now)
+            )
+        self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until the size cap is met."""
+        with contextlib.closing(self._connect()) as conn, conn:
+            if self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+
+    def clear(self):
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with contextlib.closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 120.0
+DEFAULT_MAX_RETRIES = 4
+# Responses worth retrying: timeouts, conflicts, rate limits and server-side failures
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+_RESET_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_RESET_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class LLMRequestError(RuntimeError):
+    """A chat completion request failed, after any retries."""
+
+
+def _reset_seconds(value):
+    """Seconds in a Retry-After ("7", "0.5") or x-ratelimit-reset-* ("1s", "6m0s", "20ms") header."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _RESET_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _RESET_UNITS[unit] for n, unit in parts)
+
+
+class AsyncChatClient:
+    """
+    Pooled asyncio client for OpenAI-compatible /chat/completions endpoints: OpenAI itself,
+    or a local server (vLLM, llama.cpp, Ollama, ...) selected with $OPENAI_BASE_URL.
+
+    - One httpx.AsyncClient, so connections are kept alive and reused across calls.
+    - At most `max_concurrency` requests are in flight, and with `requests_per_minute` they
+      start at least 60/requests_per_minute seconds apart.
+    - A 429, or a response reporting no requests left (x-ratelimit-remaining-requests: 0),
+      pauses every request until the server's reset time, not just the one that hit it.
+    - Timeouts, connection errors, 429 and 5xx responses are retried up to `max_retries` times
+      with exponential backoff and jitter (or after the server's Retry-After).
+    - Each attempt is bounded by `timeout` seconds.
+    Defaults come from $LLM_MODEL, $OPENAI_API_KEY, $LLM_CONCURRENCY, $LLM_REQUESTS_PER_MINUTE,
+    $LLM_TIMEOUT_SECONDS and $LLM_MAX_RETRIES. Use as an async context manager, or aclose().
+    """
+
+    def __init__(self, model=None, api_key=None, base_url=None, max_concurrency=None, requests_per_minute=None,
+                 timeout=None, max_retries=None, transport=None):
+        import httpx
+
+        self.model = model or os.getenv("LLM_MODEL", "gpt-4")
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key and self.base_url == DEFAULT_BASE_URL:
+            raise EnvironmentError("OPENAI_API_KEY is not set in environment.")
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("LLM_CONCURRENCY", DEFAULT_CONCURRENCY))
+        if requests_per_minute is None:
+            requests_per_minute = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+        if timeout is None:
+            timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS))
+        if max_retries is None:
+            max_retries = int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._resume_at = 0.0
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            transport=transport)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _pause(self, seconds):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def _wait_turn(self):
+        """Waits out any rate-limit pause and the requests-per-minute spacing."""
+        while True:
+            now = time.monotonic()
+            wait = self._resume_at - now
+            if wait <= 0 and self._interval:
+                wait = self._next_start - now
+                if wait <= 0:
+                    self._next_start = now + self._interval
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def _backoff(self, attempt):
+        return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _observe_limits(self, response):
+        if response.headers.get("x-ratelimit-remaining-requests") == "0":
+            reset = _reset_seconds(response.headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self._pause(reset)
+
+    async def complete(self, messages, temperature=None, max_tokens=None):
+        """The assistant message for `messages`; raises LLMRequestError once retries are exhausted."""
+        import httpx
+
+        payload = {"model": self.model, "messages": messages}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        error = None
+        for attempt in range(self.max_retries + 1):
+            delay = None
+            async with self._semaphore:
+                await self._wait_turn()
+                try:
+                    response = await self._client.post("/chat/completions", json=payload)
+                except httpx.TransportError as e:
+                    # Includes timeouts
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    self._observe_limits(response)
+                    if response.status_code == 200:
+                        try:
+                            return response.json()["choices"][0]["message"]["content"].strip()
+                        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                            raise LLMRequestError(f"Unexpected chat completion response: {e}") from e
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code not in RETRY_STATUSES:
+                        raise LLMRequestError(error)
+                    delay = _reset_seconds(response.headers.get("retry-after"))
+                    if response.status_code == 429:
+                        self._pause(delay if delay is not None else self._backoff(attempt))
+            if attempt < self.max_retries:
+                # Outside the semaphore, so other requests go ahead meanwhile
+                await asyncio.sleep(delay if delay is not None else self._backoff(attempt))
+        raise LLMRequestError(f"Chat completion failed after {self.max_retries + 1} attempts: {error}")
+
+    async def stream(self, messages, temperature=None, max_tokens=None):
+        """
+        Async generator of the assistant message for `messages` as it is generated (server-sent
+        events). Failures before the first piece are retried like complete(); a stream cut off
+        later raises LLMRequestError, since the pieces already yielded can't be taken back.
+        """
+        import httpx
+
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        error = None
+        for attempt in range(self.max_retries + 1):
+            delay = None
+            started = False
+            async with self._semaphore:
+                await self._wait_turn()
+                try:
+                    async with self._client.stream("POST", "/chat/completions", json=payload) as response:
+                        self._observe_limits(response)
+                        if response.status_code == 200:
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[len("data:"):].strip()
+                                if data == "[DONE]":
+                                    return
+                                try:
+                                    content = json.loads(data)["choices"][0]["delta"].get("content")
+                                except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                                    raise LLMRequestError(f"Unexpected chat completion chunk: {e}") from e
+                                if content:
+                                    started = True
+                                    yield content
+                            return
+                        await response.aread()
+                        error = f"HTTP {response.status_code}: {response.text[:200]}"
+                        if response.status_code not in RETRY_STATUSES:
+                            raise LLMRequestError(error)
+                        delay = _reset_seconds(response.headers.get("retry-after"))
+                        if response.status_code == 429:
+                            self._pause(delay if delay is not None else self._backoff(attempt))
+                except httpx.TransportError as e:
+                    if started:
+                        raise LLMRequestError(f"Chat completion stream interrupted: {type(e).__name__}: {e}") from e
+                    error = f"{type(e).__name__}: {e}"
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay if delay is not None else self._backoff(attempt))
+        raise LLMRequestError(f"Chat completion failed after {self.max_retries + 1} attempts: {error}")
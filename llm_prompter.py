@@ -1,103 +1,631 @@
+import asyncio
+import copy
+import gc
 import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
 
-def build_prompt(features_summary):
+from metrics import REGISTRY, StageRecord, stage, timed_iter
+from prompt_budget import approx_token_count, compact_summary, token_counter
+
+OPENAI_TEMPERATURE = 0.1
+OPENAI_MAX_TOKENS = 700
+LOCAL_TEMPERATURE = 0.1
+LOCAL_MAX_NEW_TOKENS = 700
+DEFAULT_LOCAL_PROMPT_TOKENS = 1024
+
+class LocalModelSetupError(RuntimeError):
+    """Raised when a local model can't be downloaded or found."""
+
+PROMPT_PREAMBLE = (
+    "You are an expert JVM performance and diagnostics assistant. "
+    "Review the following summary of Java Flight Recorder (JFR) data, "
+    "and list any potential issues, root causes, and actionable recommendations. "
+    "Explain your conclusions clearly for a JVM/application engineer.\n\n"
+)
+PROMPT_QUESTION = "What are the JVM performance or stability risks and what should the user look at first?"
+
+def prompt_token_budget(local):
+    """
+    Token budget for the whole prompt: PROMPT_TOKEN_BUDGET if set (0 = unlimited), otherwise
+    DEFAULT_LOCAL_PROMPT_TOKENS for local models and unlimited for OpenAI.
+    """
+    configured = os.getenv("PROMPT_TOKEN_BUDGET")
+    if configured:
+        return int(configured) or None
+    return DEFAULT_LOCAL_PROMPT_TOKENS if local else None
+
+def build_prompt(features_summary, token_budget=None, count_tokens=None):
     """
     Prepares LLM prompt text using extracted features.
+    With a token_budget, the summary is compacted to fit (see prompt_budget.compact_summary):
+    the most diagnostic sections are kept and the dropped ones are named in the prompt, instead
+    of letting the model's truncation silently cut off context.
     """
-    prompt = (
-        "You are an expert JVM performance and diagnostics assistant. "
-        "Review the following summary of Java Flight Recorder (JFR) data, "
-        "and list any potential issues, root causes, and actionable recommendations. "
-        "Explain your conclusions clearly for a JVM/application engineer.\n\n"
-        f"{features_summary}\n\n"
-        "What are the JVM performance or stability risks and what should the user look at first?"
-    )
+    with stage("prompt_build") as record:
+        count_tokens = count_tokens or approx_token_count
+        if token_budget:
+            budget = token_budget - count_tokens(PROMPT_PREAMBLE + "\n\n" + PROMPT_QUESTION)
+            # The "omitted" note needs room too: until it fits, compact again with its size reserved,
+            # which may drop more sections and lengthen the note
+            reserve = 0
+            while True:
+                summary, dropped = compact_summary(features_summary, budget - reserve, count_tokens)
+                note = f"\n(Omitted to fit the prompt budget: {', '.join(dropped)})" if dropped else ""
+                needed = count_tokens(note)
+                if needed <= reserve or count_tokens(summary + note) <= budget:
+                    break
+                reserve = needed
+            if dropped:
+                print(f"Prompt budget of {token_budget} tokens: dropped {', '.join(dropped)}")
+            features_summary = summary + note
+        prompt = (
+            PROMPT_PREAMBLE +
+            f"{features_summary}\n\n" +
+            PROMPT_QUESTION
+        )
+        record.tokens = count_tokens(prompt)
     return prompt
 
-def analyze_with_openai_llm(features_summary):
-    import openai
-    model = os.getenv("LLM_MODEL", "gpt-4")
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise EnvironmentError("OPENAI_API_KEY is not set in environment.")
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Process-wide llm_cache.ResponseCache, created on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            from llm_cache import ResponseCache
+            _response_cache = ResponseCache()
+        return _response_cache
 
-    openai.api_key = api_key
+def llm_cache_enabled(use_cache=None):
+    """A per-call use_cache wins; otherwise the LLM_CACHE environment variable decides (default on)."""
+    if use_cache is not None:
+        return use_cache
+    return os.getenv("LLM_CACHE", "1").lower() not in ("0", "false", "no")
+
+def _cache_lookup(provider, model, prompt, params, use_cache):
+    """(cache, key, cached response) for a call; cache is None when caching is off or unavailable."""
+    if not llm_cache_enabled(use_cache):
+        return None, None, None
+    from llm_cache import response_key
     try:
-        completion = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You specialize in Java/JVM/JFR diagnostics."},
-                {"role": "user", "content": build_prompt(features_summary)}
-            ],
-            temperature=0.1,
-            max_tokens=700
-        )
-        return completion.choices[0].message.content.strip()
+        cache = get_response_cache()
+        key = response_key(provider, model, prompt, **params)
+        cached = cache.get(key)
+    except Exception as e:
+        print(f"LLM response cache unavailable: {e}")
+        return None, None, None
+    if cached is not None:
+        print(f"Using cached {provider} response for model {model}")
+    return cache, key, cached
+
+def _cache_store(cache, key, response):
+    if cache is not None:
+        try:
+            cache.put(key, response)
+        except Exception as e:
+            print(f"Could not store LLM response in cache: {e}")
+
+def cached_response(provider, model, prompt, params, generate, use_cache):
+    """
+    Returns a cached response for (provider, model, prompt, params) if there is one, otherwise
+    calls generate() and caches its result. Exceptions from generate() propagate uncached.
+    """
+    cache, key, cached = _cache_lookup(provider, model, prompt, params, use_cache)
+    if cached is not None:
+        return cached
+    with stage("inference") as record:
+        response = generate()
+        record.tokens = approx_token_count(response)
+    _cache_store(cache, key, response)
+    return response
+
+async def cached_response_async(provider, model, prompt, params, generate, use_cache):
+    """
+    Coroutine counterpart of cached_response for an async generate(). Concurrent calls
+    interleave on one thread, so each is recorded as its own "inference" stage run rather
+    than nested through metrics.stage().
+    """
+    cache, key, cached = _cache_lookup(provider, model, prompt, params, use_cache)
+    if cached is not None:
+        return cached
+    record = StageRecord("inference")
+    start = time.perf_counter()
+    try:
+        response = await generate()
+        record.tokens = approx_token_count(response)
+    finally:
+        record.wall = time.perf_counter() - start
+        REGISTRY.record(record)
+    _cache_store(cache, key, response)
+    return response
+
+def cached_stream(provider, model, prompt, params, stream, use_cache):
+    """
+    Streaming counterpart of cached_response: yields a cached response as a single piece,
+    otherwise yields the pieces of stream() as they arrive and caches the joined text once
+    the stream completes. Abandoned or failed streams are not cached.
+    """
+    cache, key, cached = _cache_lookup(provider, model, prompt, params, use_cache)
+    if cached is not None:
+        yield cached
+        return
+    pieces = []
+    for piece in timed_iter("inference", stream(), count_tokens=approx_token_count):
+        pieces.append(piece)
+        yield piece
+    _cache_store(cache, key, "".join(pieces).strip())
+
+def _openai_prompt(features_summary, model):
+    budget = prompt_token_budget(local=False)
+    return build_prompt(
+        features_summary, token_budget=budget, count_tokens=token_counter(model, local=False) if budget else None)
+
+def openai_messages(prompt):
+    """Chat messages for an OpenAI-compatible /chat/completions call with `prompt`."""
+    return [
+        {"role": "system", "content": "You specialize in Java/JVM/JFR diagnostics."},
+        {"role": "user", "content": prompt}
+    ]
+
+def openai_cache_params(base_url):
+    """
+    Response-cache parameters of an OpenAI-compatible call. The endpoint is one of them, so OpenAI
+    and a local OpenAI-compatible server serving a model of the same name don't share responses.
+    """
+    return {"temperature": OPENAI_TEMPERATURE, "max_tokens": OPENAI_MAX_TOKENS, "base_url": base_url}
+
+_chat_loop = None
+_chat_clients = {}
+_chat_lock = threading.Lock()
+
+def get_chat_client():
+    """
+    Process-wide llm_client.AsyncChatClient for the current $LLM_MODEL, $OPENAI_BASE_URL and
+    $OPENAI_API_KEY, created on first use, so single-prompt calls share its connections,
+    concurrency limit, rate-limit pauses and retries. Run its coroutines with run_chat().
+    """
+    from llm_client import AsyncChatClient
+    key = (os.getenv("LLM_MODEL"), os.getenv("OPENAI_BASE_URL"), os.getenv("OPENAI_API_KEY"))
+    with _chat_lock:
+        client = _chat_clients.get(key)
+        if client is None:
+            client = _chat_clients[key] = AsyncChatClient()
+        return client
+
+def _chat_event_loop():
+    """Event loop the get_chat_client() clients run on, in a daemon thread started on first use."""
+    global _chat_loop
+    with _chat_lock:
+        if _chat_loop is None:
+            _chat_loop = asyncio.new_event_loop()
+            threading.Thread(target=_chat_loop.run_forever, name="llm-chat", daemon=True).start()
+        return _chat_loop
+
+def run_chat(coroutine):
+    """Runs a get_chat_client() coroutine on the shared event loop and returns its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _chat_event_loop()).result()
+
+def analyze_with_openai_llm(features_summary, use_cache=None, raise_errors=False):
+    chat = get_chat_client()
+    prompt = _openai_prompt(features_summary, chat.model)
+
+    def generate():
+        return run_chat(chat.complete(
+            openai_messages(prompt), temperature=OPENAI_TEMPERATURE, max_tokens=OPENAI_MAX_TOKENS))
+
+    try:
+        return cached_response(
+            "openai", chat.model, prompt, openai_cache_params(chat.base_url), generate, use_cache)
     except Exception as e:
+        if raise_errors:
+            raise
         return f"Error communicating with LLM: {e}"
 
+async def _next_piece(pieces):
+    """(True, next piece) of an async generator, or (False, None) once it is exhausted."""
+    try:
+        return True, await pieces.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+def iterate_chat(pieces):
+    """
+    Iterates an async generator of a get_chat_client() client (e.g. its stream()) from
+    synchronous code, stepping it on the shared event loop; closing the iterator closes it.
+    """
+    try:
+        while True:
+            more, piece = run_chat(_next_piece(pieces))
+            if not more:
+                return
+            yield piece
+    finally:
+        run_chat(pieces.aclose())
+
+def stream_openai_llm(features_summary, use_cache=None):
+    """Like analyze_with_openai_llm, but yields the completion piece by piece as it is generated."""
+    chat = get_chat_client()
+    prompt = _openai_prompt(features_summary, chat.model)
+
+    def stream():
+        return iterate_chat(chat.stream(
+            openai_messages(prompt), temperature=OPENAI_TEMPERATURE, max_tokens=OPENAI_MAX_TOKENS))
+
+    try:
+        yield from cached_stream("openai", chat.model, prompt, openai_cache_params(chat.base_url), stream, use_cache)
+    except Exception as e:
+        yield f"Error communicating with LLM: {e}"
+
+def _torch_dtype(torch, device):
+    return torch.float16 if device == "cuda" else torch.float32
+
+def local_llm_available(model_name):
+    """
+    Cheap check that a HuggingFace model is already in the local cache: only its config is
+    resolved (offline), no tokenizer or weights are loaded.
+    """
+    from transformers import AutoConfig
+    try:
+        AutoConfig.from_pretrained(model_name, local_files_only=True)
+        return True
+    except Exception:
+        return False
+
+# Config and tokenizer files of a HuggingFace model repo (weights are chosen separately)
+MODEL_FILE_PATTERNS = ["*.json", "*.model", "*.tiktoken", "tokenizer*", "vocab*", "merges.txt"]
+
 def ensure_local_llm(model_name="google/gemma-2b-it"):
     """
     Checks if the local HuggingFace model is available; if not, downloads it interactively.
+    Downloading only fetches the files into the HuggingFace cache; weights are loaded later,
+    once, by the model pool. Only the config, tokenizer and safetensors weights are fetched
+    (PyTorch .bin weights only for repos without safetensors), never the duplicate .bin, .pt,
+    ONNX or GGUF copies many repos also carry.
     """
-    from transformers import AutoModelForCausalLM, AutoTokenizer
-    import torch
+    if local_llm_available(model_name):
+        return True
+    print(f"Model '{model_name}' is not downloaded. Downloading now (this may take several minutes and require >2GB disk space)...")
     try:
-        # Check if model exists locally
-        AutoTokenizer.from_pretrained(model_name, local_files_only=True)
-        AutoModelForCausalLM.from_pretrained(model_name, local_files_only=True)
+        from huggingface_hub import snapshot_download
+        path = snapshot_download(model_name, allow_patterns=MODEL_FILE_PATTERNS + ["*.safetensors"])
+        if not any(name.endswith(".safetensors") for _, _, names in os.walk(path) for name in names):
+            snapshot_download(model_name, allow_patterns=MODEL_FILE_PATTERNS + ["*.bin"])
+        print(f"Model '{model_name}' is now set up locally for offline use.")
         return True
+    except Exception as e:
+        print(f"Automatic model setup failed: {e}")
+        return False
+
+def _load_pipeline(model_name):
+    with stage("model_load"):
+        from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+        import torch
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=_torch_dtype(torch, device))
+        return pipeline(
+            "text-generation", model=model, tokenizer=tokenizer, device=0 if device == "cuda" else -1
+        )
+
+def _pipeline_size_bytes(pipe):
+    try:
+        return sum(p.numel() * p.element_size() for p in pipe.model.parameters())
     except Exception:
-        print(f"Model '{model_name}' is not downloaded. Downloading now (this may take several minutes and require >2GB disk space)...")
+        return 0
+
+def _release_memory():
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+class LocalModelPool:
+    """
+    Process-wide registry of loaded local text-generation pipelines, so each model's weights
+    are loaded once and reused across requests.
+    Least recently used models are evicted when more than `max_models` are requested or
+    when the loaded weights exceed `max_memory_mb` (0 = no memory budget).
+    Defaults come from LOCAL_LLM_POOL_SIZE (1) and LOCAL_LLM_POOL_MEMORY_MB (0).
+    Models load outside the pool lock, so a slow load never blocks lookups of loaded models;
+    concurrent requests for a model that is loading wait for that one load.
+    """
+
+    def __init__(self, max_models=None, max_memory_mb=None, loader=_load_pipeline, sizer=_pipeline_size_bytes):
+        if max_models is None:
+            max_models = int(os.getenv("LOCAL_LLM_POOL_SIZE", "1"))
+        if max_memory_mb is None:
+            max_memory_mb = float(os.getenv("LOCAL_LLM_POOL_MEMORY_MB", "0"))
+        self.max_models = max(1, max_models)
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self._loader = loader
+        self._sizer = sizer
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name):
+        """Returns the pipeline for `model_name`, loading it (and evicting others) if needed."""
+        with self._lock:
+            entry = self._entries.get(model_name)
+            if entry is not None:
+                self._entries.move_to_end(model_name)
+                return entry[0]
+            loading = self._loading.get(model_name)
+            if loading is not None:
+                waiting = True
+            else:
+                waiting = False
+                loading = self._loading[model_name] = Future()
+                # Free room before loading so two large models never sit in memory at once needlessly
+                while self._entries and len(self._entries) + len(self._loading) > self.max_models:
+                    self._evict_oldest()
+        if waiting:
+            return loading.result()
         try:
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32)
-            _ = tokenizer, model  # avoid "unused variable"
-            print(f"Model '{model_name}' is now set up locally for offline use.")
-            return True
-        except Exception as e:
-            print(f"Automatic model setup failed: {e}")
-            return False
+            print(f"Loading local LLM '{model_name}' into the model pool...")
+            pipe = self._loader(model_name)
+            size = self._sizer(pipe)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[model_name]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[model_name]
+            self._entries[model_name] = (pipe, size)
+            while len(self._entries) > self.max_models:
+                self._evict_oldest()
+            if self.max_bytes:
+                while len(self._entries) > 1 and self.memory_bytes() > self.max_bytes:
+                    self._evict_oldest()
+        loading.set_result(pipe)
+        return pipe
+
+    def _evict_oldest(self):
+        name, _ = self._entries.popitem(last=False)
+        print(f"Evicting local LLM '{name}' from the model pool")
+        _release_memory()
 
-def analyze_with_local_llm(features_summary, model_name="google/gemma-2b-it", max_new_tokens=700):
+    def memory_bytes(self):
+        return sum(size for _, size in self._entries.values())
+
+    def loaded(self):
+        """Model names currently resident, least recently used first."""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        _release_memory()
+
+local_model_pool = LocalModelPool()
+
+def warm_up_local_llms(model_names):
     """
-    Uses a HuggingFace Transformers-powered local LLM for inference (default: Gemma-2b-it).
-    Auto-downloads model weights if not already present.
+    Downloads (if needed) and loads the given models into the pool ahead of the first request.
+    """
+    for model_name in model_names:
+        if ensure_local_llm(model_name):
+            try:
+                local_model_pool.get(model_name)
+            except Exception as e:
+                print(f"Warm-up of local LLM '{model_name}' failed: {e}")
+
+# Left-padding copies of pooled pipelines, for batched generation only
+_batch_pipelines = weakref.WeakKeyDictionary()
+_batch_pipelines_lock = threading.Lock()
+
+def _batch_pipeline(pipe):
     """
-    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-    import torch
+    `pipe` with its own copy of the tokenizer set up for left padding (and a pad token), so
+    batching never changes the pooled tokenizer that generate_local and stream_local_llm use.
+    The model weights are shared; the copy lives as long as the pooled pipeline.
+    """
+    with _batch_pipelines_lock:
+        batch_pipe = _batch_pipelines.get(pipe)
+        if batch_pipe is None:
+            tokenizer = copy.deepcopy(pipe.tokenizer)
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            tokenizer.padding_side = "left"
+            batch_pipe = copy.copy(pipe)
+            batch_pipe.tokenizer = tokenizer
+            _batch_pipelines[pipe] = batch_pipe
+        return batch_pipe
+
+def run_local_batch(model_name, prompts, max_new_tokens=LOCAL_MAX_NEW_TOKENS):
+    """
+    Generates completions for several prompts in one padded forward pass per step.
+    Decoder-only models are left-padded so every prompt's continuation starts right after it.
+    """
+    pipe = _batch_pipeline(local_model_pool.get(model_name))
+    res = pipe(
+        prompts,
+        batch_size=len(prompts),
+        max_new_tokens=max_new_tokens,
+        do_sample=False,
+        temperature=LOCAL_TEMPERATURE,
+        truncation=True,
+        return_full_text=False
+    )
+    return [r[0]["generated_text"].strip() for r in res]
+
+def local_batching_enabled():
+    """Dynamic batching is on when LOCAL_LLM_BATCH_SIZE is above 1."""
+    return int(os.getenv("LOCAL_LLM_BATCH_SIZE", "1")) > 1
+
+_batch_scheduler = None
+_batch_scheduler_lock = threading.Lock()
 
-    # Ensure model is downloaded
+def get_batch_scheduler():
+    """Process-wide batch_inference.BatchScheduler over run_local_batch, created on first use."""
+    global _batch_scheduler
+    with _batch_scheduler_lock:
+        if _batch_scheduler is None:
+            from batch_inference import BatchScheduler
+            _batch_scheduler = BatchScheduler(run_local_batch)
+        return _batch_scheduler
+
+def generate_local(model_name, prompt, max_new_tokens=LOCAL_MAX_NEW_TOKENS):
+    """
+    Completion of a ready-made prompt by a local model (downloaded if needed). Goes through
+    the shared BatchScheduler when batching is enabled.
+    """
     if not ensure_local_llm(model_name):
-        return f"Model '{model_name}' could not be set up. Please check your network and storage."
+        raise LocalModelSetupError(
+            f"Model '{model_name}' could not be set up. Please check your network and storage.")
+    if local_batching_enabled():
+        return get_batch_scheduler().generate(model_name, prompt, max_new_tokens=max_new_tokens)
+    pipe = local_model_pool.get(model_name)
+    res = pipe(
+        prompt,
+        max_new_tokens=max_new_tokens,
+        do_sample=False,
+        temperature=LOCAL_TEMPERATURE,
+        truncation=True,
+        return_full_text=False
+    )
+    return res[0]["generated_text"].strip()
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    prompt = build_prompt(features_summary)
+def _local_prompt(features_summary, model_name):
+    budget = prompt_token_budget(local=True)
+    return build_prompt(
+        features_summary, token_budget=budget, count_tokens=token_counter(model_name, local=True) if budget else None)
+
+def analyze_with_local_llm(features_summary, model_name="google/gemma-2b-it", max_new_tokens=LOCAL_MAX_NEW_TOKENS,
+                           use_cache=None, raise_errors=False):
+    """
+    Uses a HuggingFace Transformers-powered local LLM for inference (default: Gemma-2b-it).
+    Auto-downloads model weights if not already present; loaded models stay resident in
+    local_model_pool across calls. Greedy decoding makes responses safe to cache.
+    The prompt is compacted to the token budget with the model's own tokenizer.
+    With LOCAL_LLM_BATCH_SIZE > 1, concurrent calls are batched by the shared BatchScheduler.
+    """
+    prompt = _local_prompt(features_summary, model_name)
     try:
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float16 if device == "cuda" else torch.float32)
-        pipe = pipeline(
-            "text-generation", model=model, tokenizer=tokenizer, device=0 if device == "cuda" else -1
-        )
-        res = pipe(
-            prompt,
-            max_new_tokens=max_new_tokens,
-            do_sample=False,
-            temperature=0.1,
-            truncation=True
-        )
-        return res[0]["generated_text"].replace(prompt, "").strip()
+        params = {"temperature": LOCAL_TEMPERATURE, "max_new_tokens": max_new_tokens, "do_sample": False}
+        return cached_response(
+            "local", model_name, prompt, params, lambda: generate_local(model_name, prompt, max_new_tokens), use_cache)
     except Exception as e:
+        if raise_errors:
+            raise
+        if isinstance(e, LocalModelSetupError):
+            return str(e)
         return f"Error with local LLM ({model_name}): {e}"
 
-def analyze_with_llm(features_summary):
+def _stop_when(event):
+    """StoppingCriteriaList that ends generation at the next token once `event` is set."""
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class EventStop(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return event.is_set()
+
+    return StoppingCriteriaList([EventStop()])
+
+def stream_local_llm(features_summary, model_name="google/gemma-2b-it", max_new_tokens=LOCAL_MAX_NEW_TOKENS,
+                     use_cache=None):
+    """
+    Like analyze_with_local_llm, but yields decoded text as tokens are generated: the pipeline
+    runs on a background thread feeding a TextIteratorStreamer. Closing the generator early
+    (the caller stopped reading) stops the generation at its next token. With batching enabled
+    the request goes through the BatchScheduler instead and its completion arrives in one piece.
+    """
+    if local_batching_enabled():
+        yield analyze_with_local_llm(features_summary, model_name, max_new_tokens, use_cache)
+        return
+    prompt = _local_prompt(features_summary, model_name)
+
+    def stream():
+        if not ensure_local_llm(model_name):
+            raise LocalModelSetupError(
+                f"Model '{model_name}' could not be set up. Please check your network and storage.")
+        from transformers import TextIteratorStreamer
+        pipe = local_model_pool.get(model_name)
+        streamer = TextIteratorStreamer(pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        abandoned = threading.Event()
+        failure = []
+
+        def run():
+            try:
+                pipe(
+                    prompt,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,
+                    temperature=LOCAL_TEMPERATURE,
+                    truncation=True,
+                    streamer=streamer,
+                    stopping_criteria=_stop_when(abandoned)
+                )
+            except Exception as e:
+                failure.append(e)
+                # Unblock the consumer; the streamer ends its iteration on end()
+                streamer.end()
+
+        worker = threading.Thread(target=run, name="llm-stream", daemon=True)
+        worker.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            # Also reached when the consumer abandons the stream: don't generate for nobody
+            abandoned.set()
+        worker.join()
+        if failure:
+            raise failure[0]
+
+    try:
+        params = {"temperature": LOCAL_TEMPERATURE, "max_new_tokens": max_new_tokens, "do_sample": False}
+        yield from cached_stream("local", model_name, prompt, params, stream, use_cache)
+    except LocalModelSetupError as e:
+        yield str(e)
+    except Exception as e:
+        yield f"Error with local LLM ({model_name}): {e}"
+
+def analyze_with_llm(features_summary, use_cache=None, use_local=None, model_name=None, raise_errors=False):
     """
     Chooses provider (openai or local/transformers) based on environment variable or fallback.
     Ensures local LLMs are set up automatically if not present.
+    Responses are served from the on-disk response cache when the same prompt was already
+    answered by the same model and settings; pass use_cache=False to bypass it for one call.
+    use_local/model_name override USE_LOCAL_LLM/LOCAL_LLM_MODEL for this call only, so
+    concurrent callers don't have to share process-wide environment settings.
+    Failures come back as an error message in place of the findings, unless raise_errors is
+    set, for callers that need to tell a failed analysis from a successful one.
+    """
+    if use_local is None:
+        use_local = os.getenv("USE_LOCAL_LLM", "0").lower() in ("1", "true", "yes")
+    if use_local:
+        if model_name is None:
+            model_name = os.getenv("LOCAL_LLM_MODEL", "google/gemma-2b-it")
+        return analyze_with_local_llm(
+            features_summary, model_name=model_name, use_cache=use_cache, raise_errors=raise_errors)
+    else:
+        return analyze_with_openai_llm(features_summary, use_cache=use_cache, raise_errors=raise_errors)
+
+def stream_llm(features_summary, use_cache=None, use_local=None, model_name=None):
+    """
+    Streaming counterpart of analyze_with_llm: yields the findings in pieces as the model
+    produces them, so callers can show output long before the completion is finished.
+    Joining the pieces gives the same text analyze_with_llm would return.
     """
-    use_local = os.getenv("USE_LOCAL_LLM", "0").lower() in ("1", "true", "yes")
+    if use_local is None:
+        use_local = os.getenv("USE_LOCAL_LLM", "0").lower() in ("1", "true", "yes")
     if use_local:
-        model_name = os.getenv("LOCAL_LLM_MODEL", "google/gemma-2b-it")
-        return analyze_with_local_llm(features_summary, model_name=model_name)
+        if model_name is None:
+            model_name = os.getenv("LOCAL_LLM_MODEL", "google/gemma-2b-it")
+        return stream_local_llm(features_summary, model_name=model_name, use_cache=use_cache)
     else:
-        return analyze_with_openai_llm(features_summary)
+        return stream_openai_llm(features_summary, use_cache=use_cache)
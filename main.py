@@ -2,12 +2,9 @@ import argparse
 import os
 import sys
 
-from dotenv import load_dotenv
-
-from jfr_parser import parse_jfr
-from feature_extractor import extract_features
-from llm_prompter import analyze_with_llm
-from report_generator import write_report
+# Pipeline modules (and their jinja2/numpy/transformers dependencies) are imported inside
+# run()/run_batch(), so --help and daemon submission start without loading them
+from metrics import REGISTRY, stage
 
 SUPPORTED_LLM_MODELS = [
     ("google/gemma-2b-it", "Gemma 2B (Google, Efficient)"),
@@ -19,27 +16,217 @@ SUPPORTED_LLM_MODELS = [
 def list_llm_choices():
     return '\n'.join(f"  {i+1}. {label} ({model})" for i, (model, label) in enumerate(SUPPORTED_LLM_MODELS))
 
-def main():
-    parser = argparse.ArgumentParser(description="LLM JFR Analyzer MVP")
-    parser.add_argument(
-        '--jfr', type=str, required=True, help='Path to JFR file (in text or .jfr format)')
+def per_recording_path(path, jfr_path, default_ext):
+    """<path stem>_<recording name><ext>, for outputs of runs over several recordings."""
+    stem, ext = os.path.splitext(path)
+    name = os.path.splitext(os.path.basename(jfr_path))[0]
+    return f"{stem}_{name}{ext or default_ext}"
+
+def run_batch(args):
+    from batch_pipeline import BatchPipeline, discover_recordings
+    from llm_prompter import analyze_with_llm
+    from parse_cache import ParseCache
+
+    jfr_paths = discover_recordings(args.batch)
+    if not jfr_paths:
+        print(f"No .jfr/.json recordings found in: {', '.join(args.batch)}")
+        sys.exit(1)
+    if args.uselocal:
+        os.environ["USE_LOCAL_LLM"] = "1"
+        os.environ["LOCAL_LLM_MODEL"] = args.llmmodel
+    else:
+        os.environ["USE_LOCAL_LLM"] = "0"
+    if args.clearcache:
+        cache = ParseCache(cache_dir=args.cachedir)
+        print(f"Cleared {cache.clear()} cached recording(s) from {cache.cache_dir}")
+
+    options = {
+        "chunkthresh": args.chunkthresh, "workers": args.workers, "native": args.native, "columnar": args.columnar,
+        "cachedir": args.cachedir, "nocache": args.nocache,
+        "events": args.events, "categories": args.categories, "fields": args.fields, "autoselect": args.autoselect,
+        "memorybudget": args.memorybudget, "window": args.window, "time_from": args.time_from, "time_to": args.time_to,
+    }
+    rpm = args.rpm if args.rpm is not None else float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+    pipeline = BatchPipeline(
+        args.outdir, options, parse_workers=args.parseprocs, llm_concurrency=args.llmconcurrency,
+        requests_per_minute=rpm, use_local=args.uselocal,
+        analyze=lambda summary: analyze_with_llm(
+            summary, use_cache=False if args.nollmcache else None, raise_errors=True))
+    print(f"Analyzing {len(jfr_paths)} recordings "
+          f"({pipeline.parse_workers} parse processes, {pipeline.llm_concurrency} concurrent LLM calls)...")
+    results = pipeline.run(jfr_paths)
+    failed = [r for r in results if r["status"] != "done"]
+    print(f"Wrote {len(results) - len(failed)} reports and an index to {args.outdir} ({len(failed)} failed).")
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="LLM JFR Analyzer MVP",
+        epilog="Supported local LLM models:\n" + list_llm_choices(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
+        '--jfr', type=str, nargs='+',
+        help='Path to JFR file(s) (in text or .jfr format); several files get one report each')
+    inputs.add_argument(
+        '--batch', type=str, nargs='+',
+        help='Directories or glob patterns of recordings to analyze as a pipeline, '
+             'writing one report per recording plus an index into --outdir')
     parser.add_argument(
-        '--output', type=str, default='analysis_report.md', help='Output report file')
+        '--output', type=str, default='analysis_report.md',
+        help='Output report file; a .html output adds GC-pause, event-rate and thread-state charts '
+             '(with several --jfr files, reports are named <output>_<recording>.md)')
     parser.add_argument(
         '--uselocal', action="store_true", help="Force use of local LLM (even if OpenAI config is set)")
     parser.add_argument(
         '--llmmodel', type=str, choices=[m[0] for m in SUPPORTED_LLM_MODELS],
         default=SUPPORTED_LLM_MODELS[0][0],
-        help='Local LLM model to use. Options:\n' + list_llm_choices())
+        help='Local LLM model to use (default: %(default)s; see the list below)')
     parser.add_argument(
         '--chunkthresh', type=int, default=50, help='Chunking threshold in MB for large JFR files (default: 50)')
-    args = parser.parse_args()
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Number of worker processes that convert JFR chunks and summarize --window/--mapreduce slices (default: 1)')
+    parser.add_argument(
+        '--native', action="store_true", help="Decode .jfr files with the built-in Python reader (no JDK needed)")
+    parser.add_argument(
+        '--events', type=str, default=None,
+        help='Comma-separated event types to decode (e.g. jdk.GarbageCollection,jdk.ThreadStuck); '
+             'pushed down into jfr print --events')
+    parser.add_argument(
+        '--categories', type=str, default=None,
+        help='jfr print category filter (default: "Java Application,Threads,GC,Socket,IO,JVM" unless --events is given)')
+    parser.add_argument(
+        '--fields', type=str, default=None,
+        help='Comma-separated event fields to keep (e.g. startTime,duration); others are dropped while decoding')
+    parser.add_argument(
+        '--autoselect', action="store_true",
+        help="Decode only the event types and fields the feature extractors read (plus any --events/--fields)")
+    parser.add_argument(
+        '--columnar', action="store_true", help="Load events into a columnar NumPy table and extract features vectorized")
+    parser.add_argument(
+        '--memorybudget', type=float, default=None,
+        help='MB of decoded events --columnar and --window/--from/--to may hold in memory before spilling '
+             'them to disk (default: $JFR_MEMORY_BUDGET_MB, 0 = unlimited)')
+    parser.add_argument(
+        '--from', dest='time_from', type=str, default=None,
+        help='Only analyze events starting at or after this ISO-8601 time (e.g. 2024-05-01T12:00:00Z)')
+    parser.add_argument(
+        '--to', dest='time_to', type=str, default=None, help='Only analyze events starting before this ISO-8601 time')
+    parser.add_argument(
+        '--window', type=float, default=None,
+        help='Split the recording into windows of this many seconds, analyzed in parallel; '
+             'only windows with GC pause spikes or stuck-thread bursts are described to the LLM')
+    parser.add_argument(
+        '--flamegraph', type=str, default=None,
+        help='Also write the aggregated stack traces as collapsed stacks (flamegraph.pl/speedscope input) to this file')
+    parser.add_argument(
+        '--outdir', type=str, default='reports', help='Output directory for --batch reports (default: reports)')
+    parser.add_argument(
+        '--parseprocs', type=int, default=None,
+        help='Processes parsing recordings in parallel in --batch mode (default: CPU count)')
+    parser.add_argument(
+        '--mapreduce', type=int, default=None, metavar='PARTS',
+        help='Split the recording into PARTS time slices whose summaries are analyzed by concurrent LLM calls, '
+             'then merged by one final call (OpenAI-compatible endpoints are called through a pooled async client)')
+    parser.add_argument(
+        '--llmconcurrency', type=int, default=None,
+        help='Concurrent LLM analyses in --batch mode or over several --jfr recordings (default: 4), '
+             'or concurrent LLM requests with --mapreduce '
+             '(default: $LLM_CONCURRENCY or 8)')
+    parser.add_argument(
+        '--rpm', type=float, default=None,
+        help='Max LLM requests per minute in --batch and --mapreduce modes (default: $LLM_REQUESTS_PER_MINUTE or unlimited)')
+    parser.add_argument(
+        '--cachedir', type=str, default=None,
+        help='Directory for cached parsed recordings (default: $JFR_CACHE_DIR or ~/.cache/llm_jfr_analyzer)')
+    parser.add_argument(
+        '--nocache', action="store_true", help="Bypass the parsed-recording cache (neither read nor write it)")
+    parser.add_argument(
+        '--clearcache', action="store_true", help="Delete all cached parsed recordings before analyzing")
+    parser.add_argument(
+        '--nollmcache', action="store_true", help="Always query the LLM, ignoring cached responses for identical prompts")
+    parser.add_argument(
+        '--baseline', type=str, default=None,
+        help='Compare against this baseline (a profile saved with --savebaseline, or a recording whose profile '
+             'is built once and stored) and send only the significant differences to the LLM')
+    parser.add_argument(
+        '--savebaseline', type=str, default=None,
+        help="Save this recording's compact profile (event counts, GC pause/duration histograms, hot methods) "
+             "to this file for later --baseline comparisons")
+    parser.add_argument(
+        '--profile', action="store_true",
+        help="Print per-stage wall/CPU time, peak RSS, event and token counts when done")
+    parser.add_argument(
+        '--profiledump', type=str, default=None,
+        help='Also run under cProfile and write the stats to this file (view with pstats or snakeviz)')
+    parser.add_argument(
+        '--nodaemon', action="store_true",
+        help="Run in this process even if an analyzer daemon (python analyzer_daemon.py) is running")
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if (args.baseline or args.savebaseline) and (args.batch or len(args.jfr) > 1):
+        parser.error("--baseline and --savebaseline take a single --jfr recording")
+    # Each of these picks a different summary of the recording; only one can apply
+    summaries = [flag for flag, used in (
+        ("--baseline/--savebaseline", args.baseline or args.savebaseline), ("--mapreduce", args.mapreduce is not None),
+        ("--window", args.window), ("--columnar", args.columnar)) if used]
+    if len(summaries) > 1:
+        parser.error(f"{' and '.join(summaries)} can't be combined")
+    if (args.time_from or args.time_to) and (args.baseline or args.savebaseline or args.columnar):
+        parser.error("--from/--to can't be combined with --baseline, --savebaseline or --columnar")
+    if args.mapreduce is not None and (args.mapreduce < 1 or args.batch):
+        parser.error("--mapreduce takes a positive number of parts and can't be combined with --batch")
+    if not args.nodaemon:
+        import analyzer_daemon
+        from dotenv import load_dotenv
+        # The job runs with this environment, .env included, as it would in this process
+        load_dotenv()
+        # A running daemon has the parsers, caches and models warm; without one, run here
+        status = analyzer_daemon.submit(argv, cwd=os.getcwd())
+        if status is not None:
+            sys.exit(status)
+    execute(args)
+
+def execute(args):
+    """Runs the analysis described by parsed CLI args, with the --profile/--profiledump reporting."""
+    if not args.profiledump:
+        run(args)
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(run, args)
+        finally:
+            profiler.dump_stats(args.profiledump)
+            print(f"Wrote cProfile stats to {args.profiledump}")
+    if args.profile or args.profiledump:
+        print("\nStage profile:\n" + REGISTRY.summary())
+
+def run(args):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from dotenv import load_dotenv
+    from event_selection import resolve_selection
+    from jfr_parser import iter_jfr_events
+    from parse_cache import ParseCache
+    from feature_extractor import extract_features, extract_features_columnar
+    from llm_prompter import analyze_with_llm, stream_llm, local_batching_enabled, get_batch_scheduler
+    from report_generator import report_format, write_report
+    from stack_profile import StackProfile
 
     load_dotenv()
-    jfr_path = args.jfr
+    if args.batch:
+        run_batch(args)
+        return
+    jfr_paths = args.jfr
 
-    if not os.path.exists(jfr_path):
-        print(f"JFR file not found: {jfr_path}")
+    missing = [p for p in jfr_paths if not os.path.exists(p)]
+    if missing:
+        print(f"JFR file not found: {', '.join(missing)}")
         sys.exit(1)
 
     # Set LLM config at runtime
@@ -49,20 +236,160 @@ def main():
     else:
         os.environ["USE_LOCAL_LLM"] = "0"
 
-    print("Parsing JFR...")
-    events = parse_jfr(jfr_path, chunking_threshold_mb=args.chunkthresh)
+    cache = None
+    if args.clearcache or not args.nocache:
+        cache = ParseCache(cache_dir=args.cachedir)
+        if args.clearcache:
+            print(f"Cleared {cache.clear()} cached recording(s) from {cache.cache_dir}")
+        if args.nocache:
+            cache = None
+    selection = resolve_selection(
+        events=args.events, categories=args.categories, fields=args.fields, auto=args.autoselect)
+    # Mergeable aggregates of the recordings, kept for --baseline/--savebaseline
+    profiles = []
+    # Per-recording time slice summaries, kept for --mapreduce
+    slices = []
+    # Per-recording downsampled timeline charts, kept for HTML reports
+    timelines = []
+    html_report = report_format(args.output) == "html"
+
+    def summarize(events):
+        with stage("extract"):
+            if args.baseline or args.savebaseline:
+                # Comparisons need the streaming aggregate, so these runs use its summary
+                from comparison import profile_recording
+                summary, profile = profile_recording(events)
+                profiles.append(profile)
+                return summary
+            if args.mapreduce:
+                from event_store import memory_budget_bytes
+                from map_reduce import summarize_parts
+                summary, parts = summarize_parts(
+                    events, args.mapreduce, start=args.time_from, end=args.time_to, workers=args.workers,
+                    memory_budget=memory_budget_bytes(args.memorybudget))
+                slices.append(parts)
+                return summary
+            if args.window or args.time_from or args.time_to:
+                from event_store import memory_budget_bytes
+                from time_index import extract_windowed_features
+                return extract_windowed_features(
+                    events, window_seconds=args.window, start=args.time_from, end=args.time_to, workers=args.workers,
+                    memory_budget=memory_budget_bytes(args.memorybudget))
+            if args.columnar:
+                from event_store import memory_budget_bytes
+                return extract_features_columnar(events, memory_budget=memory_budget_bytes(args.memorybudget))
+            return extract_features(events)
+
+    def parse(jfr_path):
+        return iter_jfr_events(
+            jfr_path, chunking_threshold_mb=args.chunkthresh, workers=args.workers, native=args.native, cache=cache,
+            selection=selection)
+
+    def extract(jfr_path):
+        # Events are streamed from the parser straight into feature extraction
+        events = parse(jfr_path)
+        timeline = None
+        if html_report:
+            from timeseries import TimeSeriesCollector
+            timeline = TimeSeriesCollector()
+            events = timeline.observe(events)
+        if not args.flamegraph:
+            features = summarize(events)
+            if timeline:
+                timelines.append(timeline.series())
+            return features
+        profile = StackProfile()
+        features = summarize(profile.observe(events))
+        if timeline:
+            timelines.append(timeline.series())
+        flamegraph = args.flamegraph if len(jfr_paths) == 1 else per_recording_path(args.flamegraph, jfr_path, ".txt")
+        print(f"Writing {profile.samples} stack samples to {flamegraph} ...")
+        profile.write_collapsed(flamegraph)
+        return features
+
+    def analyze(features, parts=None):
+        use_cache = False if args.nollmcache else None
+        if args.mapreduce:
+            from map_reduce import analyze_map_reduce
+            client_options = {}
+            if args.llmconcurrency:
+                client_options["max_concurrency"] = args.llmconcurrency
+            if args.rpm is not None:
+                client_options["requests_per_minute"] = args.rpm
+            return analyze_map_reduce(features, parts, use_cache=use_cache, client_options=client_options)
+        return analyze_with_llm(features, use_cache=use_cache)
+
+    if len(jfr_paths) == 1:
+        print("Parsing JFR and extracting features...")
+        features = extract(jfr_paths[0])
+        if args.savebaseline:
+            profiles[0].save(args.savebaseline)
+            print(f"Saved baseline profile to {args.savebaseline}")
+
+        comparison = None
+        if args.baseline:
+            from comparison import compare_profiles, load_baseline, profile_recording, render_comparison
+            baseline = load_baseline(
+                args.baseline, lambda path: profile_recording(parse(path))[1],
+                options=selection.options() if selection else None)
+            differences = compare_profiles(profiles[0], baseline)
+            # Only the significant differences go to the LLM
+            features = comparison = render_comparison(differences, profiles[0], baseline).strip()
+            print(comparison)
+            if not differences:
+                print(f"Writing report to {args.output} ...")
+                write_report(f"```\n{comparison}\n```", args.output, series=timelines[0] if timelines else None)
+                print("Done.")
+                return
+
+        if args.mapreduce:
+            print(f"Analyzing {len(slices[0])} time slices with LLM, then merging their findings...")
+            findings = analyze(features, slices[0])
+            print(findings)
+            print(f"Writing report to {args.output} ...")
+            write_report(findings, args.output, series=timelines[0] if timelines else None)
+            print("Done.")
+            return
+
+        # Findings are printed as they are generated; the report is written once complete
+        print("Analyzing with LLM...")
+        pieces = []
+        for piece in stream_llm(features, use_cache=False if args.nollmcache else None):
+            pieces.append(piece)
+            print(piece, end="", flush=True)
+        print()
+        findings = "".join(pieces).strip()
+        if comparison:
+            findings = f"```\n{comparison}\n```\n\n{findings}"
+
+        print(f"Writing report to {args.output} ...")
+        write_report(findings, args.output, series=timelines[0] if timelines else None)
+
+        print("Done.")
+        return
+
+    summaries = []
+    for jfr_path in jfr_paths:
+        print(f"Parsing {jfr_path} and extracting features...")
+        summaries.append(extract(jfr_path))
 
-    print("Extracting features...")
-    features = extract_features(events)
+    # Analyses run concurrently so a batching local model can serve them together
+    from batch_pipeline import DEFAULT_LLM_CONCURRENCY
+    print(f"Analyzing {len(summaries)} recordings with LLM...")
+    with ThreadPoolExecutor(max_workers=min(len(summaries), args.llmconcurrency or DEFAULT_LLM_CONCURRENCY)) as pool:
+        all_findings = list(pool.map(analyze, summaries, slices or [None] * len(summaries)))
 
-    print("Analyzing with LLM...")
-    findings = analyze_with_llm(features)
+    for i, (jfr_path, findings) in enumerate(zip(jfr_paths, all_findings)):
+        output = per_recording_path(args.output, jfr_path, ".md")
+        print(f"Writing report to {output} ...")
+        write_report(findings, output, series=timelines[i] if timelines else None)
 
-    print(f"Writing report to {args.output} ...")
-    write_report(findings, args.output)
+    if args.uselocal and local_batching_enabled():
+        stats = get_batch_scheduler().stats()
+        print(f"Inference batches: {stats['batches']} for {stats['requests']} prompts "
+              f"(mean batch size {stats['mean_batch_size']:.2f})")
 
     print("Done.")
 
 if __name__ == '__main__':
-    print("Supported local LLM models:\n" + list_llm_choices())
     main()
@@ -0,0 +1,154 @@
+import asyncio
+import os
+
+from feature_extractor import StreamingAggregator, _ns_to_datetime, render_summary
+from prompt_budget import approx_token_count, compact_summary, token_counter
+
+DEFAULT_PARTS = 8
+
+MAP_PREAMBLE = (
+    "You are an expert JVM performance and diagnostics assistant. "
+    "The following summarizes one time slice ({label}) of a longer Java Flight Recorder (JFR) recording. "
+    "List the notable performance or stability issues in this slice, each with the evidence behind it "
+    "(numbers, methods, threads, SQL), in at most 8 short bullet points. "
+    "If nothing stands out, answer 'No notable issues.'\n\n"
+)
+REDUCE_PREAMBLE = (
+    "You are an expert JVM performance and diagnostics assistant. "
+    "A long Java Flight Recorder (JFR) recording was split into time slices and each slice was reviewed "
+    "separately. Below are the summary of the whole recording and the findings for every slice, in time order. "
+    "Merge them into one analysis: list the potential issues, root causes, and actionable recommendations, "
+    "say when each issue occurs (throughout, or in which slices), and drop findings the rest of the "
+    "evidence contradicts. Explain your conclusions clearly for a JVM/application engineer.\n\n"
+)
+REDUCE_QUESTION = "What are the JVM performance or stability risks and what should the user look at first?"
+
+
+def _summarize_window(window):
+    return StreamingAggregator().update(window[2])
+
+
+def summarize_parts(events, parts=DEFAULT_PARTS, start=None, end=None, workers=1, memory_budget=None):
+    """
+    Splits the events between `start` and `end` into `parts` equal time slices and summarizes
+    each, on `workers` processes (see time_index.map_windows). Returns (summary of the whole range, [(slice label, slice summary), ...]);
+    slices without events are left out. Events are indexed with time_index.build_time_index,
+    so past `memory_budget` bytes they are spilled to disk and read back slice by slice.
+    """
+    from time_index import build_time_index, map_windows, to_epoch_ns
+
+    index = build_time_index(events, memory_budget=memory_budget)
+    bounds = index.bounds()
+    if bounds is None:
+        overall = StreamingAggregator().features()
+        return render_summary(overall, overall["num_stuck_threads"]), []
+    lo = bounds[0] if start is None else to_epoch_ns(start)
+    hi = bounds[1] + 1 if end is None else to_epoch_ns(end)
+    parts = max(1, parts)
+    # One extra nanosecond per slice so float rounding can't leave a sliver of a last slice
+    size_seconds = max(1, (hi - lo + parts)) / parts / 1e9
+    windows = list(index.windows(size_seconds, start=start, end=end))
+
+    aggregators = map_windows(_summarize_window, windows, workers)
+    overall = StreamingAggregator()
+    slices = []
+    for (start_ns, end_ns, _), aggregator in zip(windows, aggregators):
+        overall.merge(aggregator)
+        if aggregator.num_events:
+            label = f"{_ns_to_datetime(start_ns)} --> {_ns_to_datetime(end_ns)}"
+            slices.append((label, render_summary(aggregator.features(), aggregator.num_stuck_threads)))
+    features = overall.features()
+    return render_summary(features, features["num_stuck_threads"]), slices
+
+
+def map_prompt(label, summary, token_budget=None, count_tokens=approx_token_count):
+    preamble = MAP_PREAMBLE.format(label=label)
+    if token_budget:
+        summary, _ = compact_summary(summary, token_budget - count_tokens(preamble), count_tokens)
+    return preamble + summary.strip()
+
+
+def reduce_prompt(overall_summary, findings, token_budget=None, count_tokens=approx_token_count):
+    """
+    The merge prompt: the whole-recording summary, then each slice's findings. With a token
+    budget, the overall summary is compacted to whatever the findings leave room for.
+    """
+    slices = "".join(f"\n\nSlice {i} ({label}):\n{text.strip()}" for i, (label, text) in enumerate(findings, 1))
+    if token_budget:
+        room = token_budget - count_tokens(REDUCE_PREAMBLE + slices + "\n\n" + REDUCE_QUESTION)
+        overall_summary, _ = compact_summary(overall_summary, max(0, room), count_tokens)
+    return f"{REDUCE_PREAMBLE}Whole recording:\n{overall_summary.strip()}{slices}\n\n{REDUCE_QUESTION}"
+
+
+async def _map_reduce(overall_summary, slices, complete, token_budget, count_tokens):
+    results = await asyncio.gather(
+        *(complete(map_prompt(label, summary, token_budget, count_tokens)) for label, summary in slices),
+        return_exceptions=True)
+    findings = []
+    failures = []
+    for (label, _), result in zip(slices, results):
+        if isinstance(result, BaseException):
+            failures.append(result)
+            result = f"(This slice could not be analyzed: {result})"
+        findings.append((label, result))
+    if slices and len(failures) == len(slices):
+        raise failures[0]
+    return await complete(reduce_prompt(overall_summary, findings, token_budget, count_tokens))
+
+
+def analyze_map_reduce(overall_summary, slices, use_cache=None, use_local=None, model_name=None, client_options=None):
+    """
+    Map-reduce analysis of a long recording: every slice summary (see summarize_parts) is
+    analyzed concurrently, then one more call merges the slice findings with the overall
+    summary, so the whole takes about as long as two sequential calls.
+
+    OpenAI-compatible endpoints are called through one pooled llm_client.AsyncChatClient
+    (created with `client_options`, e.g. base_url or max_concurrency); local models run the
+    map calls on threads, which the BatchScheduler serves together when LOCAL_LLM_BATCH_SIZE > 1.
+    Every call goes through the response cache. A failed slice is reported to the merge call
+    instead of failing the run.
+    """
+    import llm_prompter
+
+    if use_local is None:
+        use_local = os.getenv("USE_LOCAL_LLM", "0").lower() in ("1", "true", "yes")
+    token_budget = llm_prompter.prompt_token_budget(local=use_local)
+
+    if use_local:
+        model_name = model_name or os.getenv("LOCAL_LLM_MODEL", "google/gemma-2b-it")
+        count_tokens = token_counter(model_name, local=True) if token_budget else approx_token_count
+        params = {
+            "temperature": llm_prompter.LOCAL_TEMPERATURE, "max_new_tokens": llm_prompter.LOCAL_MAX_NEW_TOKENS,
+            "do_sample": False}
+
+        async def complete(prompt):
+            return await asyncio.to_thread(
+                llm_prompter.cached_response, "local", model_name, prompt, params,
+                lambda: llm_prompter.generate_local(model_name, prompt), use_cache)
+
+        async def run():
+            return await _map_reduce(overall_summary, slices, complete, token_budget, count_tokens)
+    else:
+        from llm_client import AsyncChatClient
+
+        async def run():
+            async with AsyncChatClient(**(client_options or {})) as chat:
+                count_tokens = token_counter(chat.model, local=False) if token_budget else approx_token_count
+                params = llm_prompter.openai_cache_params(chat.base_url)
+
+                async def complete(prompt):
+                    return await llm_prompter.cached_response_async(
+                        "openai", chat.model, prompt, params,
+                        lambda: chat.complete(
+                            llm_prompter.openai_messages(prompt), temperature=llm_prompter.OPENAI_TEMPERATURE,
+                            max_tokens=llm_prompter.OPENAI_MAX_TOKENS),
+                        use_cache)
+
+                return await _map_reduce(overall_summary, slices, complete, token_budget, count_tokens)
+
+    try:
+        return asyncio.run(run())
+    except llm_prompter.LocalModelSetupError as e:
+        return str(e)
+    except Exception as e:
+        return f"Error communicating with LLM: {e}"
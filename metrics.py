@@ -0,0 +1,205 @@
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def peak_rss_bytes():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageRecord:
+    """
+    One run of a stage. Callers add to `events` and `tokens` while the stage runs;
+    `peak_rss` is the process's peak RSS when the stage ended.
+    """
+
+    __slots__ = ("name", "events", "tokens", "wall", "cpu", "child_wall", "peak_rss")
+
+    def __init__(self, name):
+        self.name = name
+        self.events = 0
+        self.tokens = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.child_wall = 0.0
+        self.peak_rss = 0
+
+    @property
+    def self_wall(self):
+        """Wall time not spent in stages nested inside this one on the same thread."""
+        return max(0.0, self.wall - self.child_wall)
+
+
+class _StageTotals:
+    __slots__ = ("calls", "wall", "self_wall", "cpu", "events", "tokens", "peak_rss", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.self_wall = 0.0
+        self.cpu = 0.0
+        self.events = 0
+        self.tokens = 0
+        self.peak_rss = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe totals per pipeline stage: calls, wall time (inclusive and excluding nested
+    stages), CPU time of the running thread, events and tokens processed, the process's peak
+    RSS by the end of the stage, and a wall-time histogram. Rendered in the Prometheus text format by
+    prometheus_text() and as a table by summary().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._active = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._active, "stack", None)
+        if stack is None:
+            stack = self._active.stack = []
+        return stack
+
+    @contextmanager
+    def stage(self, name):
+        """Times a block as stage `name`; yields its StageRecord for event/token counts."""
+        record = StageRecord(name)
+        stack = self._stack()
+        stack.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter() - wall_start
+            record.cpu = time.thread_time() - cpu_start
+            stack.pop()
+            if stack:
+                stack[-1].child_wall += record.wall
+            self.record(record)
+
+    def timed_iter(self, name, iterable, count_tokens=None):
+        """
+        Passes items through while charging the time spent producing them (inside the
+        wrapped iterator, not in the consumer) and their count to stage `name`.
+        With count_tokens, each item's token count is added to the stage's tokens.
+        """
+        record = StageRecord(name)
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        iterator = iter(iterable)
+        try:
+            while True:
+                wall_start = time.perf_counter()
+                cpu_start = time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    record.wall += time.perf_counter() - wall_start
+                    record.cpu += time.thread_time() - cpu_start
+                record.events += 1
+                if count_tokens is not None:
+                    record.tokens += count_tokens(item)
+                yield item
+        finally:
+            if parent is not None:
+                parent.child_wall += record.wall
+            self.record(record)
+
+    def record(self, record):
+        record.peak_rss = peak_rss_bytes()
+        with self._lock:
+            totals = self._stages.get(record.name)
+            if totals is None:
+                totals = self._stages[record.name] = _StageTotals()
+            totals.calls += 1
+            totals.wall += record.wall
+            totals.self_wall += record.self_wall
+            totals.cpu += record.cpu
+            totals.events += record.events
+            totals.tokens += record.tokens
+            totals.peak_rss = max(totals.peak_rss, record.peak_rss)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if record.wall <= bound:
+                    totals.buckets[i] += 1
+
+    def snapshot(self):
+        """{stage: {calls, wall_seconds, self_seconds, cpu_seconds, events, tokens, peak_rss_bytes}}"""
+        with self._lock:
+            return {
+                name: {
+                    "calls": t.calls, "wall_seconds": t.wall, "self_seconds": t.self_wall,
+                    "cpu_seconds": t.cpu, "events": t.events, "tokens": t.tokens, "peak_rss_bytes": t.peak_rss,
+                }
+                for name, t in self._stages.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def prometheus_text(self, prefix="jfr_analyzer"):
+        with self._lock:
+            stages = sorted(self._stages.items())
+            lines = []
+
+            def family(metric, kind, help_text, value_of):
+                lines.append(f"# HELP {prefix}_{metric} {help_text}")
+                lines.append(f"# TYPE {prefix}_{metric} {kind}")
+                for name, t in stages:
+                    lines.append(f'{prefix}_{metric}{{stage="{name}"}} {value_of(t)}')
+
+            family("stage_calls_total", "counter", "Completed runs of each pipeline stage.", lambda t: t.calls)
+            family("stage_cpu_seconds_total", "counter", "CPU time of the thread running each stage.", lambda t: t.cpu)
+            family("stage_self_seconds_total", "counter",
+                   "Wall time of each stage excluding nested stages.", lambda t: t.self_wall)
+            family("stage_events_total", "counter", "Events processed by each stage.", lambda t: t.events)
+            family("stage_tokens_total", "counter", "LLM tokens processed by each stage.", lambda t: t.tokens)
+            family("stage_peak_rss_bytes", "gauge",
+                   "Highest process peak RSS seen at the end of each stage.", lambda t: t.peak_rss)
+
+            metric = f"{prefix}_stage_duration_seconds"
+            lines.append(f"# HELP {metric} Wall time of each pipeline stage run.")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, t in stages:
+                for bound, count in zip(DURATION_BUCKETS, t.buckets):
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {t.calls}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {t.wall}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {t.calls}')
+
+        lines.append(f"# HELP {prefix}_peak_rss_bytes Peak resident set size of the process.")
+        lines.append(f"# TYPE {prefix}_peak_rss_bytes gauge")
+        lines.append(f"{prefix}_peak_rss_bytes {peak_rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Plain-text table of the stage totals, slowest (by self time) first."""
+        rows = sorted(self.snapshot().items(), key=lambda item: item[1]["self_seconds"], reverse=True)
+        lines = [
+            f"{'stage':<16} {'calls':>6} {'wall s':>9} {'self s':>9} {'cpu s':>9} {'events':>11} {'tokens':>8} {'rss MB':>8}"
+        ]
+        for name, s in rows:
+            lines.append(
+                f"{name:<16} {s['calls']:>6} {s['wall_seconds']:>9.3f} {s['self_seconds']:>9.3f} "
+                f"{s['cpu_seconds']:>9.3f} {s['events']:>11,} {s['tokens']:>8,} {s['peak_rss_bytes'] / (1024 * 1024):>8.1f}")
+        lines.append(f"peak RSS: {peak_rss_bytes() / (1024 * 1024):.1f} MB")
+        return "\n".join(lines)
+
+
+# Process-wide registry used by the pipeline modules
+REGISTRY = MetricsRegistry()
+stage = REGISTRY.stage
+timed_iter = REGISTRY.timed_iter
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import marshal
+import os
+import struct
+import tempfile
+import zlib
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "llm_jfr_analyzer")
+DEFAULT_CACHE_MAX_MB = 2048
+HASH_BLOCK_SIZE = 1024 * 1024
+BATCH_SIZE = 2048
+_FRAME_HEADER = struct.Struct(">I")
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in blocks so large recordings aren't loaded at once."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """
+    Content-addressed on-disk cache of decoded events.
+
+    Entries are keyed by the recording's content hash plus the parser options, so renamed or
+    re-uploaded copies of a file hit the same entry. Each entry is a stream of zlib-compressed
+    marshal frames holding batches of events, which decodes far faster than re-running
+    `jfr print` and re-parsing JSON. The total size is capped; least recently used entries
+    are evicted first.
+    """
+
+    def __init__(self, cache_dir=None, max_size_mb=None):
+        if cache_dir is None:
+            cache_dir = os.getenv("JFR_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_size_mb is None:
+            max_size_mb = float(os.getenv("JFR_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, path, digest=None, **options):
+        """
+        Cache key for a recording and the parser options that shape its decoded events.
+        Pass `digest` (the SHA-256 hex of the file) when it is already known to skip re-hashing.
+        """
+        if digest is None:
+            digest = file_digest(path)
+        meta = json.dumps(
+            {"options": options, "format": CACHE_FORMAT_VERSION, "marshal": marshal.version},
+            sort_keys=True
+        )
+        return hashlib.sha256(f"{digest}:{meta}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.events")
+
+    def get(self, key):
+        """Returns an iterator over the cached events for `key`, or None on a miss."""
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        # Touch the entry so eviction sees it as recently used
+        os.utime(path)
+        return self._read_entry(path)
+
+    def _read_entry(self, path):
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_FRAME_HEADER.size)
+                if not header:
+                    return
+                (length,) = _FRAME_HEADER.unpack(header)
+                yield from marshal.loads(zlib.decompress(f.read(length)))
+
+    def store(self, key, events, should_commit=None):
+        """
+        Passes `events` through unchanged while writing them to the cache. The entry is only
+        published once the stream is fully consumed (and `should_commit()` agrees, if given),
+        so abandoned or failed parses never leave a partial entry behind.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        committed = False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                batch = []
+                for e in events:
+                    batch.append(e)
+                    if len(batch) >= BATCH_SIZE:
+                        self._write_frame(f, batch)
+                        batch = []
+                    yield e
+                if batch:
+                    self._write_frame(f, batch)
+            if should_commit is None or should_commit():
+                os.replace(tmp_path, self._entry_path(key))
+                committed = True
+                self.evict()
+        finally:
+            if not committed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _write_frame(f, batch):
+        data = zlib.compress(marshal.dumps(batch), 1)
+        f.write(_FRAME_HEADER.pack(len(data)))
+        f.write(data)
+
+    def entries(self):
+        """(path, size, last used) for every committed entry, least recently used first."""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".events"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            found.append((path, st.st_size, st.st_mtime))
+        return sorted(found, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits its size cap."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Deletes every cache entry; returns how many were removed."""
+        removed = 0
+        for path, _, _ in self.entries():
+            os.remove(path)
+            removed += 1
+        return removed
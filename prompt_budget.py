@@ -0,0 +1,127 @@
+import functools
+import re
+
+# Summary sections in order of diagnostic value; anything unlisted ranks just above top SQL
+SECTION_PRIORITY = [
+    "Significant Change",
+    "Flagged Window",
+    "Stuck Threads",
+    "Hot Methods (samples)",
+    "Longest GC Pause(ms)",
+    "GC Pause p50/p95/p99(ms)",
+    "Thread Event Duration p50/p95/p99(ms)",
+    "Top Leaf Frames (samples)",
+    "Time Range",
+    "Events",
+    "Example Top SQL",
+]
+
+_SECTION_LINE = re.compile(r"^([A-Za-z][^:\n]{0,60}):(?: (.*))?$")
+_JAVA_FRAME = re.compile(r"[\w$]+(?:\.[\w$<>]+)+\([\w$.]*(?::\d+)?\)")
+_THREAD_NAME = re.compile(r"""((?:threadName|javaName)['"]?\s*[:=]\s*)(['"])([^'"]+)\2""")
+
+
+def approx_token_count(text):
+    """Rough token count (~4 characters per token) used when no tokenizer is available."""
+    return (len(text) + 3) // 4
+
+
+@functools.lru_cache(maxsize=8)
+def _local_tokenizer(model_name):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+@functools.lru_cache(maxsize=8)
+def _openai_encoding(model):
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+
+def token_counter(model_name, local=True):
+    """
+    Returns a text -> token count function using the selected model's tokenizer (HuggingFace
+    for local models, tiktoken for OpenAI), falling back to approx_token_count if it can't load.
+    """
+    try:
+        if local:
+            tokenizer = _local_tokenizer(model_name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        encoding = _openai_encoding(model_name)
+        return lambda text: len(encoding.encode(text))
+    except Exception:
+        return approx_token_count
+
+
+def split_sections(summary):
+    """
+    Splits a feature summary into (label, text) sections, one per "Label: value" line;
+    unlabelled lines stay with the section above. A label-only first line (e.g. "JFR Summary:")
+    is returned as the header with an empty label.
+    """
+    sections = []
+    for line in summary.strip().splitlines():
+        m = _SECTION_LINE.match(line)
+        if m:
+            label = m.group(1) if m.group(2) is not None or sections else ""
+            sections.append([label, line])
+        elif sections:
+            sections[-1][1] += "\n" + line
+        else:
+            sections.append(["", line])
+    return [(label, text) for label, text in sections]
+
+
+def dedupe_repeats(text):
+    """
+    Shortens repeated stack frames and thread names: the first occurrence is tagged with a
+    short alias ([F1], [T1], ...) and later occurrences are replaced by the alias alone.
+    """
+    frames = {}
+    threads = {}
+
+    def frame(m):
+        value = m.group(0)
+        if value in frames:
+            return frames[value]
+        frames[value] = f"[F{len(frames) + 1}]"
+        return f"{value} {frames[value]}"
+
+    def thread(m):
+        prefix, quote, value = m.groups()
+        if value in threads:
+            return f"{prefix}{threads[value]}"
+        threads[value] = f"[T{len(threads) + 1}]"
+        return f"{prefix}{quote}{value}{quote} {threads[value]}"
+
+    text = _JAVA_FRAME.sub(frame, text)
+    return _THREAD_NAME.sub(thread, text)
+
+
+def _priority(label):
+    if label in SECTION_PRIORITY:
+        return SECTION_PRIORITY.index(label)
+    return len(SECTION_PRIORITY) - 1.5
+
+
+def compact_summary(summary, budget_tokens, count_tokens=approx_token_count):
+    """
+    Fits a feature summary into `budget_tokens`: repeated frames/thread names are deduplicated,
+    then sections are added greedily by diagnostic value while they fit. Kept sections stay in
+    their original order. Returns (compacted text, labels of dropped sections).
+    """
+    sections = split_sections(dedupe_repeats(summary))
+    header = [i for i, (label, _) in enumerate(sections) if label == ""]
+    kept = set(header)
+    used = sum(count_tokens(sections[i][1] + "\n") for i in header)
+    dropped = []
+    ranked = sorted((i for i in range(len(sections)) if i not in kept), key=lambda i: _priority(sections[i][0]))
+    for i in ranked:
+        cost = count_tokens(sections[i][1] + "\n")
+        if budget_tokens is None or used + cost <= budget_tokens:
+            kept.add(i)
+            used += cost
+        else:
+            dropped.append(sections[i][0])
+    text = "\n".join(sections[i][1] for i in sorted(kept))
+    return text, dropped
@@ -1,10 +1,16 @@
-from jinja2 import Template
+import os
 
-def write_report(findings, output_path):
-    """
-    Writes the LLM analysis results to a Markdown file.
-    """
-    html_template = """
+from jinja2 import Environment
+
+from metrics import stage
+
+CHART_WIDTH = 900
+CHART_HEIGHT = 180
+STATE_COLORS = {
+    "running": "#4caf50", "blocked": "#e53935", "waiting": "#fdd835", "io": "#1e88e5", "stuck": "#8e24aa",
+}
+
+MARKDOWN_TEMPLATE = """
 # JVM Diagnostics Report
 
 ## Executive Summary
@@ -15,6 +21,151 @@ def write_report(findings, output_path):
 
 *Generated by LLM JFR Analyzer MVP*
     """
-    report = Template(html_template).render(findings=findings)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(report)
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>JVM Diagnostics Report</title>
+<style>
+    body { font-family: sans-serif; margin: 2em; max-width: {{ width + 100 }}px; }
+    pre { background: #f4f4f4; padding: 1em; white-space: pre-wrap; }
+    svg { background: #fafafa; border: 1px solid #ddd; overflow: visible; }
+    .axis { font-size: 11px; fill: #555; }
+    .legend span { display: inline-block; margin-right: 1em; font-size: 12px; }
+    .legend i { display: inline-block; width: 10px; height: 10px; margin-right: 4px; }
+</style>
+</head>
+<body>
+<h1>JVM Diagnostics Report</h1>
+<h2>Executive Summary</h2>
+<pre>{{ findings }}</pre>
+{% if charts %}
+<h2>Timeline</h2>
+<p>{{ charts.start }} &rarr; {{ charts.end }} &middot; {{ charts.num_events }} events &middot;
+{{ charts.bucket }} s buckets, downsampled to {{ charts.points }} points per chart</p>
+{% for chart in charts.charts %}
+<h3>{{ chart.title }}</h3>
+{% if chart.layers is defined %}
+<div class="legend">{% for layer in chart.layers %}<span><i style="background:{{ layer.color }}"></i>{{ layer.state }}</span>{% endfor %}</div>
+{% endif %}
+<svg width="{{ width }}" height="{{ height + 20 }}" viewBox="0 0 {{ width }} {{ height + 20 }}">
+{% if chart.layers is defined %}
+{% for layer in chart.layers %}
+<path d="{{ layer.path }}" fill="{{ layer.color }}" fill-opacity="0.8" stroke="none"/>
+{% endfor %}
+{% elif chart.path %}
+<path d="{{ chart.path }}" fill="none" stroke="{{ chart.color }}" stroke-width="{{ chart.stroke }}"/>
+{% endif %}
+<text class="axis" x="4" y="12">{{ chart.y_max }} {{ chart.unit }}</text>
+{% for x, label in charts.ticks %}
+<text class="axis" x="{{ x }}" y="{{ height + 15 }}" text-anchor="{{ loop.first and 'start' or (loop.last and 'end' or 'middle') }}">{{ label }}</text>
+{% endfor %}
+</svg>
+{% if chart.empty %}<p><i>No data.</i></p>{% endif %}
+{% endfor %}
+{% endif %}
+<hr>
+<p><i>Generated by LLM JFR Analyzer MVP</i></p>
+</body>
+</html>
+"""
+
+# Compiled once, at import
+_MARKDOWN = Environment().from_string(MARKDOWN_TEMPLATE)
+_HTML = Environment(autoescape=True, trim_blocks=True, lstrip_blocks=True).from_string(HTML_TEMPLATE)
+
+
+def report_format(path):
+    """"html" for .html/.htm output paths, "markdown" otherwise."""
+    return "html" if os.path.splitext(path)[1].lower() in (".html", ".htm") else "markdown"
+
+
+def _number(value):
+    return f"{value:.3g}" if value < 1000 else f"{value:,.0f}"
+
+
+def _time_label(ns):
+    from feature_extractor import _ns_to_datetime
+    return _ns_to_datetime(ns).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _xy(start_ns, end_ns, y_max):
+    span = max(1, end_ns - start_ns)
+
+    def xy(t, value):
+        return f"{(t - start_ns) / span * CHART_WIDTH:.1f},{CHART_HEIGHT - value / y_max * CHART_HEIGHT:.1f}"
+    return xy
+
+
+def _line_chart(title, unit, points, start_ns, end_ns, color, spikes=False):
+    y_max = max((value for _, value in points), default=0) or 1
+    xy = _xy(start_ns, end_ns, y_max)
+    if spikes:
+        # One vertical stem per point, for sparse events such as GC pauses
+        path = "".join(f"M{xy(t, 0)}L{xy(t, value)}" for t, value in points)
+    else:
+        path = "M" + "L".join(xy(t, value) for t, value in points) if points else ""
+    return {"title": title, "unit": unit, "y_max": _number(y_max), "path": path, "color": color,
+            "stroke": 2 if spikes else 1, "empty": not points}
+
+
+def _stacked_chart(title, unit, states, start_ns, end_ns):
+    from timeseries import THREAD_STATES
+
+    times = states["times"]
+    totals = [sum(values) for values in zip(*(states[state] for state in THREAD_STATES))]
+    y_max = max(totals, default=0) or 1
+    xy = _xy(start_ns, end_ns, y_max)
+    base = [0.0] * len(times)
+    layers = []
+    for state in THREAD_STATES:
+        top = [b + v for b, v in zip(base, states[state])]
+        if any(states[state]):
+            upper = "L".join(xy(t, v) for t, v in zip(times, top))
+            lower = "L".join(xy(t, v) for t, v in zip(reversed(times), reversed(base)))
+            layers.append({"state": state, "color": STATE_COLORS[state], "path": f"M{upper}L{lower}Z"})
+        base = top
+    return {"title": title, "unit": unit, "y_max": _number(y_max), "path": "", "layers": layers, "empty": not layers}
+
+
+def _charts(series):
+    """Template data for the timeline charts of `series` (see TimeSeriesCollector.series)."""
+    start, end = series["start_ns"], series["end_ns"]
+    return {
+        "start": _time_label(start),
+        "end": _time_label(end),
+        "num_events": series["num_events"],
+        "bucket": _number(series["bucket_seconds"]),
+        "points": series["points"],
+        "ticks": [(round(CHART_WIDTH * i / 4), _time_label(start + (end - start) * i // 4)) for i in range(5)],
+        "charts": [
+            _line_chart("GC pauses", "ms", series["gc_pause_ms"], start, end, "#e53935", spikes=True),
+            _line_chart("Event rate", "events/s", series["event_rate"], start, end, "#1e88e5"),
+            _stacked_chart("Thread states", "events/s", series["thread_states"], start, end),
+        ],
+    }
+
+
+def render_report(findings, fmt="markdown", series=None):
+    """
+    The report as a string, "markdown" or "html". The HTML report adds GC-pause, event-rate and
+    thread-state charts of `series` (TimeSeriesCollector.series(), already downsampled) as
+    inline SVG, so it is self-contained and its size is set by the point budget, not the
+    recording.
+    """
+    if fmt == "html":
+        charts = _charts(series) if series else None
+        return _HTML.render(findings=findings, charts=charts, width=CHART_WIDTH, height=CHART_HEIGHT)
+    return _MARKDOWN.render(findings=findings)
+
+
+def write_report(findings, output_path, series=None):
+    """
+    Writes the LLM analysis results to a Markdown file, or to an HTML file with timeline
+    charts when `output_path` ends in .html.
+    """
+    with stage("report_write"):
+        report = render_report(findings, report_format(output_path), series)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(report)
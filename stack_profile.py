@@ -0,0 +1,231 @@
+import heapq
+import math
+import os
+from array import array
+
+from utils import to_millis
+
+DEFAULT_MAX_NODES = 200_000
+TOP_N = 10
+ROOT = 0
+
+
+def frame_name(frame):
+    """Display name of one stack frame, with line number when known."""
+    if isinstance(frame, dict):
+        method = frame.get("method")
+        if isinstance(method, dict):
+            owner = (method.get("type") or {}).get("name", "")
+            name = f"{owner}.{method.get('name', '')}" if owner else method.get("name", "")
+        else:
+            name = str(method)
+        line = frame.get("lineNumber")
+        return f"{name}:{line}" if line is not None else name
+    return str(frame)
+
+
+def frame_names(frames):
+    """frame_name of every frame, formatting frames of the `jfr print` layout directly."""
+    try:
+        return [f"{f['method']['type']['name']}.{f['method']['name']}:{f['lineNumber']}" for f in frames]
+    except (KeyError, TypeError):
+        return [frame_name(f) for f in frames]
+
+
+def method_name(frame_text):
+    """Strips the source position from a frame name: "a.B.c(B.java:12)" / "a.B.c:12" -> "a.B.c"."""
+    paren = frame_text.find("(")
+    if paren > 0:
+        return frame_text[:paren]
+    head, sep, tail = frame_text.rpartition(":")
+    return head if sep and tail.lstrip("-").isdigit() else frame_text
+
+
+def stack_frames(stack):
+    """Frames of a `stackTrace` value (a list, or jfr print's {"frames": [...]}), leaf first."""
+    if isinstance(stack, dict):
+        stack = stack.get("frames")
+    return stack or []
+
+
+class StackProfile:
+    """
+    Aggregates stack traces into a call tree (prefix tree, outermost caller at the root) of
+    interned method ids, with sample counts and summed durations per node.
+
+    Frame and method strings are stored once and referenced by integer ids, and tree nodes
+    live in flat arrays, so millions of samples cost memory proportional to the number of
+    distinct call paths. The tree is capped at `max_nodes`: once full, new paths are cut
+    at their deepest existing prefix (counted in `truncated`), while the per-method and
+    per-leaf-frame totals stay exact. Profiles built over separate chunks merge().
+    """
+
+    def __init__(self, max_nodes=None):
+        if max_nodes is None:
+            max_nodes = int(os.getenv("STACK_PROFILE_MAX_NODES", DEFAULT_MAX_NODES))
+        self.max_nodes = max(1, max_nodes)
+        self.methods = []
+        self._method_ids = {}
+        self.frames = []
+        self._frame_ids = {}
+        self._frame_method = array("i")
+        # Per method: samples it appears in; per frame: samples it is the leaf of
+        self._method_samples = array("q")
+        self._leaf_samples = array("q")
+        # Tree nodes; node 0 is the root
+        self._children = {}
+        self._node_method = array("i", [-1])
+        self._node_parent = array("i", [-1])
+        self._node_count = array("q", [0])
+        self._node_duration = array("d", [0.0])
+        self.samples = 0
+        self.truncated = 0
+
+    def __len__(self):
+        return len(self._node_method)
+
+    def _method_id(self, name):
+        mid = self._method_ids.get(name)
+        if mid is None:
+            mid = len(self.methods)
+            self._method_ids[name] = mid
+            self.methods.append(name)
+            self._method_samples.append(0)
+        return mid
+
+    def _frame_id(self, name):
+        fid = self._frame_ids.get(name)
+        if fid is None:
+            fid = len(self.frames)
+            self._frame_ids[name] = fid
+            self.frames.append(name)
+            self._frame_method.append(self._method_id(method_name(name)))
+            self._leaf_samples.append(0)
+        return fid
+
+    def _child(self, node, mid):
+        key = (node, mid)
+        child = self._children.get(key)
+        if child is None:
+            if len(self._node_method) >= self.max_nodes:
+                return None
+            child = len(self._node_method)
+            self._children[key] = child
+            self._node_method.append(mid)
+            self._node_parent.append(node)
+            self._node_count.append(0)
+            self._node_duration.append(0.0)
+        return child
+
+    def _add_path(self, mids, weight, duration):
+        """Adds one sample along a root-to-leaf list of method ids."""
+        node = ROOT
+        self._node_count[ROOT] += weight
+        self._node_duration[ROOT] += duration
+        for mid in mids:
+            child = self._child(node, mid)
+            if child is None:
+                self.truncated += weight
+                return
+            node = child
+            self._node_count[node] += weight
+            self._node_duration[node] += duration
+
+    def add(self, frames, duration_ms=0.0, weight=1):
+        """Adds one sampled stack (frame names or jfr print frame dicts, leaf first)."""
+        fids = [self._frame_id(name) for name in frame_names(frames)]
+        if not fids:
+            return
+        self.samples += weight
+        self._leaf_samples[fids[0]] += weight
+        mids = [self._frame_method[fid] for fid in reversed(fids)]
+        for mid in set(mids):
+            self._method_samples[mid] += weight
+        self._add_path(mids, weight, duration_ms * weight)
+
+    def add_event(self, fields):
+        """Adds the stackTrace of one event's fields, if it has one, weighted by its duration."""
+        frames = stack_frames(fields.get("stackTrace"))
+        if frames:
+            duration = to_millis(fields.get("duration"))
+            self.add(frames, 0.0 if math.isnan(duration) else duration)
+
+    def merge(self, other):
+        """Adds every sample of another profile to this one."""
+        fids = [self._frame_id(name) for name in other.frames]
+        for ofid, fid in enumerate(fids):
+            self._leaf_samples[fid] += other._leaf_samples[ofid]
+        for omid, name in enumerate(other.methods):
+            self._method_samples[self._method_id(name)] += other._method_samples[omid]
+        # Parents are always created before their children, so one forward pass maps all nodes
+        node_map = array("i", [ROOT])
+        self._node_count[ROOT] += other._node_count[ROOT]
+        self._node_duration[ROOT] += other._node_duration[ROOT]
+        for onode in range(1, len(other._node_method)):
+            parent = node_map[other._node_parent[onode]]
+            node = None
+            if parent >= 0:
+                node = self._child(parent, self._method_id(other.methods[other._node_method[onode]]))
+                if node is None:
+                    self.truncated += other._node_count[onode]
+            if node is None:
+                node_map.append(-1)
+                continue
+            node_map.append(node)
+            self._node_count[node] += other._node_count[onode]
+            self._node_duration[node] += other._node_duration[onode]
+        self.samples += other.samples
+        self.truncated += other.truncated
+        return self
+
+    def update(self, events):
+        from feature_extractor import _event_fields
+        for e in events:
+            self.add_event(_event_fields(e)[1])
+        return self
+
+    def observe(self, events):
+        """Passes events through unchanged while profiling their stacks."""
+        from feature_extractor import _event_fields
+        for e in events:
+            self.add_event(_event_fields(e)[1])
+            yield e
+
+    def hot_methods(self, n=TOP_N):
+        """(method, samples it appears in) for the n methods on the most stacks."""
+        top = heapq.nlargest(n, range(len(self.methods)), key=self._method_samples.__getitem__)
+        return [(self.methods[m], self._method_samples[m]) for m in top if self._method_samples[m]]
+
+    def top_leaf_frames(self, n=TOP_N):
+        """(frame, samples) for the n frames most often on top of the stack."""
+        top = heapq.nlargest(n, range(len(self.frames)), key=self._leaf_samples.__getitem__)
+        return [(self.frames[f], self._leaf_samples[f]) for f in top if self._leaf_samples[f]]
+
+    def collapsed(self, by_duration=False):
+        """
+        Collapsed-stack lines ("root;caller;callee count"), the input format of flamegraph.pl
+        and speedscope. A node's count excludes samples that continue into its children.
+        With by_duration, values are the summed event durations in whole milliseconds.
+        """
+        values = self._node_duration if by_duration else self._node_count
+        children = [[] for _ in range(len(self._node_method))]
+        for node in range(1, len(self._node_method)):
+            children[self._node_parent[node]].append(node)
+        lines = []
+        # Depth-first, keeping only the current path in memory
+        path = []
+        pending = [(child, 0) for child in reversed(children[ROOT])]
+        while pending:
+            node, depth = pending.pop()
+            del path[depth:]
+            path.append(self.methods[self._node_method[node]])
+            own = round(values[node] - sum(values[c] for c in children[node]))
+            if own > 0:
+                lines.append(f"{';'.join(path)} {own}")
+            pending.extend((child, depth + 1) for child in reversed(children[node]))
+        return lines
+
+    def write_collapsed(self, path, by_duration=False):
+        with open(path, "w", encoding="utf-8") as f:
+            for line in self.collapsed(by_duration):
+                f.write(line + "\n")
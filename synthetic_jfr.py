@@ -0,0 +1,143 @@
+import datetime
+import json
+import random
+
+# Relative frequency of each generated event kind
+DEFAULT_MIX = {
+    "jdk.ExecutionSample": 50,
+    "jdk.SocketRead": 12,
+    "jdk.SocketWrite": 8,
+    "jdk.FileRead": 5,
+    "jdk.SQLExecution": 10,
+    "jdk.JavaMonitorEnter": 6,
+    "jdk.GarbageCollection": 6,
+    "jdk.ThreadStuck": 3,
+}
+DEFAULT_START = "2025-01-01T00:00:00Z"
+# Mean gap between consecutive events
+DEFAULT_INTERVAL_MS = 5.0
+# Stuck threads mostly arrive in bursts of BURST_LENGTH events, one every BURST_PERIOD events
+BURST_LENGTH = 2_000
+BURST_PERIOD = 50_000
+
+_PACKAGES = ["com.acme.claims", "com.acme.billing", "com.acme.members", "org.hibernate.internal", "io.netty.channel"]
+_CLASSES = ["Service", "Repository", "Controller", "Mapper", "Handler", "Client", "Cache", "Validator"]
+_METHODS = ["find", "load", "save", "handle", "process", "read", "write", "validate", "lookup", "apply"]
+_LEAVES = {
+    "jdk.SocketRead": ("sun.nio.ch.SocketChannelImpl", "read"),
+    "jdk.SocketWrite": ("sun.nio.ch.SocketChannelImpl", "write"),
+    "jdk.FileRead": ("java.io.FileInputStream", "readBytes"),
+    "jdk.SQLExecution": ("oracle.jdbc.driver.T4CPreparedStatement", "executeQuery"),
+    "jdk.JavaMonitorEnter": ("java.lang.Object", "wait"),
+    "jdk.ThreadStuck": ("oracle.jdbc.driver.T4CPreparedStatement", "executeQuery"),
+}
+_TABLES = ["claims", "members", "providers", "benefits", "invoices"]
+
+
+def _duration(ms):
+    return f"PT{ms / 1000:.6f}".rstrip("0").rstrip(".") + "S"
+
+
+def _timestamp(start, offset_ms):
+    return (start + datetime.timedelta(milliseconds=offset_ms)).strftime("%Y-%m-%dT%H:%M:%S.%f") + "Z"
+
+
+class SyntheticRecording:
+    """
+    Deterministic generator of realistic `jfr print --json` style events.
+
+    The same (num_events, seed, mix, ...) always yields the same stream. Events carry
+    ISO timestamps and durations, thread references and leaf-first stack traces of
+    `stack_depth` frames drawn from a fixed pool of call paths, so stacks repeat the way
+    real sampled stacks do. GC pauses are mostly short with periodic spikes, and stuck
+    threads arrive in bursts, so time-window anomaly detection has something to find.
+    """
+
+    def __init__(self, num_events, seed=0, mix=None, start=DEFAULT_START, interval_ms=DEFAULT_INTERVAL_MS,
+                 stack_depth=16, num_threads=64, num_call_paths=500):
+        self.num_events = num_events
+        self.seed = seed
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.start = datetime.datetime.fromisoformat(start.replace("Z", "+00:00"))
+        self.interval_ms = interval_ms
+        self.stack_depth = max(1, stack_depth)
+        self.num_threads = max(1, num_threads)
+        self.num_call_paths = max(1, num_call_paths)
+
+    def _call_paths(self, rng):
+        paths = []
+        for _ in range(self.num_call_paths):
+            path = []
+            for depth in range(self.stack_depth):
+                cls = f"{rng.choice(_PACKAGES)}.{rng.choice(_CLASSES)}{depth % 7}"
+                path.append((cls, rng.choice(_METHODS), rng.randint(10, 900)))
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def _frame(cls, name, line):
+        return {"method": {"type": {"name": cls}, "name": name}, "lineNumber": line}
+
+    def _stack(self, leaf, callers):
+        # Caller frames are shared between events of the same call path; nothing mutates them
+        return {"truncated": False, "frames": [self._frame(*leaf)] + callers}
+
+    def events(self):
+        rng = random.Random(self.seed)
+        kinds = list(self.mix)
+        weights = [self.mix[k] for k in kinds]
+        paths = self._call_paths(rng)
+        # Events replace the first frame of their call path with an event-specific leaf
+        callers = [[self._frame(*frame) for frame in path] for path in paths]
+        threads = [{"javaName": f"worker-{i}", "javaThreadId": 100 + i} for i in range(self.num_threads)]
+        offset = 0.0
+        for i in range(self.num_events):
+            offset += rng.expovariate(1.0 / self.interval_ms)
+            kind = rng.choices(kinds, weights)[0]
+            # Stuck threads cluster: outside one stretch in every BURST_PERIOD events, most become samples
+            if kind == "jdk.ThreadStuck" and (i // BURST_LENGTH) % (BURST_PERIOD // BURST_LENGTH) != 1 \
+                    and rng.random() < 0.9:
+                kind = "jdk.ExecutionSample"
+            p = rng.randrange(len(paths))
+            path = paths[p]
+            values = {"startTime": _timestamp(self.start, offset), "eventThread": rng.choice(threads)}
+            if kind == "jdk.GarbageCollection":
+                # Every ~500th collection is a long pause
+                pause = rng.uniform(150, 2000) if rng.random() < 0.002 else rng.uniform(1, 20)
+                values.update({
+                    "duration": _duration(pause * 1.3), "longestPause": _duration(pause),
+                    "name": rng.choice(["G1New", "G1Old"]), "gcId": i,
+                })
+            elif kind == "jdk.ThreadStuck":
+                values.update({"duration": _duration(rng.uniform(60_000, 600_000)),
+                               "stackTrace": self._stack((*_LEAVES[kind], 3771), callers[p][1:])})
+            else:
+                leaf_cls, leaf_method = _LEAVES.get(kind, (path[0][0], path[0][1]))
+                values["duration"] = _duration(rng.lognormvariate(1.0, 1.2))
+                values["stackTrace"] = self._stack((leaf_cls, leaf_method, rng.randint(1, 500)), callers[p][1:])
+                if kind == "jdk.SQLExecution":
+                    table = rng.choice(_TABLES)
+                    values["sql"] = f"select * from {table} where {table}_id = ?"
+                elif kind in ("jdk.SocketRead", "jdk.SocketWrite"):
+                    values["host"] = f"db{rng.randint(1, 4)}.example.com"
+                    values["bytesRead" if kind == "jdk.SocketRead" else "bytesWritten"] = rng.randint(64, 65536)
+            yield {"type": kind, "values": values}
+
+    def __iter__(self):
+        return self.events()
+
+    def write(self, path):
+        """
+        Writes the stream in the `jfr print --json` layout ({"recording": {"events": [...]}})
+        one event at a time; returns the number of events written.
+        """
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"recording": {"events": [\n')
+            for e in self.events():
+                if count:
+                    f.write(",\n")
+                f.write(json.dumps(e, separators=(",", ":")))
+                count += 1
+            f.write("\n]}}\n")
+        return count
@@ -0,0 +1,111 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import analyzer_daemon
+from analyzer_daemon import AnalyzerDaemon
+
+class TestAnalyzerDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="daemon_test_")
+        self.socket_path = os.path.join(self.tmpdir, "daemon.sock")
+        self.sample = os.path.abspath(os.path.join("sample_data", "event_snippets.json"))
+
+    def tearDown(self):
+        analyzer_daemon.stop(self.socket_path)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def start_daemon(self):
+        daemon = AnalyzerDaemon(self.socket_path)
+        threading.Thread(target=daemon.serve_forever, daemon=True).start()
+        deadline = time.time() + 10
+        while analyzer_daemon._connect(self.socket_path) is None:
+            self.assertLess(time.time(), deadline, "daemon did not start")
+            time.sleep(0.05)
+        return daemon
+
+    def submit(self, argv):
+        out, err = io.StringIO(), io.StringIO()
+        status = analyzer_daemon.submit(argv, cwd=self.tmpdir, socket_path=self.socket_path, stdout=out, stderr=err)
+        return status, out.getvalue(), err.getvalue()
+
+    def test_no_daemon_means_run_in_process(self):
+        self.assertIsNone(analyzer_daemon.submit(["--jfr", self.sample], socket_path=self.socket_path))
+        self.assertFalse(analyzer_daemon.stop(self.socket_path))
+
+    def test_runs_jobs_in_client_directory_and_streams_output(self):
+        self.start_daemon()
+        with mock.patch("llm_prompter.stream_llm", return_value=iter(["1. Long ", "GC pauses."])):
+            status, out, err = self.submit(["--jfr", self.sample, "--nocache", "--output", "report.md", "--profile"])
+        self.assertEqual(status, 0, err)
+        self.assertIn("1. Long GC pauses.", out)
+        self.assertIn("Stage profile:", out)
+        with open(os.path.join(self.tmpdir, "report.md"), encoding="utf-8") as f:
+            self.assertIn("GC pauses.", f.read())
+
+    def test_job_exit_status_is_relayed(self):
+        self.start_daemon()
+        status, out, _ = self.submit(["--jfr", "missing.json"])
+        self.assertEqual(status, 1)
+        self.assertIn("JFR file not found: missing.json", out)
+        # The daemon keeps serving after a failed job
+        with mock.patch("llm_prompter.stream_llm", side_effect=RuntimeError("model crashed")):
+            status, _, err = self.submit(["--jfr", self.sample, "--nocache", "--output", "report.md"])
+        self.assertEqual(status, 1)
+        self.assertIn("model crashed", err)
+
+    def test_jobs_use_client_environment(self):
+        self.start_daemon()
+        seen = {}
+
+        def fake_execute(args):
+            seen["model"] = os.environ.get("LLM_MODEL")
+            seen["budget"] = os.environ.get("PROMPT_TOKEN_BUDGET")
+            os.environ["USE_LOCAL_LLM"] = "1"
+
+        env = {key: value for key, value in analyzer_daemon.job_environment().items() if key != "PROMPT_TOKEN_BUDGET"}
+        env["LLM_MODEL"] = "client-model"
+        before = dict(os.environ)
+        with mock.patch.dict(os.environ, {"PROMPT_TOKEN_BUDGET": "999"}), \
+             mock.patch("main.execute", fake_execute):
+            status = analyzer_daemon.submit(
+                ["--jfr", self.sample], cwd=self.tmpdir, socket_path=self.socket_path, env=env,
+                stdout=io.StringIO(), stderr=io.StringIO())
+            self.assertEqual(os.environ.get("PROMPT_TOKEN_BUDGET"), "999")
+        self.assertEqual(status, 0)
+        # The client's LLM_MODEL is used, and the daemon's PROMPT_TOKEN_BUDGET is not
+        self.assertEqual(seen, {"model": "client-model", "budget": None})
+        # The job's own changes don't leak into the daemon or the next job
+        self.assertEqual(dict(os.environ), before)
+
+    def test_conflicting_process_settings_run_in_client(self):
+        self.start_daemon()
+        env = dict(analyzer_daemon.job_environment(), LLM_CACHE_PATH=os.path.join(self.tmpdir, "other.sqlite"))
+        err = io.StringIO()
+        with mock.patch("main.execute") as execute:
+            status = analyzer_daemon.submit(
+                ["--jfr", self.sample], cwd=self.tmpdir, socket_path=self.socket_path, env=env,
+                stdout=io.StringIO(), stderr=err)
+        self.assertIsNone(status)
+        self.assertIn("LLM_CACHE_PATH", err.getvalue())
+        execute.assert_not_called()
+
+    def test_socket_is_private(self):
+        self.start_daemon()
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    def test_stop_removes_socket(self):
+        self.start_daemon()
+        self.assertTrue(analyzer_daemon.stop(self.socket_path))
+        deadline = time.time() + 5
+        while os.path.exists(self.socket_path) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+if __name__ == "__main__":
+    unittest.main()
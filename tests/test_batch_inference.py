@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_inference import BatchScheduler
+
+class RecordingBackend:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, model_name, prompts, **params):
+        with self.lock:
+            self.calls.append((model_name, list(prompts), params))
+        time.sleep(self.delay)
+        return [f"{model_name}:{p}" for p in prompts]
+
+class TestBatchScheduler(unittest.TestCase):
+    def test_concurrent_prompts_share_a_batch(self):
+        backend = RecordingBackend()
+        scheduler = BatchScheduler(backend, max_batch_size=4, max_wait_ms=500)
+        futures = [scheduler.submit("m", f"p{i}", max_new_tokens=10) for i in range(4)]
+        self.assertEqual([f.result(timeout=5) for f in futures], [f"m:p{i}" for i in range(4)])
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(backend.calls[0], ("m", ["p0", "p1", "p2", "p3"], {"max_new_tokens": 10}))
+
+    def test_batches_capped_at_max_size(self):
+        backend = RecordingBackend()
+        scheduler = BatchScheduler(backend, max_batch_size=2, max_wait_ms=200)
+        futures = [scheduler.submit("m", f"p{i}") for i in range(5)]
+        for f in futures:
+            f.result(timeout=5)
+        self.assertTrue(all(len(prompts) <= 2 for _, prompts, _ in backend.calls))
+        self.assertEqual(sum(len(prompts) for _, prompts, _ in backend.calls), 5)
+        stats = scheduler.stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreaterEqual(stats["max_queue_depth"], 2)
+
+    def test_lone_prompt_runs_after_wait(self):
+        backend = RecordingBackend()
+        scheduler = BatchScheduler(backend, max_batch_size=8, max_wait_ms=20)
+        self.assertEqual(scheduler.generate("m", "only"), "m:only")
+        self.assertEqual(scheduler.stats()["batch_size_histogram"], {1: 1})
+
+    def test_groups_by_model_and_params(self):
+        backend = RecordingBackend()
+        scheduler = BatchScheduler(backend, max_batch_size=4, max_wait_ms=100)
+        futures = [
+            scheduler.submit("a", "x", max_new_tokens=10),
+            scheduler.submit("b", "y", max_new_tokens=10),
+            scheduler.submit("a", "z", max_new_tokens=20),
+            scheduler.submit("a", "w", max_new_tokens=10),
+        ]
+        self.assertEqual([f.result(timeout=5) for f in futures], ["a:x", "b:y", "a:z", "a:w"])
+        groups = sorted((m, tuple(p), params["max_new_tokens"]) for m, p, params in backend.calls)
+        self.assertEqual(groups, [("a", ("x", "w"), 10), ("a", ("z",), 20), ("b", ("y",), 10)])
+
+    def test_batch_failure_reaches_every_caller(self):
+        def failing(model_name, prompts, **params):
+            raise RuntimeError("out of memory")
+
+        scheduler = BatchScheduler(failing, max_batch_size=2, max_wait_ms=100)
+        futures = [scheduler.submit("m", "a"), scheduler.submit("m", "b")]
+        for f in futures:
+            with self.assertRaises(RuntimeError):
+                f.result(timeout=5)
+        # The dispatcher keeps serving after a failed batch
+        scheduler._run_batch = RecordingBackend()
+        self.assertEqual(scheduler.generate("m", "c"), "m:c")
+
+    def test_blocking_callers_from_threads(self):
+        backend = RecordingBackend(delay=0.05)
+        scheduler = BatchScheduler(backend, max_batch_size=8, max_wait_ms=100)
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda i: scheduler.generate("m", str(i)), range(6)))
+        self.assertEqual(results, [f"m:{i}" for i in range(6)])
+        self.assertLess(len(backend.calls), 6)
+
+if __name__ == "__main__":
+    unittest.main()
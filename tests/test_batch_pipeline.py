@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import llm_prompter
+from batch_pipeline import BatchPipeline, RateLimiter, discover_recordings, summarize_recording
+
+def failing_summarize(jfr_path, options):
+    if "broken" in jfr_path:
+        raise ValueError("corrupt recording")
+    return summarize_recording(jfr_path, options)
+
+class TestBatchPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="batch_test_")
+        self.input_dir = os.path.join(self.tmpdir, "in")
+        self.output_dir = os.path.join(self.tmpdir, "out")
+        os.makedirs(os.path.join(self.input_dir, "nested"))
+        sample = os.path.join("sample_data", "event_snippets.json")
+        for name in ("app1.json", "app2.json", "broken.json", os.path.join("nested", "app3.json")):
+            shutil.copy(sample, os.path.join(self.input_dir, name))
+        with open(os.path.join(self.input_dir, "notes.txt"), "w") as f:
+            f.write("not a recording")
+        self.options = {"nocache": True}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_discover_recordings(self):
+        found = discover_recordings([self.input_dir, os.path.join(self.input_dir, "nested", "*.json")])
+        self.assertEqual([os.path.basename(p) for p in found], ["app1.json", "app2.json", "broken.json", "app3.json"])
+
+    def test_reports_index_and_failure_isolation(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def analyze(summary):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return "findings for " + summary.split("\n")[2]
+
+        paths = discover_recordings([self.input_dir])
+        pipeline = BatchPipeline(
+            self.output_dir, self.options, parse_workers=2, llm_concurrency=2,
+            analyze=analyze, summarize=failing_summarize)
+        results = pipeline.run(paths, progress=lambda message: None)
+        statuses = {os.path.basename(r["recording"]): r["status"] for r in results}
+        self.assertEqual(statuses, {"app1.json": "done", "app2.json": "done", "broken.json": "failed"})
+        self.assertLessEqual(max(peak), 2)
+        with open(os.path.join(self.output_dir, "app1.md"), encoding="utf-8") as f:
+            self.assertIn("findings for Events: 4", f.read())
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "broken.md")))
+        with open(os.path.join(self.output_dir, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        failed = [r for r in index["recordings"] if r["status"] == "failed"]
+        self.assertIn("corrupt recording", failed[0]["error"])
+        with open(os.path.join(self.output_dir, "index.md"), encoding="utf-8") as f:
+            self.assertIn("2 of 3 recordings analyzed", f.read())
+
+    def test_llm_errors_fail_the_recording(self):
+        # The real analyze_with_llm, with a local model that can't be set up
+        paths = discover_recordings([self.input_dir])[:2]
+        env = {"USE_LOCAL_LLM": "1", "LLM_CACHE": "0", "PROMPT_TOKEN_BUDGET": "0"}
+        with mock.patch.dict(os.environ, env), \
+             mock.patch.object(llm_prompter, "ensure_local_llm", return_value=False):
+            pipeline = BatchPipeline(self.output_dir, self.options, parse_workers=1, requests_per_minute=1)
+            results = pipeline.run(paths, progress=lambda message: None)
+        self.assertEqual(pipeline.rate_limiter.interval, 0.0)
+        self.assertEqual([r["status"] for r in results], ["failed", "failed"])
+        self.assertIn("could not be set up", results[0]["error"])
+        self.assertFalse(os.path.exists(results[0]["report"]))
+
+    def test_same_base_names_get_distinct_reports(self):
+        paths = discover_recordings([self.input_dir, os.path.join(self.input_dir, "nested")])
+        other = os.path.join(self.input_dir, "nested", "app1.json")
+        shutil.copy(paths[0], other)
+        pipeline = BatchPipeline(self.output_dir, self.options, parse_workers=1, analyze=lambda s: "ok")
+        results = pipeline.run([paths[0], other], progress=lambda message: None)
+        self.assertEqual(len({r["report"] for r in results}), 2)
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = RateLimiter(requests_per_minute=60 * 20)  # one call per 50 ms
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.14)
+
+if __name__ == "__main__":
+    unittest.main()
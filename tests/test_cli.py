@@ -30,6 +30,15 @@ class TestClicliEndToEnd(unittest.TestCase):
         self.assertIn("JVM Diagnostics Report", output)
         self.assertIn("Executive Summary", output)
 
+    def test_conflicting_summary_options_are_rejected(self):
+        for options in (["--window", "60", "--columnar"], ["--baseline", "base.json", "--mapreduce", "4"],
+                        ["--savebaseline", "base.json", "--window", "60"], ["--from", "2025-01-01T00:00:00Z", "--columnar"]):
+            with self.subTest(options=options):
+                p = subprocess.run([sys.executable, self.main_py, "--jfr", self.sample_json, "--nodaemon", *options],
+                                   capture_output=True, text=True)
+                self.assertEqual(p.returncode, 2)
+                self.assertIn("can't be combined", p.stderr)
+
     def test_cli_real_jfr(self):
         # Only runs if a real sample JFR is present
         if not os.path.exists(self.sample_jfr):
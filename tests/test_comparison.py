@@ -0,0 +1,90 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from comparison import (
+    ProfileStore, RecordingProfile, compare_profiles, is_profile_file, load_baseline, profile_recording,
+    render_comparison)
+from feature_extractor import QuantileSketch
+from synthetic_jfr import SyntheticRecording
+
+def sketch(values):
+    s = QuantileSketch()
+    for v in values:
+        s.add(v)
+    return s
+
+class TestComparison(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="comparison_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_profile_round_trip(self):
+        _, profile = profile_recording(SyntheticRecording(2000, seed=1))
+        path = os.path.join(self.tmpdir, "base.json")
+        profile.save(path)
+        self.assertTrue(is_profile_file(path))
+        self.assertFalse(is_profile_file(os.path.join("sample_data", "event_snippets.json")))
+        loaded = RecordingProfile.load(path)
+        self.assertEqual(loaded.to_dict(), profile.to_dict())
+        self.assertEqual(loaded.gc_pauses.quantile(0.95), profile.gc_pauses.quantile(0.95))
+        self.assertEqual(sum(loaded.event_counts.values()), 2000)
+
+    def test_same_workload_has_no_significant_changes(self):
+        _, baseline = profile_recording(SyntheticRecording(20000, seed=1))
+        _, current = profile_recording(SyntheticRecording(20000, seed=2))
+        self.assertEqual(compare_profiles(current, baseline), [])
+        self.assertIn("No statistically significant changes", render_comparison([], current, baseline))
+
+    def test_detects_rate_and_distribution_shifts(self):
+        rng = random.Random(0)
+        baseline = RecordingProfile(
+            num_events=2000, duration_seconds=600, event_counts={"jdk.ThreadStuck": 20, "jdk.GarbageCollection": 500},
+            gc_pauses=sketch(rng.uniform(5, 15) for _ in range(500)))
+        current = RecordingProfile(
+            num_events=2000, duration_seconds=600, event_counts={"jdk.ThreadStuck": 200, "jdk.GarbageCollection": 510},
+            gc_pauses=sketch(rng.uniform(30, 90) for _ in range(510)))
+        differences = compare_profiles(current, baseline)
+        self.assertEqual({d["metric"] for d in differences}, {"GC pause (ms)", "jdk.ThreadStuck"})
+        summary = render_comparison(differences, current, baseline)
+        self.assertEqual(summary.count("Significant Change:"), 2)
+        self.assertIn("jdk.ThreadStuck rate", summary)
+
+    def test_baseline_recording_is_profiled_once(self):
+        store = ProfileStore(os.path.join(self.tmpdir, "profiles"))
+        recording = os.path.join(self.tmpdir, "base.json")
+        SyntheticRecording(500).write(recording)
+        build = mock.Mock(side_effect=lambda path: RecordingProfile(num_events=500))
+        for _ in range(2):
+            self.assertEqual(load_baseline(recording, build, store=store).num_events, 500)
+        self.assertEqual(build.call_count, 1)
+
+    def test_webui_compare_endpoint(self):
+        import webui
+        store = ProfileStore(os.path.join(self.tmpdir, "profiles"))
+        base = RecordingProfile(num_events=100, duration_seconds=60, event_counts={"jdk.ThreadStuck": 5})
+        worse = RecordingProfile(num_events=100, duration_seconds=60, event_counts={"jdk.ThreadStuck": 80})
+        ids = {}
+        for name, profile in (("base", base), ("worse", worse)):
+            ids[name] = ProfileStore.key_for(name)
+            store.put(ids[name], profile)
+        client = TestClient(webui.app)
+        with mock.patch.object(webui, "profile_store", store), \
+                mock.patch.object(webui, "analyze_with_llm", return_value="Stuck threads rose sharply.") as llm:
+            response = client.get("/compare", params={"current": ids["worse"], "baseline": ids["base"], "analyze": "true"})
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertEqual([d["metric"] for d in body["differences"]], ["jdk.ThreadStuck"])
+            self.assertEqual(body["findings"], "Stuck threads rose sharply.")
+            self.assertIn("Significant Change", llm.call_args[0][0])
+            self.assertEqual(client.get("/compare", params={"current": "../etc", "baseline": ids["base"]}).status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
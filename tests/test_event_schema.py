@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+
+import event_schema
+from event_schema import MAX_SCHEMAS_PER_TYPE, EventNormalizer, duration_ns, timestamp_ns
+from synthetic_jfr import SyntheticRecording
+from utils import NAT_NS, parse_timestamp_ns, to_millis
+
+def gc(**values):
+    return {"type": "jdk.GarbageCollection", "values": {
+        "startTime": "2025-01-01T00:00:10.250000Z", "duration": "PT0.5S", "longestPause": "PT0.37S",
+        "eventThread": {"javaName": "worker-1", "javaThreadId": 11}, "name": "G1Old", **values}}
+
+class TestEventSchema(unittest.TestCase):
+    def test_typed_fields(self):
+        record = EventNormalizer().normalize(gc())
+        self.assertEqual(record.event_type, "jdk.GarbageCollection")
+        self.assertEqual(record.start_ns, parse_timestamp_ns("2025-01-01T00:00:10.250Z"))
+        self.assertEqual(record.duration_ns, 500_000_000)
+        self.assertEqual(record.thread, "worker-1")
+        self.assertEqual(record.stack, ())
+        self.assertEqual(record.get("longestPause"), 370_000_000)
+        self.assertEqual(record.get("eventThread.javaThreadId"), 11)
+        self.assertEqual(record.get("name"), "G1Old")
+        self.assertIsNone(record.get("missing"))
+
+    def test_flat_snippets(self):
+        normalizer = EventNormalizer()
+        record = normalizer.normalize({
+            "event": "jdk.ThreadStuck", "threadName": "worker-2", "longestPause": 150,
+            "stackTrace": ["a.B.c(B.java:1)", "d.E.f(E.java:2)"]})
+        self.assertEqual(record.start_ns, NAT_NS)
+        self.assertIsNone(record.duration_ns)
+        self.assertEqual(record.thread, "worker-2")
+        self.assertEqual(record.stack, ("a.B.c(B.java:1)", "d.E.f(E.java:2)"))
+        # Plain numbers in duration fields are milliseconds
+        self.assertEqual(record.get("longestPause"), 150_000_000)
+        self.assertEqual(record.to_dict()["event"], "jdk.ThreadStuck")
+
+    def test_schema_is_learned_once_per_layout(self):
+        normalizer = EventNormalizer()
+        first = normalizer.normalize(gc())
+        self.assertIs(normalizer.normalize(gc(gcId=1)).schema, normalizer.normalize(gc(gcId=2)).schema)
+        self.assertEqual(len(normalizer), 2)
+        # Extra or differently nested fields get their own schema rather than being dropped or misread
+        extra = normalizer.normalize(gc(eventThread={"javaName": "worker-3", "osName": "w3"}))
+        self.assertEqual(extra.get("eventThread.osName"), "w3")
+        self.assertIsNone(extra.get("eventThread.javaThreadId"))
+        self.assertEqual(extra.thread, "worker-3")
+        self.assertIsNone(normalizer.normalize(gc(eventThread=None)).thread)
+        self.assertIsNot(extra.schema, first.schema)
+        for i in range(2 * MAX_SCHEMAS_PER_TYPE):
+            self.assertEqual(normalizer.normalize(gc(**{f"field{i}": i})).get(f"field{i}"), i)
+        self.assertLessEqual(len(normalizer._accessors[("jdk.GarbageCollection", True)]), MAX_SCHEMAS_PER_TYPE)
+
+    def test_layouts_past_the_cap_are_not_compiled(self):
+        shapes = 3 * MAX_SCHEMAS_PER_TYPE
+        events = [gc(**{f"field{i}": i, "extra": {"pause": "PT0.25S", "at": "2025-01-01T00:00:01.5Z"}},
+                     eventThread={"javaName": f"w{i}"}) for i in range(shapes)] * 3
+        normalizer = EventNormalizer()
+        with mock.patch.object(event_schema, "compile", wraps=compile, create=True) as compiled:
+            records = list(normalizer.normalize_all(events))
+        self.assertEqual(compiled.call_count, MAX_SCHEMAS_PER_TYPE)
+        for e, record in zip(events, records):
+            # Same record as a normalizer that compiles this layout
+            self.assertEqual(record.to_dict(), EventNormalizer().normalize(e).to_dict())
+        late = records[shapes - 1]
+        self.assertEqual(late.get(f"field{shapes - 1}"), shapes - 1)
+        self.assertEqual(late.get("extra.pause"), 250_000_000)
+        self.assertEqual(late.get("extra.at"), parse_timestamp_ns("2025-01-01T00:00:01.5Z"))
+        self.assertEqual(late.thread, f"w{shapes - 1}")
+        self.assertEqual(late.duration_ns, 500_000_000)
+
+    def test_unparseable_values_are_kept(self):
+        record = EventNormalizer().normalize(gc(duration="soon", startTime="yesterday"))
+        self.assertEqual(record.start_ns, NAT_NS)
+        self.assertIsNone(record.duration_ns)
+        record = EventNormalizer().normalize(gc(longestPause="n/a"))
+        self.assertEqual(record.get("longestPause"), "n/a")
+
+    def test_conversions_match_generic_parsers(self):
+        for value in ("2025-01-01T00:00:00.004169Z", "2025-01-01T00:00:00.123456789Z", "2025-01-01T00:00:00Z",
+                      "2025-01-01T01:00:00.5+01:00", "not a time", None):
+            self.assertEqual(timestamp_ns(value), parse_timestamp_ns(value), value)
+        for value in ("PT0.37S", "PT1M2.5S", "PT2H", "PT0S", 12.5, "P1D", None, True):
+            ms = to_millis(value)
+            self.assertEqual(duration_ns(value), None if ms != ms else round(ms * 1_000_000), value)
+
+    def test_synthetic_recording(self):
+        events = list(SyntheticRecording(500, seed=1).events())
+        records = list(EventNormalizer().normalize_all(events))
+        self.assertEqual(len(records), 500)
+        sample = next(r for r, e in zip(records, events) if "stackTrace" in e["values"])
+        self.assertGreater(len(sample.stack), 1)
+        self.assertTrue(all(":" in frame for frame in sample.stack))
+
+if __name__ == "__main__":
+    unittest.main()
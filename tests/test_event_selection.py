@@ -0,0 +1,66 @@
+import io
+import os
+import unittest
+from unittest import mock
+
+import jfr_parser
+from event_selection import DEFAULT_CATEGORIES, EventSelection, resolve_selection
+from feature_extractor import extract_features, feature_selection
+from jfr_parser import iter_jfr_events
+
+SAMPLE = os.path.join("sample_data", "event_snippets.json")
+
+class TestEventSelection(unittest.TestCase):
+    def test_jfr_print_args(self):
+        self.assertEqual(EventSelection().jfr_print_args(), ["--categories", DEFAULT_CATEGORIES])
+        selection = EventSelection(events="jdk.ThreadStuck, jdk.GarbageCollection")
+        self.assertEqual(selection.jfr_print_args(), ["--events", "jdk.GarbageCollection,jdk.ThreadStuck"])
+
+    def test_apply_filters_types_and_projects_both_layouts(self):
+        selection = EventSelection(events=["jdk.GarbageCollection"], fields=["startTime", "longestPause"])
+        events = [
+            {"type": "jdk.GarbageCollection", "values": {"startTime": "t0", "name": "G1", "longestPause": "PT0.1S"}},
+            {"type": "jdk.CPULoad", "values": {"startTime": "t1", "machineTotal": 0.5}},
+            {"event": "jdk.GarbageCollection", "startTime": "t2", "gcId": 3},
+        ]
+        self.assertEqual(list(selection.apply(events)), [
+            {"type": "jdk.GarbageCollection", "values": {"startTime": "t0", "longestPause": "PT0.1S"}},
+            {"event": "jdk.GarbageCollection", "startTime": "t2"},
+        ])
+
+    def test_resolve_selection(self):
+        self.assertIsNone(resolve_selection())
+        auto = resolve_selection(events="com.acme.Checkout", fields="orderId", auto=True)
+        self.assertIn("jdk.ThreadStuck", auto.events)
+        self.assertIn("com.acme.Checkout", auto.events)
+        self.assertIn("orderId", auto.fields)
+        self.assertIn("stackTrace", auto.fields)
+
+    def test_feature_selection_keeps_features(self):
+        full = extract_features(iter_jfr_events(SAMPLE))
+        selected = extract_features(iter_jfr_events(SAMPLE, selection=feature_selection()))
+        self.assertEqual(selected, full)
+
+    def test_selection_is_pushed_into_jfr_print(self):
+        class FakeProc:
+            def __init__(self, cmd, **kwargs):
+                self.cmd = cmd
+                self.stdout = io.StringIO(
+                    '{"recording": {"events": [{"type": "jdk.GarbageCollection", "values": {"gcId": 1, "startTime": "t"}}]}}')
+                launched.append(self)
+
+            def poll(self):
+                return 0
+
+            def wait(self):
+                return 0
+
+        launched = []
+        selection = EventSelection(events=["jdk.GarbageCollection"], fields=["startTime"])
+        with mock.patch.object(jfr_parser.subprocess, "Popen", FakeProc):
+            events = list(jfr_parser._iter_chunk_events("chunk.jfr", selection))
+        self.assertEqual(launched[0].cmd, ["jfr", "print", "--json", "--events", "jdk.GarbageCollection", "chunk.jfr"])
+        self.assertEqual(events, [{"type": "jdk.GarbageCollection", "values": {"startTime": "t"}}])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import unittest
+from unittest import mock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from feature_extractor import extract_features
+
+@unittest.skipUnless(np is not None, "numpy is not installed")
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.events = [
+            {"event": "jdk.ThreadStuck", "threadName": "worker-1", "startTime": "2025-01-01T00:00:05.000Z",
+             "stackTrace": ["a.B.c(B.java:1)", "d.E.f(E.java:2)"]},
+            {"event": "jdk.GarbageCollection", "startTime": "2025-01-01T00:00:00.000Z", "longestPause": 150},
+            {"type": "jdk.GarbageCollection", "values": {
+                "startTime": "2025-01-01T00:00:10.000Z", "duration": "PT0.5S", "longestPause": "PT0.37S",
+                "eventThread": {"javaName": "worker-1"}}},
+            {"event": "jdk.SQLExecution", "sql": "SELECT 1", "threadName": "worker-2"},
+            {"event": "jdk.SQLExecution", "sql": "SELECT 2"},
+            {"event": "jdk.SQLExecution", "sql": "SELECT 2"},
+            {"event": "jdk.ThreadStuck", "threadName": "worker-1",
+             "stackTrace": ["a.B.c(B.java:1)", "d.E.f(E.java:2)"]},
+        ]
+
+    def test_columns_are_interned(self):
+        from event_store import build_event_table, NAT_NS
+        table = build_event_table(iter(self.events))
+        self.assertEqual(len(table), 7)
+        self.assertEqual(table.columns["event"].dtype, np.int32)
+        self.assertEqual(len(table.event_types), 3)
+        self.assertEqual(table.threads.values, ["worker-1", "worker-2"])
+        # Both stuck-thread events share one interned stack
+        stacks = table.columns["stack"]
+        self.assertEqual(stacks[0], stacks[6])
+        self.assertEqual(table.stack_frames(stacks[0]), ["a.B.c(B.java:1)", "d.E.f(E.java:2)"])
+        self.assertEqual(table.columns["start_ns"][3], NAT_NS)
+        self.assertEqual(table.columns["duration_ms"][2], 500.0)
+        self.assertEqual(list(table.columns["longestPause"][1:3]), [150.0, 370.0])
+        self.assertTrue(np.isnan(table.columns["longestPause"][0]))
+
+    def test_columnar_features(self):
+        from feature_extractor import compute_columnar_features, extract_features_columnar
+        from event_store import build_event_table
+        features = compute_columnar_features(build_event_table(self.events))
+        self.assertEqual(features["num_stuck_threads"], 2)
+        self.assertEqual(features["stuck_threads"], ["worker-1", "worker-1"])
+        self.assertEqual(features["longest_gc_pause"], 370)
+        self.assertEqual(features["gc_pause_count"], 2)
+        self.assertEqual(features["top_sql"], ["SELECT 2", "SELECT 1"])
+        self.assertEqual(features["hot_threads"][0], "worker-1")
+        summary = extract_features_columnar(self.events)
+        self.assertIn("Events: 7", summary)
+        self.assertIn("Stuck Threads: 2", summary)
+        self.assertIn("Longest GC Pause(ms): 370", summary)
+        self.assertIn("Time Range: 2025-01-01 00:00:00+00:00 --> 2025-01-01 00:00:10+00:00", summary)
+
+    def test_matches_row_path_on_sample(self):
+        from feature_extractor import extract_features_columnar
+        sample = os.path.join("sample_data", "event_snippets.json")
+        from jfr_parser import parse_jfr
+        events = parse_jfr(sample)
+        row = extract_features(events).splitlines()
+        columnar = extract_features_columnar(events).splitlines()
+        for prefix in ("Events:", "Time Range:", "Stuck Threads:", "Longest GC Pause(ms):"):
+            self.assertEqual([l for l in row if l.startswith(prefix)], [l for l in columnar if l.startswith(prefix)])
+
+    def test_empty_and_pandas_view(self):
+        from event_store import build_event_table
+        from feature_extractor import extract_features_columnar
+        self.assertIn("Events: 0", extract_features_columnar([]))
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            self.skipTest("pandas is not installed")
+        table = build_event_table(self.events)
+        df = table.to_pandas()
+        self.assertEqual(len(df), 7)
+        self.assertEqual(list(df["event"].cat.categories), table.event_types.values)
+        self.assertTrue(np.shares_memory(df["longestPause"].to_numpy(), table.columns["longestPause"]))
+
+    def test_spills_to_memory_mapped_columns(self):
+        from event_store import build_event_table
+        from feature_extractor import compute_columnar_features
+        # A budget of two rows; longestPause first appears after rows were spilled
+        events = [{"event": "jdk.ThreadStuck", "threadName": "worker-3"}] * 3 + self.events
+        table = build_event_table(events, memory_budget=64)
+        memory = build_event_table(events)
+        self.assertTrue(table.spilled)
+        self.assertFalse(memory.spilled)
+        self.assertEqual(set(table.columns), set(memory.columns))
+        for name, column in memory.columns.items():
+            np.testing.assert_array_equal(table.columns[name], column)
+        self.assertEqual(compute_columnar_features(table), compute_columnar_features(memory))
+
+    def test_string_pools_count_towards_memory_budget(self):
+        from event_store import build_event_table
+        # 20 rows take 640 bytes, well under the budget, but their distinct SQL texts do not fit
+        events = [{"event": "jdk.SQLExecution", "sql": f"SELECT {i} " + "x" * 1000} for i in range(20)]
+        table = build_event_table(events, memory_budget=8192)
+        self.assertTrue(table.spilled)
+        self.assertGreater(table.sql.nbytes, 20 * 1000)
+        np.testing.assert_array_equal(table.columns["sql"], np.arange(20))
+
+    def test_block_wise_features_match_whole_columns(self):
+        from event_store import build_event_table
+        from feature_extractor import compute_columnar_features
+        import feature_extractor
+        table = build_event_table(self.events * 3)
+        whole = compute_columnar_features(table)
+        with mock.patch.object(feature_extractor, "COLUMNAR_BLOCK_ROWS", 2):
+            self.assertEqual(compute_columnar_features(table), whole)
+
+if __name__ == '__main__':
+    unittest.main()
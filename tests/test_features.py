@@ -1,5 +1,5 @@
 import unittest
-from feature_extractor import extract_features
+from feature_extractor import extract_features, StreamingAggregator, QuantileSketch
 
 class TestFeatureExtractor(unittest.TestCase):
     def test_empty_events(self):
@@ -18,13 +18,71 @@ class TestFeatureExtractor(unittest.TestCase):
         self.assertIn("Longest GC Pause(ms): 150", summary)
 
     def test_top_sql(self):
-        # Test SQL detection in event
+        # SQL events are recognized by an "sql" field, "SQL" in the event type or a field name,
+        # or "SQL" in a top-level string value; other events are never listed
         events = [
             {"event":"other"},
             {"sql":"SELECT foo FROM bar"},
+            {"event": "jdk.SQLExecution"},
+            {"event": "app.Query", "statementSQL": "x"},
+            {"event": "app.Query", "text": "SQL timeout"},
+            {"event": "app.Other", "text": "select 1"},
         ]
-        summary = extract_features(events)
-        self.assertIn("Example Top SQL: ['{\"event\": \"other\"}', '{\"sql\": \"SELECT foo FROM bar\"}']", summary)
+        agg = StreamingAggregator().update(events)
+        self.assertEqual(agg.top_sql(), events[1:5])
+        summary = extract_features(events[:2])
+        self.assertIn("Example Top SQL: [\"{'sql': 'SELECT foo FROM bar'}\"]", summary)
+
+    def test_sql_detection_ignores_stack_traces(self):
+        events = [
+            {"event": "jdk.ThreadPark", "stackTrace": ["oracle.jdbc.SQLStatement.run(SQLStatement.java:1)"]},
+            {"event": "jdk.SQLExecution", "duration": 5},
+        ]
+        agg = StreamingAggregator().update(events)
+        self.assertEqual(agg.top_sql(), [events[1]])
+
+    def test_top_sql_by_duration(self):
+        events = [{"sql": f"SELECT {i}", "duration": d} for i, d in enumerate([5, 50, 1, 20, 50, 3, 7])]
+        agg = StreamingAggregator(top_k=3).update(events)
+        self.assertEqual([e["sql"] for e in agg.top_sql()], ["SELECT 1", "SELECT 4", "SELECT 3"])
+
+    def test_gc_pause_quantiles(self):
+        events = [{"event": "jdk.GarbageCollection", "longestPause": p} for p in range(1, 101)]
+        features = StreamingAggregator().update(events).features()
+        self.assertEqual(features["longest_gc_pause"], 100)
+        quantiles = features["gc_pause_quantiles"]
+        self.assertAlmostEqual(quantiles[0.5], 50, delta=1.5)
+        self.assertAlmostEqual(quantiles[0.99], 99, delta=2)
+        self.assertIn("GC Pause p50/p95/p99(ms):", extract_features(events))
+
+    def test_merge_matches_single_pass(self):
+        events = [
+            {"event": "jdk.GarbageCollection", "startTime": f"2025-01-01T00:00:{i:02d}.000Z", "longestPause": i * 3 + 1}
+            for i in range(40)
+        ] + [{"event": "jdk.ThreadStuck", "threadName": "t", "startTime": "2024-12-31T23:00:00+00:00"}]
+        single = StreamingAggregator().update(events)
+        merged = StreamingAggregator().update(events[:17]).merge(StreamingAggregator().update(events[17:]))
+        self.assertEqual(merged.features(), single.features())
+        self.assertTrue(single.features()["time_range"].startswith("2024-12-31 23:00:00+00:00 --> 2025-01-01 00:00:39"))
+
+    def test_time_bounds_mix_naive_and_aware_timestamps(self):
+        events = [
+            {"event": "jdk.GarbageCollection", "startTime": "2025-01-01T00:00:10.000Z"},
+            {"event": "jdk.GarbageCollection", "startTime": "2025-01-01T00:00:20.000Z"},
+            {"event": "jdk.ThreadStuck", "startTime": "2025-01-01T00:00:05"},
+            {"event": "jdk.ThreadStuck", "startTime": "2025-01-01T02:00:30+02:00"},
+        ]
+        lo, hi = StreamingAggregator().update(events).time_bounds()
+        self.assertEqual(lo.isoformat(), "2025-01-01T00:00:05+00:00")
+        self.assertEqual(hi.isoformat(), "2025-01-01T00:00:30+00:00")
+
+    def test_quantile_sketch_relative_error(self):
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for v in range(1, 10001):
+            sketch.add(v)
+        for q in (0.5, 0.95, 0.99):
+            exact = q * 9999 + 1
+            self.assertLess(abs(sketch.quantile(q) - exact) / exact, 0.02)
 
 if __name__ == '__main__':
     unittest.main()
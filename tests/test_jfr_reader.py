@@ -0,0 +1,232 @@
+import gzip
+import os
+import struct
+import tempfile
+import unittest
+
+from jfr_parser import iter_json_array, parse_jfr
+from jfr_reader import JfrChunk, JfrFormatError, read_jfr_events
+
+START_NANOS = 1735689600 * 1_000_000_000  # 2025-01-01T00:00:00Z
+START_TICKS = 1000
+TICKS_PER_SECOND = 1_000_000  # one tick per microsecond
+
+
+def varint(v):
+    v &= (1 << 64) - 1
+    out = bytearray()
+    for _ in range(8):
+        if v < 0x80:
+            out.append(v)
+            return bytes(out)
+        out.append((v & 0x7F) | 0x80)
+        v >>= 7
+    out.append(v & 0xFF)
+    return bytes(out)
+
+
+def utf8(s):
+    if s is None:
+        return b"\x00"
+    raw = s.encode("utf-8")
+    return b"\x03" + varint(len(raw)) + raw
+
+
+def record(type_id, payload):
+    # Event size includes its own varint
+    body = varint(type_id) + payload
+    size = len(body) + 1
+    while len(varint(size)) + len(body) != size:
+        size = len(varint(size)) + len(body)
+    return varint(size) + body
+
+
+class ChunkWriter:
+    """Tiny JFR chunk encoder covering the subset of the format the reader needs."""
+
+    def __init__(self):
+        self.strings = []
+        self.classes = []
+        self.events = []
+
+    def s(self, value):
+        if value not in self.strings:
+            self.strings.append(value)
+        return self.strings.index(value)
+
+    def element(self, name, attributes=(), children=()):
+        out = varint(self.s(name)) + varint(len(attributes))
+        for k, v in attributes:
+            out += varint(self.s(k)) + varint(self.s(str(v)))
+        out += varint(len(children))
+        for child in children:
+            out += child
+        return out
+
+    def define(self, type_id, name, fields=(), super_type=None):
+        attrs = [("id", type_id), ("name", name)]
+        if super_type:
+            attrs.append(("superType", super_type))
+        children = []
+        for field in fields:
+            fname, ftype = field[0], field[1]
+            options = field[2] if len(field) > 2 else {}
+            fattrs = [("name", fname), ("class", ftype)]
+            if options.get("cp"):
+                fattrs.append(("constantPool", "true"))
+            if options.get("array"):
+                fattrs.append(("dimension", "1"))
+            annotations = []
+            if "ts" in options:
+                annotations.append(self.element("annotation", [("class", 30), ("value", options["ts"])]))
+            if "span" in options:
+                annotations.append(self.element("annotation", [("class", 31), ("value", options["span"])]))
+            children.append(self.element("field", fattrs, annotations))
+        self.classes.append((attrs, children))
+
+    def metadata(self):
+        classes = [self.element("class", attrs, children) for attrs, children in self.classes]
+        tree = self.element("root", [], [self.element("metadata", [], classes), self.element("region")])
+        strings = b"".join(utf8(v) for v in self.strings)
+        payload = varint(0) + varint(0) + varint(1) + varint(len(self.strings)) + strings + tree
+        return record(0, payload)
+
+    def build(self, pools, events):
+        body = b"".join(record(type_id, payload) for type_id, payload in events)
+        cp_payload = varint(0) + varint(0) + varint(0) + b"\x00" + varint(len(pools))
+        for type_id, entries in pools:
+            cp_payload += varint(type_id) + varint(len(entries))
+            for key, value in entries:
+                cp_payload += varint(key) + value
+        cp = record(1, cp_payload)
+        metadata = self.metadata()
+        cp_offset = 68 + len(body)
+        metadata_offset = cp_offset + len(cp)
+        size = metadata_offset + len(metadata)
+        header = b"FLR\0" + struct.pack(
+            ">HHqqqqqqqi", 2, 1, size, cp_offset, metadata_offset,
+            START_NANOS, 5_000_000_000, START_TICKS, TICKS_PER_SECOND, 1)
+        return header + body + cp + metadata
+
+
+def sample_chunk(pause_ticks=370_000):
+    w = ChunkWriter()
+    for type_id, name in [(10, "long"), (11, "int"), (12, "java.lang.String"), (13, "boolean"),
+                          (30, "jdk.jfr.Timestamp"), (31, "jdk.jfr.Timespan")]:
+        w.define(type_id, name)
+    w.define(20, "java.lang.Thread", [("javaName", 12), ("javaThreadId", 10)])
+    w.define(21, "jdk.types.StackFrame", [("method", 12), ("lineNumber", 11)])
+    w.define(22, "jdk.types.StackTrace", [("truncated", 13), ("frames", 21, {"array": True})])
+    w.define(100, "jdk.GarbageCollection", [
+        ("startTime", 10, {"ts": "TICKS"}), ("duration", 10, {"span": "TICKS"}),
+        ("name", 12), ("longestPause", 10, {"span": "TICKS"})], super_type="jdk.jfr.Event")
+    w.define(101, "jdk.ThreadPark", [
+        ("startTime", 10, {"ts": "TICKS"}), ("duration", 10, {"span": "TICKS"}),
+        ("eventThread", 20, {"cp": True}), ("stackTrace", 22, {"cp": True})], super_type="jdk.jfr.Event")
+    pools = [
+        (12, [(5, utf8("main"))]),
+        (20, [(1, b"\x02" + varint(5) + varint(1))]),
+        (22, [(7, b"\x00" + varint(1) + utf8("Foo.bar") + varint(42))]),
+    ]
+    events = [
+        (100, varint(START_TICKS + 500_000) + varint(400_000) + utf8("G1 Young") + varint(pause_ticks)),
+        (101, varint(START_TICKS + 1_000_000) + varint(10) + varint(1) + varint(7)),
+    ]
+    return w.build(pools, events)
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# A JDK 25 recording of jdk.httpserver serving requests, scrubbed to a few event types with
+# `jfr scrub --include-events`, and `jfr print --json` of it from the same JDK
+REAL_RECORDING = os.path.join(DATA_DIR, "httpserver_jdk25.jfr")
+REAL_RECORDING_JSON = os.path.join(DATA_DIR, "httpserver_jdk25.json.gz")
+
+
+class TestRealRecording(unittest.TestCase):
+    def setUp(self):
+        with gzip.open(REAL_RECORDING_JSON, "rt", encoding="utf-8") as f:
+            self.expected = list(iter_json_array(f))
+
+    def test_matches_jfr_print(self):
+        events = list(read_jfr_events(REAL_RECORDING))
+        self.assertEqual(len(events), 148)
+        self.assertEqual(events, self.expected)
+        by_type = {}
+        for e in events:
+            by_type.setdefault(e["type"], e["values"])
+        sample = by_type["jdk.ExecutionSample"]
+        self.assertRegex(sample["startTime"], r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{9}Z$")
+        self.assertEqual(sample["sampledThread"]["javaName"], "main")
+        self.assertEqual(len(sample["stackTrace"]["frames"]), 5)
+        frame = sample["stackTrace"]["frames"][0]
+        self.assertEqual((frame["method"]["type"]["name"], frame["type"]), ("java/util/ArrayList", "JIT compiled"))
+        wait = by_type["jdk.JavaMonitorWait"]
+        self.assertEqual(wait["timeout"], "PT0.999S")
+        self.assertRegex(wait["duration"], r"^PT0\.\d+S$")
+        self.assertEqual(by_type["jdk.GarbageCollection"]["name"], "DefNew")
+
+    def test_selection_matches_filtered_jfr_print(self):
+        events = list(read_jfr_events(
+            REAL_RECORDING, event_types={"jdk.SocketWrite"}, fields={"startTime", "bytesWritten"}))
+        expected = [{"type": e["type"], "values": {k: e["values"][k] for k in ("startTime", "bytesWritten")}}
+                    for e in self.expected if e["type"] == "jdk.SocketWrite"]
+        self.assertEqual(events, expected)
+
+
+class TestJfrReader(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".jfr")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, data):
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def test_decodes_events_and_constant_pools(self):
+        self.write(sample_chunk())
+        events = list(read_jfr_events(self.path))
+        self.assertEqual([e["type"] for e in events], ["jdk.GarbageCollection", "jdk.ThreadPark"])
+        gc = events[0]["values"]
+        self.assertEqual(gc["startTime"], "2025-01-01T00:00:00.500Z")
+        self.assertEqual(gc["duration"], "PT0.4S")
+        self.assertEqual(gc["longestPause"], "PT0.37S")
+        self.assertEqual(gc["name"], "G1 Young")
+        park = events[1]["values"]
+        self.assertEqual(park["eventThread"], {"javaName": "main", "javaThreadId": 1})
+        self.assertEqual(park["stackTrace"], {"truncated": False, "frames": [{"method": "Foo.bar", "lineNumber": 42}]})
+
+    def test_events_do_not_share_constant_pool_values(self):
+        chunk = JfrChunk(sample_chunk())
+        park = next(chunk.events(event_types={"jdk.ThreadPark"}))["values"]
+        park["eventThread"]["javaName"] = "changed"
+        park["stackTrace"]["frames"].clear()
+        again = next(chunk.events(event_types={"jdk.ThreadPark"}))["values"]
+        self.assertEqual(again["eventThread"], {"javaName": "main", "javaThreadId": 1})
+        self.assertEqual(again["stackTrace"]["frames"], [{"method": "Foo.bar", "lineNumber": 42}])
+
+    def test_event_type_selection_and_multiple_chunks(self):
+        self.write(sample_chunk() + sample_chunk(pause_ticks=5_000))
+        events = list(read_jfr_events(self.path, event_types={"jdk.GarbageCollection"}))
+        self.assertEqual([e["values"]["longestPause"] for e in events], ["PT0.37S", "PT0.005S"])
+
+    def test_field_selection_skips_unwanted_fields(self):
+        self.write(sample_chunk())
+        events = list(read_jfr_events(self.path, fields={"startTime", "stackTrace"}))
+        self.assertEqual([sorted(e["values"]) for e in events], [["startTime"], ["stackTrace", "startTime"]])
+        self.assertEqual(events[1]["values"]["stackTrace"]["frames"], [{"method": "Foo.bar", "lineNumber": 42}])
+
+    def test_rejects_non_jfr_file(self):
+        self.write(b"not a recording at all, just some text")
+        with self.assertRaises(JfrFormatError):
+            list(read_jfr_events(self.path))
+
+    def test_parse_jfr_native(self):
+        self.write(sample_chunk())
+        self.assertEqual(parse_jfr(self.path, native=True), list(read_jfr_events(self.path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+
+from jobs import JobQueue, QueueFullError, DONE, FAILED
+
+def wait_for(job, timeout=10):
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+class TestJobQueue(unittest.TestCase):
+    def test_result_and_failure(self):
+        jobs = JobQueue(workers=2, max_queued=4)
+        ok = jobs.submit(lambda job, x: x * 2, 21)
+        bad = jobs.submit(lambda job: 1 / 0)
+        self.assertEqual(wait_for(ok).status, DONE)
+        self.assertEqual(ok.result, 42)
+        self.assertEqual(wait_for(bad).status, FAILED)
+        self.assertIn("division", bad.error)
+        self.assertIs(jobs.get(ok.id), ok)
+
+    def test_stage_concurrency_limit(self):
+        jobs = JobQueue(workers=4, max_queued=8, stage_limits={"analyzing": 1})
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def work(job):
+            with jobs.stage(job, "analyzing"):
+                with lock:
+                    active.append(job.id)
+                    peak.append(len(active))
+                time.sleep(0.02)
+                with lock:
+                    active.remove(job.id)
+
+        submitted = [jobs.submit(work) for _ in range(4)]
+        for job in submitted:
+            self.assertEqual(wait_for(job).status, DONE)
+        self.assertEqual(max(peak), 1)
+
+    def test_backpressure(self):
+        release = threading.Event()
+        jobs = JobQueue(workers=1, max_queued=1)
+        running = jobs.submit(lambda job: release.wait(10))
+        while running.status == "queued":
+            time.sleep(0.01)
+        jobs.submit(lambda job: None)
+        self.assertFalse(jobs.has_capacity())
+        with self.assertRaises(QueueFullError):
+            jobs.submit(lambda job: None)
+        release.set()
+
+    def test_history_is_bounded(self):
+        jobs = JobQueue(workers=1, max_queued=10, history=2)
+        submitted = [jobs.submit(lambda job: None) for _ in range(5)]
+        for job in submitted:
+            wait_for(job)
+        time.sleep(0.05)
+        self.assertIsNone(jobs.get(submitted[0].id))
+        self.assertIsNotNone(jobs.get(submitted[-1].id))
+
+if __name__ == '__main__':
+    unittest.main()
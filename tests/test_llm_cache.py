@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import llm_prompter
+from llm_cache import ResponseCache, response_key
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="llm_cache_test_")
+        self.cache = ResponseCache(path=os.path.join(self.tmpdir, "responses.sqlite"), ttl_hours=1, max_size_mb=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_key_covers_generation_params(self):
+        base = response_key("openai", "gpt-4", "prompt", temperature=0.1, max_tokens=700)
+        self.assertEqual(base, response_key("openai", "gpt-4", "prompt", max_tokens=700, temperature=0.1))
+        self.assertNotEqual(base, response_key("openai", "gpt-4", "prompt", temperature=0.2, max_tokens=700))
+        self.assertNotEqual(base, response_key("local", "gpt-4", "prompt", temperature=0.1, max_tokens=700))
+
+    def test_ttl_expiry(self):
+        self.cache.put("k", "answer")
+        self.assertEqual(self.cache.get("k"), "answer")
+        with mock.patch("llm_cache.time.time", return_value=time.time() + 2 * 3600):
+            self.assertIsNone(self.cache.get("k"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_size_eviction_is_lru(self):
+        big = "x" * (400 * 1024)
+        self.cache.put("a", big)
+        self.cache.put("b", big)
+        self.cache.get("a")
+        self.cache.put("c", big)
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_analyze_with_llm_uses_cache(self):
+        calls = []
+
+        def fake_generate(prompt, **kwargs):
+            calls.append(prompt)
+            self.assertFalse(kwargs["return_full_text"])
+            return [{"generated_text": " findings"}]
+
+        env = {"USE_LOCAL_LLM": "1", "LOCAL_LLM_MODEL": "tiny", "LLM_CACHE": "1"}
+        with mock.patch.dict(os.environ, env), \
+             mock.patch.object(llm_prompter, "_response_cache", self.cache), \
+             mock.patch.object(llm_prompter, "ensure_local_llm", return_value=True), \
+             mock.patch.object(llm_prompter.local_model_pool, "get", return_value=fake_generate):
+            first = llm_prompter.analyze_with_llm("Events: 1")
+            second = llm_prompter.analyze_with_llm("Events: 1")
+            bypassed = llm_prompter.analyze_with_llm("Events: 1", use_cache=False)
+        self.assertEqual(first, "findings")
+        self.assertEqual(second, first)
+        self.assertEqual(bypassed, first)
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_are_not_cached(self):
+        env = {"USE_LOCAL_LLM": "1", "LOCAL_LLM_MODEL": "tiny", "LLM_CACHE": "1"}
+        with mock.patch.dict(os.environ, env), \
+             mock.patch.object(llm_prompter, "_response_cache", self.cache), \
+             mock.patch.object(llm_prompter, "ensure_local_llm", return_value=False):
+            result = llm_prompter.analyze_with_llm("Events: 1")
+        self.assertIn("could not be set up", result)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_stream_is_cached_once_complete(self):
+        def stream():
+            yield " partial"
+            yield " findings "
+
+        with mock.patch.object(llm_prompter, "_response_cache", self.cache):
+            first = list(llm_prompter.cached_stream("local", "tiny", "prompt", {}, stream, use_cache=True))
+            second = list(llm_prompter.cached_stream("local", "tiny", "prompt", {}, stream, use_cache=True))
+        self.assertEqual(first, [" partial", " findings "])
+        self.assertEqual(second, ["partial findings"])
+
+    def test_abandoned_stream_is_not_cached(self):
+        def stream():
+            yield "a"
+            yield "b"
+
+        with mock.patch.object(llm_prompter, "_response_cache", self.cache):
+            pieces = llm_prompter.cached_stream("local", "tiny", "prompt", {}, stream, use_cache=True)
+            next(pieces)
+            pieces.close()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_stream_llm_reports_setup_errors(self):
+        env = {"LLM_CACHE": "1"}
+        with mock.patch.dict(os.environ, env), \
+             mock.patch.object(llm_prompter, "_response_cache", self.cache), \
+             mock.patch.object(llm_prompter, "ensure_local_llm", return_value=False):
+            pieces = list(llm_prompter.stream_llm("Events: 1", use_local=True, model_name="tiny"))
+        self.assertEqual(len(pieces), 1)
+        self.assertIn("could not be set up", pieces[0])
+        self.assertEqual(len(self.cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
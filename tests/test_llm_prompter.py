@@ -0,0 +1,229 @@
+import fnmatch
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import llm_prompter
+from batch_inference import BatchScheduler
+from llm_prompter import LocalModelPool, build_prompt
+
+class FakePipeline:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+class TestLocalModelPool(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+        self.sizes = {"a": 100, "b": 200, "c": 300}
+
+    def loader(self, name):
+        self.loads.append(name)
+        return FakePipeline(name, self.sizes[name])
+
+    def make_pool(self, **kwargs):
+        return LocalModelPool(loader=self.loader, sizer=lambda pipe: pipe.size, **kwargs)
+
+    def test_models_load_once(self):
+        pool = self.make_pool(max_models=2, max_memory_mb=0)
+        first = pool.get("a")
+        self.assertIs(pool.get("a"), first)
+        self.assertEqual(self.loads, ["a"])
+
+    def test_lru_eviction_by_count(self):
+        pool = self.make_pool(max_models=2, max_memory_mb=0)
+        pool.get("a")
+        pool.get("b")
+        pool.get("a")  # "b" is now least recently used
+        pool.get("c")
+        self.assertEqual(pool.loaded(), ["a", "c"])
+        pool.get("b")
+        self.assertEqual(self.loads, ["a", "b", "c", "b"])
+
+    def test_memory_budget(self):
+        pool = self.make_pool(max_models=3, max_memory_mb=450 / (1024 * 1024))
+        pool.get("a")
+        pool.get("b")
+        self.assertEqual(pool.loaded(), ["a", "b"])
+        pool.get("c")
+        self.assertEqual(pool.loaded(), ["c"])
+        self.assertEqual(pool.memory_bytes(), 300)
+
+    def test_slow_load_does_not_block_other_models(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def loader(name):
+            self.loads.append(name)
+            if name == "b":
+                started.set()
+                release.wait(5)
+            return FakePipeline(name, self.sizes[name])
+
+        pool = LocalModelPool(max_models=2, max_memory_mb=0, loader=loader, sizer=lambda pipe: pipe.size)
+        first = pool.get("a")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            loading = [executor.submit(pool.get, "b") for _ in range(2)]
+            self.assertTrue(started.wait(5))
+            # "a" is served while "b" is still loading
+            self.assertIs(pool.get("a"), first)
+            release.set()
+            pipes = [f.result(5) for f in loading]
+        self.assertIs(pipes[0], pipes[1])
+        self.assertEqual(self.loads, ["a", "b"])
+        self.assertEqual(pool.loaded(), ["a", "b"])
+
+    def test_failed_load_is_retried(self):
+        attempts = []
+
+        def loader(name):
+            attempts.append(name)
+            if len(attempts) == 1:
+                raise OSError("download interrupted")
+            return FakePipeline(name, 1)
+
+        pool = LocalModelPool(max_models=1, max_memory_mb=0, loader=loader, sizer=lambda pipe: pipe.size)
+        with self.assertRaises(OSError):
+            pool.get("a")
+        self.assertEqual(pool.get("a").name, "a")
+
+class TestEnsureLocalLLM(unittest.TestCase):
+    def download(self, files):
+        calls = []
+
+        def snapshot_download(name, allow_patterns=None):
+            calls.append(allow_patterns)
+            path = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, path)
+            for f in files:
+                if any(fnmatch.fnmatch(f, p) for p in allow_patterns):
+                    open(os.path.join(path, f), "w").close()
+            return path
+
+        hub = types.ModuleType("huggingface_hub")
+        hub.snapshot_download = snapshot_download
+        with mock.patch.dict(sys.modules, {"huggingface_hub": hub}), \
+             mock.patch.object(llm_prompter, "local_llm_available", return_value=False):
+            self.assertTrue(llm_prompter.ensure_local_llm("org/model"))
+        return calls
+
+    def test_only_safetensors_weights_are_fetched(self):
+        calls = self.download(["config.json", "tokenizer.json", "model.safetensors", "pytorch_model.bin",
+                               "model.onnx", "model.gguf"])
+        self.assertEqual(len(calls), 1)
+        self.assertIn("*.safetensors", calls[0])
+        for pattern in calls[0]:
+            for name in ("pytorch_model.bin", "model.onnx", "model.gguf"):
+                self.assertFalse(fnmatch.fnmatch(name, pattern), (name, pattern))
+
+    def test_bin_weights_are_a_fallback(self):
+        calls = self.download(["config.json", "tokenizer.model", "pytorch_model.bin"])
+        self.assertEqual(len(calls), 2)
+        self.assertIn("*.bin", calls[1])
+
+class FakeTokenizer:
+    def __init__(self):
+        self.pad_token = None
+        self.eos_token = "</s>"
+        self.padding_side = "right"
+
+class FakeGenerator:
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.calls = []
+
+    def __call__(self, prompts, **kwargs):
+        self.calls.append((self.tokenizer.padding_side, self.tokenizer.pad_token))
+        return [[{"generated_text": f" out {i}"}] for i in range(len(prompts))]
+
+class TestRunLocalBatch(unittest.TestCase):
+    def test_pooled_tokenizer_is_not_modified(self):
+        pipe = FakeGenerator()
+        pool = LocalModelPool(loader=lambda name: pipe, sizer=lambda p: 0)
+        with mock.patch.object(llm_prompter, "local_model_pool", pool):
+            self.assertEqual(llm_prompter.run_local_batch("tiny", ["a", "b"]), ["out 0", "out 1"])
+            llm_prompter.run_local_batch("tiny", ["c"])
+        # The batch ran left-padded, on a copy of the tokenizer reused across batches
+        self.assertEqual(pipe.calls, [("left", "</s>"), ("left", "</s>")])
+        self.assertEqual((pipe.tokenizer.padding_side, pipe.tokenizer.pad_token), ("right", None))
+
+class FakeStreamer:
+    def __init__(self, tokenizer, **kwargs):
+        self.queue = queue.Queue()
+
+    def put(self, text):
+        self.queue.put(text)
+
+    def end(self):
+        self.queue.put(None)
+
+    def __iter__(self):
+        return iter(self.queue.get, None)
+
+class EndlessGenerator:
+    """Generates tokens until its stopping criteria say stop."""
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.generated = 0
+        self.finished = threading.Event()
+
+    def __call__(self, prompt, streamer=None, stopping_criteria=None, **kwargs):
+        while self.generated < 10_000 and not any(c(None, None) for c in stopping_criteria):
+            self.generated += 1
+            streamer.put(f"t{self.generated} ")
+            time.sleep(0.001)
+        streamer.end()
+        self.finished.set()
+
+class TestStreamLocalLLM(unittest.TestCase):
+    def test_abandoned_stream_stops_generating(self):
+        transformers = types.ModuleType("transformers")
+        transformers.TextIteratorStreamer = FakeStreamer
+        transformers.StoppingCriteria = object
+        transformers.StoppingCriteriaList = list
+        pipe = EndlessGenerator()
+        pool = LocalModelPool(loader=lambda name: pipe, sizer=lambda p: 0)
+        with mock.patch.dict(sys.modules, {"transformers": transformers}), \
+             mock.patch.object(llm_prompter, "local_model_pool", pool), \
+             mock.patch.object(llm_prompter, "ensure_local_llm", return_value=True), \
+             mock.patch.object(llm_prompter, "local_batching_enabled", return_value=False):
+            stream = llm_prompter.stream_local_llm("Events: 3", "tiny", use_cache=False)
+            self.assertEqual([next(stream) for _ in range(3)], ["t1 ", "t2 ", "t3 "])
+            stream.close()
+            self.assertTrue(pipe.finished.wait(5))
+        self.assertLess(pipe.generated, 10_000)
+
+class TestBuildPrompt(unittest.TestCase):
+    def test_prompt_contains_summary(self):
+        self.assertIn("Events: 3", build_prompt("Events: 3"))
+
+class TestLocalBatching(unittest.TestCase):
+    def test_concurrent_analyses_share_a_batch(self):
+        batches = []
+
+        def run_batch(model_name, prompts, **params):
+            batches.append(list(prompts))
+            return [f"findings {i}" for i in range(len(prompts))]
+
+        scheduler = BatchScheduler(run_batch, max_batch_size=2, max_wait_ms=1000)
+        env = {"LOCAL_LLM_BATCH_SIZE": "2", "LLM_CACHE": "0"}
+        with mock.patch.dict(os.environ, env), \
+             mock.patch.object(llm_prompter, "_batch_scheduler", scheduler), \
+             mock.patch.object(llm_prompter, "ensure_local_llm", return_value=True):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                results = list(pool.map(
+                    lambda s: llm_prompter.analyze_with_local_llm(s, model_name="tiny"), ["Events: 1", "Events: 2"]))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(sorted(results), ["findings 0", "findings 1"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import llm_prompter
+from llm_cache import ResponseCache
+from llm_client import AsyncChatClient, LLMRequestError, _reset_seconds
+from map_reduce import analyze_map_reduce, reduce_prompt, summarize_parts
+from synthetic_jfr import SyntheticRecording
+
+class ChatServer:
+    """Stand-in OpenAI-compatible server; `script` returns (status, headers, delay) per request, or None for a 200."""
+
+    def __init__(self, script=None, delay=0.0):
+        self.script = script or (lambda n, prompt: None)
+        self.delay = delay
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt = body["messages"][-1]["content"]
+                with server.lock:
+                    server.prompts.append(prompt)
+                    n = len(server.prompts)
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    status, headers, delay = server.script(n, prompt) or (200, {}, server.delay)
+                    time.sleep(delay)
+                    if status == 200:
+                        answer = "merged" if prompt.startswith("You are an expert JVM performance and diagnostics "
+                                                               "assistant. A long") else f"finding {n}"
+                        if body.get("stream"):
+                            words = answer.split(" ")
+                            pieces = [word + " " for word in words[:-1]] + words[-1:]
+                            chunks = [{"choices": [{"delta": {"content": piece}}]} for piece in pieces]
+                            payload = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks).encode()
+                            payload += b"data: [DONE]\n\n"
+                        else:
+                            payload = json.dumps({"choices": [{"message": {"content": answer}}]}).encode()
+                    else:
+                        payload = b'{"error": "busy"}'
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class TestAsyncChatClient(unittest.TestCase):
+    def run_client(self, server, prompts, **options):
+        async def run():
+            async with AsyncChatClient(model="test", base_url=server.base_url, **options) as chat:
+                return await asyncio.gather(
+                    *(chat.complete([{"role": "user", "content": p}]) for p in prompts), return_exceptions=True)
+
+        try:
+            return asyncio.run(run())
+        finally:
+            server.close()
+
+    def test_concurrency_is_bounded(self):
+        server = ChatServer(delay=0.05)
+        results = self.run_client(server, [f"q{i}" for i in range(12)], max_concurrency=3, max_retries=0)
+        self.assertEqual(len(results), 12)
+        self.assertTrue(all(r.startswith("finding") for r in results))
+        self.assertEqual(server.max_in_flight, 3)
+
+    def test_rate_limit_and_server_errors_are_retried(self):
+        def script(n, prompt):
+            if n == 1:
+                return 429, {"Retry-After": "0.2"}, 0
+            if n == 2:
+                return 503, {}, 0
+            return None
+
+        server = ChatServer(script)
+        started = time.monotonic()
+        results = self.run_client(server, ["only"], max_concurrency=1, max_retries=3)
+        self.assertEqual(results, ["finding 3"])
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_client_errors_are_not_retried(self):
+        server = ChatServer(lambda n, prompt: (400, {}, 0))
+        results = self.run_client(server, ["bad"], max_retries=3)
+        self.assertIsInstance(results[0], LLMRequestError)
+        self.assertEqual(len(server.prompts), 1)
+
+    def test_timeout(self):
+        server = ChatServer(delay=1.0)
+        results = self.run_client(server, ["slow"], timeout=0.1, max_retries=1)
+        self.assertIsInstance(results[0], LLMRequestError)
+        self.assertIn("Timeout", str(results[0]))
+        self.assertEqual(len(server.prompts), 2)
+
+    def test_reset_seconds(self):
+        self.assertEqual(_reset_seconds("7"), 7.0)
+        self.assertEqual(_reset_seconds("6m0s"), 360.0)
+        self.assertEqual(_reset_seconds("20ms"), 0.02)
+        self.assertIsNone(_reset_seconds(None))
+        self.assertIsNone(_reset_seconds("soon"))
+
+class TestMapReduce(unittest.TestCase):
+    def setUp(self):
+        self.events = list(SyntheticRecording(2000, seed=3).events())
+
+    def test_summarize_parts(self):
+        overall, slices = summarize_parts(self.events, 4, workers=2)
+        self.assertTrue(1 <= len(slices) <= 4)
+        self.assertIn("Events: 2000", overall)
+        labels = [label for label, _ in slices]
+        self.assertEqual(labels, sorted(labels))
+        self.assertTrue(all("Events:" in summary for _, summary in slices))
+
+    def test_reduce_prompt_fits_budget(self):
+        overall, slices = summarize_parts(self.events, 4)
+        findings = [(label, "finding") for label, _ in slices]
+        full = reduce_prompt(overall, findings)
+        compacted = reduce_prompt(overall, findings, token_budget=300)
+        self.assertLess(len(compacted), len(full))
+        self.assertIn(f"Slice {len(findings)} ({findings[-1][0]}):\nfinding", compacted)
+
+    def test_analyze_map_reduce(self):
+        overall, slices = summarize_parts(self.events, 4)
+        server = ChatServer()
+        try:
+            result = analyze_map_reduce(overall, slices, use_cache=False, use_local=False,
+                                        client_options={"base_url": server.base_url, "model": "test"})
+        finally:
+            server.close()
+        self.assertEqual(result, "merged")
+        self.assertEqual(len(server.prompts), len(slices) + 1)
+        merge = server.prompts[-1]
+        for label, _ in slices:
+            self.assertIn(label, merge)
+        self.assertIn("finding", merge)
+
+    def test_failed_slices_are_reported(self):
+        overall, slices = summarize_parts(self.events, 2)
+
+        def script(n, prompt):
+            return (400, {}, 0) if "time slice" in prompt and n == 1 else None
+
+        server = ChatServer(script)
+        try:
+            result = analyze_map_reduce(overall, slices, use_cache=False, use_local=False,
+                                        client_options={"base_url": server.base_url, "model": "test"})
+        finally:
+            server.close()
+        self.assertEqual(result, "merged")
+        self.assertIn("could not be analyzed", server.prompts[-1])
+
+class TestSinglePrompt(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="llm_cache_test_")
+        self.cache = ResponseCache(path=os.path.join(self.tmpdir, "responses.sqlite"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def analyze(self, server, stream=False):
+        env = {"OPENAI_BASE_URL": server.base_url, "LLM_MODEL": "test", "OPENAI_API_KEY": "", "LLM_CACHE": "1",
+               "PROMPT_TOKEN_BUDGET": "0"}
+        with mock.patch.dict(os.environ, env), mock.patch.object(llm_prompter, "_response_cache", self.cache):
+            if stream:
+                return list(llm_prompter.stream_openai_llm("Events: 1"))
+            return llm_prompter.analyze_with_openai_llm("Events: 1", raise_errors=True)
+
+    def test_openai_path_uses_chat_client(self):
+        server = ChatServer(lambda n, prompt: (503, {}, 0) if n == 1 else None)
+        try:
+            first = self.analyze(server)
+            second = self.analyze(server)
+        finally:
+            server.close()
+        # The 503 is retried by the pooled client, and the answer is then served from the cache
+        self.assertEqual(first, "finding 2")
+        self.assertEqual(second, first)
+        self.assertEqual(len(server.prompts), 2)
+
+    def test_cache_is_per_endpoint(self):
+        servers = [ChatServer(), ChatServer()]
+        try:
+            results = [self.analyze(server) for server in servers]
+        finally:
+            for server in servers:
+                server.close()
+        self.assertEqual(results, ["finding 1", "finding 1"])
+        self.assertEqual([len(server.prompts) for server in servers], [1, 1])
+
+    def test_stream_openai_llm(self):
+        server = ChatServer(lambda n, prompt: (503, {}, 0) if n == 1 else None)
+        try:
+            first = self.analyze(server, stream=True)
+            second = self.analyze(server, stream=True)
+        finally:
+            server.close()
+        self.assertEqual(first, ["finding ", "2"])
+        self.assertEqual(second, ["finding 2"])
+        self.assertEqual(len(server.prompts), 2)
+
+    def test_stream_errors_are_reported(self):
+        server = ChatServer(lambda n, prompt: (400, {}, 0))
+        try:
+            pieces = self.analyze(server, stream=True)
+        finally:
+            server.close()
+        self.assertEqual(len(pieces), 1)
+        self.assertIn("Error communicating with LLM: HTTP 400", pieces[0])
+        self.assertEqual(len(self.cache), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import time
+import unittest
+
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import MetricsRegistry
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_nested_stages_split_self_time(self):
+        with self.registry.stage("extract") as record:
+            record.events = 10
+            with self.registry.stage("decode_json"):
+                time.sleep(0.05)
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot["extract"]["events"], 10)
+        self.assertGreaterEqual(snapshot["extract"]["wall_seconds"], 0.05)
+        self.assertLess(snapshot["extract"]["self_seconds"], 0.05)
+        self.assertGreaterEqual(snapshot["decode_json"]["self_seconds"], 0.05)
+        self.assertGreater(snapshot["extract"]["peak_rss_bytes"], 0)
+
+    def test_timed_iter_counts_items_and_tokens(self):
+        def produce():
+            for word in ("one two", "three"):
+                time.sleep(0.02)
+                yield word
+
+        with self.registry.stage("inference_outer"):
+            pieces = list(self.registry.timed_iter("inference", produce(), count_tokens=lambda s: len(s.split())))
+        self.assertEqual(pieces, ["one two", "three"])
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot["inference"]["events"], 2)
+        self.assertEqual(snapshot["inference"]["tokens"], 3)
+        self.assertGreaterEqual(snapshot["inference"]["wall_seconds"], 0.04)
+        self.assertLess(snapshot["inference_outer"]["self_seconds"], 0.04)
+
+    def test_failed_stage_is_still_recorded(self):
+        with self.assertRaises(ValueError):
+            with self.registry.stage("report_write"):
+                raise ValueError("disk full")
+        self.assertEqual(self.registry.snapshot()["report_write"]["calls"], 1)
+
+    def test_prometheus_text(self):
+        for _ in range(3):
+            with self.registry.stage("prompt_build") as record:
+                record.tokens = 100
+        text = self.registry.prometheus_text()
+        self.assertIn("# TYPE jfr_analyzer_stage_duration_seconds histogram", text)
+        self.assertIn('jfr_analyzer_stage_calls_total{stage="prompt_build"} 3', text)
+        self.assertIn('jfr_analyzer_stage_tokens_total{stage="prompt_build"} 300', text)
+        self.assertIn('jfr_analyzer_stage_duration_seconds_bucket{stage="prompt_build",le="+Inf"} 3', text)
+        self.assertIn("jfr_analyzer_peak_rss_bytes ", text)
+        self.assertIn("prompt_build", self.registry.summary())
+
+    def test_webui_metrics_endpoint(self):
+        import webui
+        with metrics.stage("extract"):
+            pass
+        response = TestClient(webui.app).get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn('jfr_analyzer_stage_calls_total{stage="extract"}', response.text)
+
+if __name__ == "__main__":
+    unittest.main()
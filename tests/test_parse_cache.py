@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import jfr_parser
+from event_selection import EventSelection
+from jfr_parser import parse_jfr
+from parse_cache import ParseCache
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="jfr_cache_test_")
+        self.cache = ParseCache(cache_dir=self.cache_dir, max_size_mb=1)
+        fd, self.jfr_path = tempfile.mkstemp(suffix=".jfr")
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"recording bytes")
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.remove(self.jfr_path)
+
+    def fake_chunk(self, cfile, selection=None):
+        self.calls += 1
+        for i in range(3):
+            yield {"type": "jdk.GarbageCollection", "values": {"gcId": i, "name": "G1", "ok": True, "x": None}}
+
+    def parse(self, **kwargs):
+        with mock.patch.object(jfr_parser, "disassemble_jfr", side_effect=lambda p, **kw: [p]), \
+             mock.patch.object(jfr_parser, "_iter_chunk_events", side_effect=self.fake_chunk):
+            return parse_jfr(self.jfr_path, cache=self.cache, **kwargs)
+
+    def test_second_parse_hits_cache(self):
+        first = self.parse()
+        second = self.parse()
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(self.cache.entries()), 1)
+
+    def test_key_depends_on_content_and_options(self):
+        self.parse()
+        self.parse(chunking_threshold_mb=10)
+        self.assertEqual(self.calls, 2)
+        self.parse(selection=EventSelection(fields=["gcId"]))
+        self.assertEqual(self.calls, 3)
+        with open(self.jfr_path, "ab") as f:
+            f.write(b" changed")
+        self.parse()
+        self.assertEqual(self.calls, 4)
+
+    def test_failed_chunks_are_not_cached(self):
+        def broken(cfile, selection=None):
+            raise RuntimeError("jfr print failed")
+            yield
+        with mock.patch.object(jfr_parser, "disassemble_jfr", side_effect=lambda p, **kw: [p]), \
+             mock.patch.object(jfr_parser, "_iter_chunk_events", side_effect=broken):
+            self.assertEqual(parse_jfr(self.jfr_path, cache=self.cache), [])
+        self.assertEqual(self.cache.entries(), [])
+        self.assertEqual([n for n in os.listdir(self.cache_dir)], [])
+
+    def test_lru_eviction_and_clear(self):
+        big = [{"payload": os.urandom(400 * 1024).hex()}]
+        self.cache.max_bytes = 100 * 1024 * 1024
+        for key in ("a", "b", "c"):
+            list(self.cache.store(key, iter(big)))
+            os.utime(self.cache._entry_path(key), (0, {"a": 1, "b": 2, "c": 3}[key] * 1000))
+        self.cache.get("a")  # most recently used now
+        self.cache.max_bytes = 1024 * 1024
+        self.cache.evict()
+        remaining = sorted(os.path.basename(p) for p, _, _ in self.cache.entries())
+        self.assertIn("a.events", remaining)
+        self.assertNotIn("b.events", remaining)
+        self.assertEqual(self.cache.clear(), len(remaining))
+        self.assertEqual(self.cache.entries(), [])
+
+if __name__ == '__main__':
+    unittest.main()
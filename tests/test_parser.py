@@ -1,6 +1,12 @@
 import unittest
+import io
 import os
-from jfr_parser import parse_jfr
+import types
+import tempfile
+from unittest import mock
+import jfr_parser
+from jfr_parser import parse_jfr, iter_jfr_events, iter_json_array
+from metrics import REGISTRY
 
 class TestJfrParser(unittest.TestCase):
     def test_parse_invalid_file(self):
@@ -31,5 +37,49 @@ class TestJfrParser(unittest.TestCase):
         self.assertEqual(result, [])
         os.remove(empty_json)
 
+    def test_iter_jfr_events_is_lazy(self):
+        sample_json = os.path.join("sample_data", "event_snippets.json")
+        events = iter_jfr_events(sample_json)
+        self.assertIsInstance(events, types.GeneratorType)
+        self.assertEqual(list(events), parse_jfr(sample_json))
+
+    def test_iter_json_array_small_reads(self):
+        # Elements split across reads must still decode correctly
+        stream = io.StringIO('[{"event": "a", "n": 12345}, {"event": "b", "s": "x]y"}, 678]')
+        self.assertEqual(
+            list(iter_json_array(stream, read_size=3)),
+            [{"event": "a", "n": 12345}, {"event": "b", "s": "x]y"}, 678]
+        )
+
+    def test_iter_json_array_recording_layout(self):
+        # `jfr print --json` wraps events in {"recording": {"events": [...]}}
+        stream = io.StringIO('{"recording": {"events": [{"type": "jdk.GarbageCollection"}]}}')
+        self.assertEqual(list(iter_json_array(stream, read_size=7)), [{"type": "jdk.GarbageCollection"}])
+
+    def test_parallel_chunks_keep_order_and_isolate_errors(self):
+        # Chunks finish out of order; events must still come back in chunk order
+        import time
+        def fake_chunk(cfile, selection=None):
+            if cfile == "c2":
+                raise RuntimeError("broken chunk")
+            time.sleep(0.05 if cfile == "c0" else 0)
+            yield {"chunk": cfile, "n": 0}
+            yield {"chunk": cfile, "n": 1}
+        with tempfile.NamedTemporaryFile(suffix=".jfr", delete=False) as tmp:
+            jfr_path = tmp.name
+        decoded = REGISTRY.snapshot().get("jfr_print", {}).get("events", 0)
+        try:
+            with mock.patch.object(jfr_parser, "disassemble_jfr", return_value=["c0", "c1", "c2", "c3"]), \
+                 mock.patch.object(jfr_parser, "_iter_chunk_events", side_effect=fake_chunk):
+                result = parse_jfr(jfr_path, workers=3)
+        finally:
+            os.remove(jfr_path)
+        # Decoded in worker processes, but charged to this process's metrics
+        self.assertEqual(REGISTRY.snapshot()["jfr_print"]["events"], decoded + 6)
+        self.assertEqual(
+            [(e["chunk"], e["n"]) for e in result],
+            [("c0", 0), ("c0", 1), ("c1", 0), ("c1", 1), ("c3", 0), ("c3", 1)]
+        )
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from llm_prompter import build_prompt
+from prompt_budget import approx_token_count, compact_summary, dedupe_repeats, split_sections
+
+SUMMARY = """
+JFR Summary:
+Events: 1200
+Time Range: 2025-06-10 10:41:09+00:00 --> 2025-06-10 10:45:00+00:00
+Stuck Threads: 3
+Example Top SQL: ["{'sql': 'select * from claims where id = ? and status in (1, 2, 3) order by created desc'}"]
+Longest GC Pause(ms): 370
+GC Pause p50/p95/p99(ms): 12.0/240.0/370.0
+"""
+
+def word_count(text):
+    return len(text.split())
+
+class TestPromptBudget(unittest.TestCase):
+    def test_split_sections(self):
+        labels = [label for label, _ in split_sections(SUMMARY)]
+        self.assertEqual(labels[0], "")
+        self.assertIn("Example Top SQL", labels)
+        self.assertIn("GC Pause p50/p95/p99(ms)", labels)
+
+    def test_dedupe_frames_and_threads(self):
+        text = ("{'threadName': 'worker-1', 'stackTrace': ['a.B.c(B.java:1)', 'd.E.f(E.java:2)']} "
+                "{'threadName': 'worker-1', 'stackTrace': ['a.B.c(B.java:1)', 'd.E.f(E.java:2)']}")
+        deduped = dedupe_repeats(text)
+        self.assertEqual(deduped.count("a.B.c(B.java:1)"), 1)
+        self.assertEqual(deduped.count("worker-1"), 1)
+        self.assertIn("[F1]", deduped)
+        self.assertIn("'threadName': [T1]", deduped)
+        self.assertLess(len(deduped), len(text))
+
+    def test_greedy_fill_keeps_most_diagnostic_sections(self):
+        text, dropped = compact_summary(SUMMARY, 20, word_count)
+        self.assertIn("Stuck Threads: 3", text)
+        self.assertIn("Longest GC Pause(ms): 370", text)
+        self.assertIn("Example Top SQL", dropped)
+        self.assertNotIn("Example Top SQL", text)
+        self.assertLessEqual(word_count(text), 20)
+        # Kept sections stay in their original order
+        self.assertLess(text.index("Stuck Threads"), text.index("Longest GC Pause"))
+
+    def test_build_prompt_reports_dropped_sections(self):
+        full = build_prompt(SUMMARY)
+        compact = build_prompt(SUMMARY, token_budget=approx_token_count(full) - 20)
+        self.assertLess(len(compact), len(full) + 60)
+        omitted = [line for line in compact.splitlines() if line.startswith("(Omitted to fit the prompt budget:")]
+        self.assertEqual(len(omitted), 1)
+        self.assertIn("Example Top SQL", omitted[0])
+        self.assertIn("Stuck Threads: 3", compact)
+        self.assertEqual(build_prompt(SUMMARY, token_budget=100000).count("Omitted"), 0)
+
+    def test_omitted_note_fits_the_budget(self):
+        # The header and the note naming every other section are as small as the prompt gets
+        smallest = word_count(build_prompt(SUMMARY, token_budget=1, count_tokens=word_count))
+        for budget in range(smallest, word_count(build_prompt(SUMMARY)) + 1):
+            prompt = build_prompt(SUMMARY, token_budget=budget, count_tokens=word_count)
+            self.assertLessEqual(word_count(prompt), budget)
+
+if __name__ == '__main__':
+    unittest.main()
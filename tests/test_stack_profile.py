@@ -0,0 +1,82 @@
+import unittest
+
+from feature_extractor import StreamingAggregator, extract_features
+from stack_profile import StackProfile, method_name
+
+# Leaf first, as in JFR stack traces
+DB_WRITE = ["sun.nio.ch.SocketChannelImpl.write(SocketChannelImpl.java:466)",
+            "oracle.jdbc.Stmt.executeQuery(Stmt.java:3771)",
+            "app.Claims.find(Claims.java:261)"]
+DB_READ = ["sun.nio.ch.SocketChannelImpl.read(SocketChannelImpl.java:100)",
+           "oracle.jdbc.Stmt.executeQuery(Stmt.java:3790)",
+           "app.Claims.find(Claims.java:261)"]
+LOCK = [{"method": {"type": {"name": "java.lang.Object"}, "name": "wait"}, "lineNumber": -1},
+        {"method": {"type": {"name": "app.Claims"}, "name": "find"}, "lineNumber": 270}]
+
+class TestStackProfile(unittest.TestCase):
+    def make_profile(self, **kwargs):
+        profile = StackProfile(**kwargs)
+        for _ in range(3):
+            profile.add(DB_WRITE, duration_ms=10)
+        profile.add(DB_READ, duration_ms=100)
+        profile.add({"frames": LOCK}.get("frames"))
+        return profile
+
+    def test_method_names(self):
+        self.assertEqual(method_name("a.B.c(B.java:12)"), "a.B.c")
+        self.assertEqual(method_name("a.B.c:12"), "a.B.c")
+        self.assertEqual(method_name("a.B.c"), "a.B.c")
+
+    def test_hot_methods_and_leaves(self):
+        profile = self.make_profile()
+        self.assertEqual(profile.samples, 5)
+        self.assertEqual(profile.hot_methods(2), [("app.Claims.find", 5), ("oracle.jdbc.Stmt.executeQuery", 4)])
+        self.assertEqual(profile.top_leaf_frames(1), [(DB_WRITE[0], 3)])
+        # Frames that differ only in line number share one method and one call-tree node
+        self.assertEqual(len(profile.methods), 5)
+        self.assertEqual(len(profile), 6)
+
+    def test_collapsed_stacks(self):
+        lines = sorted(self.make_profile().collapsed())
+        self.assertEqual(lines, [
+            "app.Claims.find;java.lang.Object.wait 1",
+            "app.Claims.find;oracle.jdbc.Stmt.executeQuery;sun.nio.ch.SocketChannelImpl.read 1",
+            "app.Claims.find;oracle.jdbc.Stmt.executeQuery;sun.nio.ch.SocketChannelImpl.write 3",
+        ])
+        by_time = sorted(self.make_profile().collapsed(by_duration=True))
+        self.assertEqual(by_time, [
+            "app.Claims.find;oracle.jdbc.Stmt.executeQuery;sun.nio.ch.SocketChannelImpl.read 100",
+            "app.Claims.find;oracle.jdbc.Stmt.executeQuery;sun.nio.ch.SocketChannelImpl.write 30",
+        ])
+
+    def test_node_cap_keeps_totals_exact(self):
+        profile = self.make_profile(max_nodes=3)
+        self.assertEqual(len(profile), 3)
+        self.assertEqual(profile.truncated, 5)
+        self.assertEqual(profile.hot_methods(1), [("app.Claims.find", 5)])
+        self.assertEqual(profile.top_leaf_frames(1), [(DB_WRITE[0], 3)])
+
+    def test_merge_matches_single_pass(self):
+        left = StackProfile()
+        right = StackProfile()
+        left.add(DB_WRITE)
+        right.add(DB_WRITE)
+        right.add(DB_READ)
+        left.merge(right)
+        single = StackProfile()
+        for stack in (DB_WRITE, DB_WRITE, DB_READ):
+            single.add(stack)
+        self.assertEqual(sorted(left.collapsed()), sorted(single.collapsed()))
+        self.assertEqual(left.hot_methods(), single.hot_methods())
+
+    def test_features_include_hot_methods(self):
+        events = [{"event": "jdk.ThreadStuck", "threadName": "t", "stackTrace": DB_WRITE} for _ in range(4)]
+        events.append({"type": "jdk.ExecutionSample", "values": {"stackTrace": {"frames": LOCK}}})
+        aggregator = StreamingAggregator().update(events)
+        self.assertEqual(aggregator.features()["hot_methods"][0], ("app.Claims.find", 5))
+        summary = extract_features(events)
+        self.assertIn("Hot Methods (samples): app.Claims.find (5)", summary)
+        self.assertIn("Top Leaf Frames (samples)", summary)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+
+import benchmark
+from feature_extractor import StreamingAggregator
+from jfr_parser import iter_jfr_events
+from synthetic_jfr import SyntheticRecording
+
+class TestSyntheticRecording(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="synthetic_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_deterministic(self):
+        first = list(SyntheticRecording(500, seed=7))
+        self.assertEqual(first, list(SyntheticRecording(500, seed=7)))
+        self.assertNotEqual(first, list(SyntheticRecording(500, seed=8)))
+
+    def test_mix_and_shape(self):
+        events = list(SyntheticRecording(2000, mix={"jdk.GarbageCollection": 1, "jdk.SQLExecution": 1}, stack_depth=4))
+        counts = Counter(e["type"] for e in events)
+        self.assertEqual(set(counts), {"jdk.GarbageCollection", "jdk.SQLExecution"})
+        sql = next(e for e in events if e["type"] == "jdk.SQLExecution")["values"]
+        self.assertTrue(sql["sql"].startswith("select"))
+        self.assertEqual(len(sql["stackTrace"]["frames"]), 4)
+        times = [e["values"]["startTime"] for e in events]
+        self.assertEqual(times, sorted(times))
+
+    def test_written_recording_parses(self):
+        path = os.path.join(self.tmpdir, "synthetic.json")
+        recording = SyntheticRecording(3000, seed=1)
+        self.assertEqual(recording.write(path), 3000)
+        parsed = list(iter_jfr_events(path))
+        self.assertEqual(parsed, list(recording))
+        features = StreamingAggregator().update(parsed).features()
+        self.assertEqual(features["num_events"], 3000)
+        self.assertGreater(features["num_stuck_threads"], 0)
+        self.assertIsNotNone(features["gc_pause_quantiles"])
+        self.assertTrue(features["hot_methods"])
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_flags_regressions(self):
+        baseline = {"parse": {"wall_seconds": 1.0, "peak_rss_mb": 100.0}}
+        self.assertEqual(benchmark.compare({"parse": {"wall_seconds": 1.1, "peak_rss_mb": 100.0}}, baseline, 0.2), [])
+        regressions = benchmark.compare({"parse": {"wall_seconds": 1.5, "peak_rss_mb": 130.0}}, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("wall_seconds", regressions[0])
+
+    def test_measure_stage_in_subprocess(self):
+        tmpdir = tempfile.mkdtemp(prefix="benchmark_test_")
+        try:
+            path = os.path.join(tmpdir, "synthetic.json")
+            SyntheticRecording(200, stack_depth=4).write(path)
+            result = benchmark.measure_stage("parse", path)
+            self.assertGreater(result["events_per_second"], 0)
+            self.assertGreater(result["peak_rss_mb"], 0)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def gc(minute, second, pause):
+    return {"event": "jdk.GarbageCollection", "startTime": f"2025-01-01T00:{minute:02d}:{second:02d}.000Z",
+            "longestPause": pause}
+
+def stuck(minute, second):
+    return {"event": "jdk.ThreadStuck", "threadName": "worker", "startTime": f"2025-01-01T00:{minute:02d}:{second:02d}.000Z"}
+
+@unittest.skipUnless(np is not None, "numpy is not installed")
+class TestTimeIndex(unittest.TestCase):
+    def setUp(self):
+        # Ten quiet minutes with one GC pause spike at minute 4 and a stuck-thread burst at minute 7
+        self.events = [gc(m, 30, 10) for m in range(10)]
+        self.events += [gc(4, 45, 900)]
+        self.events += [stuck(7, s) for s in (1, 2, 3)]
+        self.events += [{"event": "jdk.CPULoad"}]
+        self.events.reverse()
+
+    def test_sorted_and_sliced(self):
+        from time_index import TimeIndex
+        index = TimeIndex(self.events)
+        self.assertEqual(len(index), len(self.events) - 1)
+        self.assertEqual(len(index.untimed), 1)
+        self.assertTrue(np.all(np.diff(index.times) >= 0))
+        window = index.slice("2025-01-01T00:04:00Z", "2025-01-01T00:05:00Z")
+        self.assertEqual([e["longestPause"] for e in window], [10, 900])
+        self.assertEqual(len(index.slice(end="2025-01-01T00:02:30Z")), 2)
+        self.assertEqual(len(index.slice(start="2025-01-01T00:09:00Z")), 1)
+
+    def test_fixed_windows(self):
+        from time_index import TimeIndex
+        index = TimeIndex(self.events)
+        windows = list(index.windows(60, start="2025-01-01T00:00:00Z", end="2025-01-01T00:10:00Z"))
+        self.assertEqual(len(windows), 10)
+        self.assertEqual(sum(len(events) for _, _, events in windows), len(index))
+        self.assertEqual(len(windows[7][2]), 4)
+
+    def test_anomalous_windows_are_flagged(self):
+        from time_index import TimeIndex, analyze_windows
+        features, windows = analyze_windows(
+            TimeIndex(self.events), 60, start="2025-01-01T00:00:00Z", workers=4)
+        flagged = features["high_usage_periods"]
+        self.assertEqual([w["reasons"] for w in flagged], [["GC pause spike"], ["stuck-thread burst"]])
+        self.assertTrue(flagged[0]["start"].startswith("2025-01-01 00:04:00"))
+        self.assertEqual(flagged[1]["num_stuck_threads"], 3)
+        self.assertEqual(features["num_events"], len(self.events) - 1)
+        self.assertEqual(features["longest_gc_pause"], 900)
+
+    def test_worker_processes_match_serial(self):
+        import pickle
+        from time_index import SpilledTimeIndex, TimeIndex, analyze_windows
+        spilled = SpilledTimeIndex(self.events)
+        window = next(spilled.windows(60))
+        # A spilled window crosses to a worker process as its range, not its events
+        self.assertLess(len(pickle.dumps(window)), 300)
+        for index in (TimeIndex(self.events), spilled):
+            self.assertEqual(analyze_windows(index, 60, workers=2), analyze_windows(index, 60, workers=1))
+        spilled.close()
+
+    def test_windowed_summary_describes_flagged_windows(self):
+        from time_index import extract_windowed_features
+        summary = extract_windowed_features(self.events, window_seconds=60, workers=2)
+        self.assertEqual(summary.count("Flagged Window:"), 2)
+        self.assertIn("GC pause spike", summary)
+        ranged = extract_windowed_features(self.events, start="2025-01-01T00:07:00Z", end="2025-01-01T00:08:00Z")
+        self.assertIn("Events: 4", ranged)
+        self.assertIn("Stuck Threads: 3", ranged)
+        self.assertNotIn("Flagged Window", ranged)
+
+    def test_spilled_index_matches_in_memory(self):
+        from time_index import SpilledTimeIndex, TimeIndex, analyze_windows, build_time_index
+        self.assertIsInstance(build_time_index(self.events, memory_budget=1 << 30), TimeIndex)
+        index = build_time_index(iter(self.events), memory_budget=1)
+        self.assertIsInstance(index, SpilledTimeIndex)
+        memory = TimeIndex(self.events)
+        self.assertEqual(len(index), len(memory))
+        self.assertEqual(list(index.untimed), memory.untimed)
+        self.assertEqual(index.bounds(), memory.bounds())
+        window = index.slice("2025-01-01T00:04:00Z", "2025-01-01T00:05:00Z")
+        self.assertEqual([e["longestPause"] for e in window], [10, 900])
+        self.assertEqual(len(window), 2)
+        self.assertEqual(list(index.slice()), memory.slice())
+        spilled, _ = analyze_windows(index, 60, start="2025-01-01T00:00:00Z", workers=4)
+        expected, _ = analyze_windows(memory, 60, start="2025-01-01T00:00:00Z", workers=4)
+        self.assertEqual(spilled, expected)
+        path = index.path
+        index.close()
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == "__main__":
+    unittest.main()
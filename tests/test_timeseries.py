@@ -0,0 +1,115 @@
+import os
+import tempfile
+import time
+import unittest
+
+from report_generator import render_report, report_format, write_report
+from synthetic_jfr import SyntheticRecording
+from timeseries import THREAD_STATES, TimeSeriesCollector, lttb, mean_downsample, minmax_downsample
+
+class TestDownsampling(unittest.TestCase):
+    def setUp(self):
+        # A flat series with one spike and one dip
+        self.points = [(i, 10.0) for i in range(10000)]
+        self.points[1234] = (1234, 500.0)
+        self.points[7777] = (7777, -3.0)
+
+    def test_lttb_keeps_peaks_and_ends(self):
+        sampled = lttb(self.points, 100)
+        self.assertEqual(len(sampled), 100)
+        self.assertEqual(sampled[0], self.points[0])
+        self.assertEqual(sampled[-1], self.points[-1])
+        self.assertIn((1234, 500.0), sampled)
+        self.assertIn((7777, -3.0), sampled)
+        self.assertEqual([x for x, _ in sampled], sorted(x for x, _ in sampled))
+        self.assertEqual(lttb(self.points[:50], 100), self.points[:50])
+
+    def test_minmax_keeps_envelope(self):
+        sampled = minmax_downsample(self.points, 100)
+        self.assertLessEqual(len(sampled), 100)
+        self.assertIn((1234, 500.0), sampled)
+        self.assertIn((7777, -3.0), sampled)
+        self.assertEqual([x for x, _ in sampled], sorted(x for x, _ in sampled))
+
+    def test_mean_downsample(self):
+        times, (column,) = mean_downsample(list(range(10)), [[1, 3] * 5], 5)
+        self.assertEqual(times, [0, 2, 4, 6, 8])
+        self.assertEqual(column, [2.0] * 5)
+        # Missing keys count as zeros
+        times, (column,) = mean_downsample([0, 9], [[4, 8]], 2)
+        self.assertEqual(times, [0, 5])
+        self.assertEqual(column, [0.8, 1.6])
+
+class TestTimeSeriesCollector(unittest.TestCase):
+    def setUp(self):
+        self.events = list(SyntheticRecording(5000, seed=2).events())
+
+    def test_bounded_buckets(self):
+        collector = TimeSeriesCollector(max_buckets=64)
+        passed = list(collector.observe(self.events))
+        self.assertEqual(passed, self.events)
+        self.assertLessEqual(len(collector.buckets), 64)
+        series = collector.series(points=20)
+        self.assertEqual(series["num_events"], 5000)
+        # Every event is counted once, whatever the bucket width ended up being
+        self.assertEqual(sum(row[0] for row in collector.buckets.values()), 5000)
+        self.assertLessEqual(len(series["event_rate"]), 20)
+        self.assertLessEqual(len(series["gc_pause_ms"]), 20)
+        self.assertEqual(len(series["thread_states"]["times"]), len(series["thread_states"]["running"]))
+        longest = max(pause for _, pause in series["gc_pause_ms"])
+        self.assertEqual(longest, max(row[1] for row in collector.buckets.values()))
+
+    def test_coarsening_preserves_counts(self):
+        fine = TimeSeriesCollector().update(self.events)
+        coarse = TimeSeriesCollector(max_buckets=8).update(self.events)
+        self.assertGreater(coarse.width_ns, fine.width_ns)
+        for slot in range(2, 2 + len(THREAD_STATES)):
+            self.assertEqual(sum(r[slot] for r in fine.buckets.values()),
+                             sum(r[slot] for r in coarse.buckets.values()))
+
+    def test_sparse_long_span(self):
+        # 12 GCs an hour apart: 4.3M empty 10 ms buckets between them must not be materialized
+        events = [{"type": "jdk.GarbageCollection", "values": {
+            "startTime": f"2025-01-01T{h:02d}:00:00.000000Z", "longestPause": f"PT0.0{h + 10}S"}}
+            for h in range(12)]
+        collector = TimeSeriesCollector().update(events)
+        started = time.monotonic()
+        series = collector.series(points=50)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(series["gc_pause_ms"]), 12)
+        self.assertEqual(max(pause for _, pause in series["gc_pause_ms"]), 21.0)
+        self.assertLessEqual(len(series["event_rate"]), 50)
+        self.assertEqual(len(series["thread_states"]["times"]), 50)
+        self.assertEqual(series["end_ns"] - series["start_ns"], 11 * 3600 * 10 ** 9 + collector.width_ns)
+
+    def test_no_timestamps(self):
+        collector = TimeSeriesCollector().update([{"event": "jdk.ThreadStuck", "threadName": "t"}])
+        self.assertIsNone(collector.series())
+        self.assertEqual(collector.untimed, 1)
+
+class TestReports(unittest.TestCase):
+    def test_markdown_report_unchanged(self):
+        report = render_report("Heap is fine.")
+        self.assertTrue(report.startswith("\n# JVM Diagnostics Report\n"))
+        self.assertIn("Heap is fine.", report)
+
+    def test_html_report_size_is_bounded(self):
+        events = list(SyntheticRecording(20000, seed=4).events())
+        series = TimeSeriesCollector().update(events).series(points=200)
+        report = render_report("<script>alert(1)</script>", "html", series)
+        self.assertIn("&lt;script&gt;", report)
+        self.assertEqual(report.count("<svg"), 3)
+        self.assertLess(len(report), 100_000)
+        self.assertIn("Thread states", report)
+
+    def test_write_report_picks_format(self):
+        self.assertEqual(report_format("out.HTML"), "html")
+        self.assertEqual(report_format("out.md"), "markdown")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "report.html")
+            write_report("findings", path)
+            with open(path, encoding="utf-8") as f:
+                self.assertIn("<!DOCTYPE html>", f.read())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,16 @@
+import asyncio
+import hashlib
 import os
+import threading
+import time
 import unittest
+from unittest import mock
 from fastapi.testclient import TestClient
 
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import webui
+from jobs import JobQueue
 from webui import app
 
 class TestWebUIEndToEnd(unittest.TestCase):
@@ -22,10 +29,24 @@ class TestWebUIEndToEnd(unittest.TestCase):
         else:
             self.sample_jfr_bytes = None
 
+    def submit_and_wait(self, files, data, timeout=60):
+        # /analyze queues a job and redirects to its status page; poll until it finishes
+        response = self.client.post("/analyze", files=files, data=data, follow_redirects=False)
+        self.assertEqual(response.status_code, 303)
+        view_url = response.headers["location"]
+        job_id = view_url.split("/")[2]
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = self.client.get(f"/jobs/{job_id}").json()
+            if status["status"] in ("done", "failed"):
+                break
+            time.sleep(0.05)
+        self.assertEqual(status["status"], "done")
+        return job_id, self.client.get(view_url)
+
     def test_upload_and_get_report(self):
         # Emulate uploading a small "JFR" (JSON) file and receiving HTML
-        response = self.client.post(
-            "/analyze",
+        job_id, response = self.submit_and_wait(
             files={"jfrfile": ("event_snippets.json", self.sample_json_bytes, "application/json")},
             data={"llmmodel":"google/gemma-2b-it", "chunkthresh": "10", "uselocal": "1"}
         )
@@ -33,6 +54,194 @@ class TestWebUIEndToEnd(unittest.TestCase):
         content = response.content.decode()
         self.assertIn("Analysis Results", content)
         self.assertIn("Download Report as Markdown", content)
+        result = self.client.get(f"/jobs/{job_id}/result")
+        self.assertEqual(result.status_code, 200)
+        self.assertIn("findings", result.json())
+        report = self.client.get(f"/jobs/{job_id}/report")
+        self.assertEqual(report.status_code, 200)
+        self.assertIn("JVM Diagnostics Report", report.text)
+        html_report = self.client.get(f"/jobs/{job_id}/report.html")
+        self.assertEqual(html_report.status_code, 200)
+        self.assertIn("<svg", html_report.text)
+
+    def test_queue_full_returns_429(self):
+        release = threading.Event()
+
+        def blocking_analysis(job, tmp_path, *args):
+            os.remove(tmp_path)
+            release.wait(10)
+            return {"findings": "", "report": "", "html_report": ""}
+
+        files = {"jfrfile": ("event_snippets.json", self.sample_json_bytes, "application/json")}
+        queue = JobQueue(workers=1, max_queued=1)
+        with mock.patch.object(webui, "job_queue", queue), \
+             mock.patch.object(webui, "run_analysis", blocking_analysis):
+            try:
+                first = self.client.post("/analyze", files=files, follow_redirects=False)
+                job_id = first.headers["location"].split("/")[2]
+                while self.client.get(f"/jobs/{job_id}").json()["status"] == "queued":
+                    time.sleep(0.01)
+                # Worker is busy; one job fits in the queue, the next one is rejected
+                self.assertEqual(self.client.post("/analyze", files=files, follow_redirects=False).status_code, 303)
+                self.assertEqual(self.client.post("/analyze", files=files, follow_redirects=False).status_code, 429)
+                self.assertEqual(self.client.get(f"/jobs/{job_id}/result").status_code, 409)
+            finally:
+                release.set()
+
+    def test_findings_are_escaped_and_failures_are_results(self):
+        outcomes = iter([{"findings": "<script>alert(1)</script>", "report": "", "html_report": ""},
+                         RuntimeError("no events <found>")])
+
+        def analysis(job, tmp_path, *args):
+            os.remove(tmp_path)
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        files = {"jfrfile": ("event_snippets.json", self.sample_json_bytes, "application/json")}
+        job_ids = []
+        with mock.patch.object(webui, "run_analysis", analysis):
+            for _ in range(2):
+                response = self.client.post("/analyze", files=files, follow_redirects=False)
+                job_id = response.headers["location"].split("/")[2]
+                while self.client.get(f"/jobs/{job_id}").json()["status"] not in ("done", "failed"):
+                    time.sleep(0.01)
+                job_ids.append(job_id)
+        done, failed = job_ids
+        view = self.client.get(f"/jobs/{done}/view").text
+        self.assertNotIn("<script>alert", view)
+        self.assertIn("&lt;script&gt;alert(1)&lt;/script&gt;", view)
+        result = self.client.get(f"/jobs/{failed}/result")
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json()["status"], "failed")
+        self.assertIn("no events", result.json()["error"])
+        self.assertEqual(self.client.get("/download", params={"path": "/etc/passwd"}).status_code, 404)
+
+    def test_workers_are_capped_at_cpu_count(self):
+        submitted = threading.Event()
+        received = []
+
+        def analysis(job, tmp_path, content_digest, chunkthresh, workers, *args):
+            os.remove(tmp_path)
+            received.append(workers)
+            submitted.set()
+            return {"findings": "", "report": "", "html_report": ""}
+
+        files = {"jfrfile": ("event_snippets.json", self.sample_json_bytes, "application/json")}
+        with mock.patch.object(webui, "run_analysis", analysis), mock.patch.object(os, "cpu_count", return_value=3):
+            self.client.post("/analyze", files=files, data={"workers": "10000"}, follow_redirects=False)
+            self.assertTrue(submitted.wait(10))
+        self.assertEqual(received, [3])
+
+    def test_upload_size_limit(self):
+        with mock.patch.dict(os.environ, {"MAX_UPLOAD_MB": str(16 / (1024 * 1024))}):
+            response = self.client.post(
+                "/analyze",
+                files={"jfrfile": ("event_snippets.json", self.sample_json_bytes, "application/json")},
+                follow_redirects=False
+            )
+        self.assertEqual(response.status_code, 413)
+
+    def test_upload_rejected_by_content_length_before_reading(self):
+        async def unexpected_spool(*args, **kwargs):
+            raise AssertionError("body should not be read")
+
+        with mock.patch.dict(os.environ, {"MAX_UPLOAD_MB": str(16 / (1024 * 1024))}), \
+             mock.patch.object(webui, "MULTIPART_OVERHEAD_BYTES", 0), \
+             mock.patch.object(webui, "spool_upload", unexpected_spool):
+            response = self.client.post(
+                "/analyze", files={"jfrfile": ("event_snippets.json", self.sample_json_bytes, "application/json")},
+                follow_redirects=False)
+        self.assertEqual(response.status_code, 413)
+
+    def test_upload_without_file_is_rejected(self):
+        response = self.client.post("/analyze", data={"workers": "2"}, files={"other": ("x.txt", b"x")},
+                                    follow_redirects=False)
+        self.assertEqual(response.status_code, 400)
+
+    def test_repeated_file_field_is_rejected(self):
+        files = [("jfrfile", ("a.json", self.sample_json_bytes, "application/json")),
+                 ("jfrfile", ("b.json", self.sample_json_bytes, "application/json"))]
+        created = []
+        real_tempfile = webui.tempfile.NamedTemporaryFile
+
+        def tracking_tempfile(*args, **kwargs):
+            tmp = real_tempfile(*args, **kwargs)
+            created.append(tmp.name)
+            return tmp
+
+        with mock.patch.object(webui.tempfile, "NamedTemporaryFile", tracking_tempfile):
+            response = self.client.post("/analyze", files=files, follow_redirects=False)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Only one jfrfile", response.text)
+        self.assertTrue(created)
+        self.assertFalse(any(os.path.exists(name) for name in created))
+
+    def test_spool_upload_streams_request_body(self):
+        data = self.sample_json_bytes * 3
+        boundary = "testboundary"
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"workers\"\r\n\r\n3\r\n"
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"jfrfile\"; filename=\"recording.JSON\"\r\n"
+                f"Content-Type: application/json\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+
+        class FakeRequest:
+            headers = {"content-type": f"multipart/form-data; boundary={boundary}"}
+
+            def __init__(self, body):
+                self.body = body
+                self.reads = 0
+
+            async def stream(self):
+                for i in range(0, len(self.body), 64):
+                    self.reads += 1
+                    yield self.body[i:i + 64]
+
+        request = FakeRequest(body)
+        fields, path, digest, size = asyncio.run(webui.spool_upload(request, max_bytes=len(data)))
+        try:
+            self.assertEqual(fields, {"workers": "3"})
+            self.assertTrue(path.endswith(".json"))
+            self.assertEqual(size, len(data))
+            self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+            self.assertGreater(request.reads, 2)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), data)
+        finally:
+            os.remove(path)
+        created = []
+        real_tempfile = webui.tempfile.NamedTemporaryFile
+
+        def tracking_tempfile(*args, **kwargs):
+            tmp = real_tempfile(*args, **kwargs)
+            created.append(tmp.name)
+            return tmp
+
+        with mock.patch.object(webui.tempfile, "NamedTemporaryFile", tracking_tempfile):
+            with self.assertRaises(webui.UploadTooLargeError):
+                asyncio.run(webui.spool_upload(FakeRequest(body), max_bytes=100))
+        # The partial spool file is removed
+        self.assertTrue(created)
+        self.assertFalse(any(os.path.exists(name) for name in created))
+
+    def test_findings_stream_as_server_sent_events(self):
+        def fake_stream(summary, **kwargs):
+            yield "Long GC "
+            yield "pauses."
+
+        files = {"jfrfile": ("event_snippets.json", self.sample_json_bytes, "application/json")}
+        with mock.patch.object(webui, "stream_llm", fake_stream):
+            job_id, response = self.submit_and_wait(files=files, data={"uselocal": "1"})
+            self.assertIn("Long GC pauses.", response.text)
+            stream = self.client.get(f"/jobs/{job_id}/stream")
+        self.assertEqual(stream.status_code, 200)
+        self.assertTrue(stream.headers["content-type"].startswith("text/event-stream"))
+        self.assertIn('event: token\ndata: "Long GC "', stream.text)
+        self.assertIn('event: token\ndata: "pauses."', stream.text)
+        self.assertTrue(stream.text.rstrip().splitlines()[-2].startswith("event: done"))
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get("/jobs/doesnotexist").status_code, 404)
 
     def test_main_page_and_model_select(self):
         # Check UI renders model options etc.
@@ -46,8 +255,7 @@ class TestWebUIEndToEnd(unittest.TestCase):
         # This test is skipped unless a real sample .jfr file is present
         if not self.sample_jfr_bytes:
             self.skipTest("No real sample_data/sample_test.jfr provided (replace with a real JFR to enable full e2e test)")
-        response = self.client.post(
-            "/analyze",
+        _, response = self.submit_and_wait(
             files={"jfrfile": ("sample_test.jfr", self.sample_jfr_bytes, "application/octet-stream")},
             data={"llmmodel":"google/gemma-2b-it", "chunkthresh": "1", "uselocal": "1"}
         )
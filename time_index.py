@@ -0,0 +1,306 @@
+import contextlib
+import datetime
+import itertools
+import marshal
+import os
+import shutil
+import sqlite3
+import statistics
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from event_schema import timestamp_ns
+from event_store import NAT_NS, make_spill_dir
+from feature_extractor import StreamingAggregator, _event_fields, _plain_number, render_summary
+
+# A window is flagged when a metric exceeds the median across windows by this many MADs
+ANOMALY_MADS = 3.0
+# ... and, for GC pauses, is at least this long (ms), so uniformly tiny pauses never flag
+MIN_GC_PAUSE_SPIKE_MS = 50.0
+# In-memory size of a decoded event relative to its marshal encoding, for memory budgets
+EVENT_SIZE_FACTOR = 8
+# Rows inserted per SQLite statement when spilling
+SPILL_BATCH_ROWS = 10_000
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def to_epoch_ns(value):
+    """Epoch nanoseconds for a datetime or ISO-8601 string (naive values are taken as UTC)."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        delta = value - _EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+    ns = timestamp_ns(value)
+    if ns == NAT_NS:
+        raise ValueError(f"Not an ISO-8601 timestamp: {value!r}")
+    return ns
+
+
+def _ns_to_datetime(ns):
+    return _EPOCH + datetime.timedelta(microseconds=int(ns) // 1000)
+
+
+class TimeIndex:
+    """
+    Events ordered by start time, with a sorted int64 array of epoch-nanosecond timestamps
+    so any [start, end) range is found by binary search. Events without a parseable
+    startTime are kept aside in `untimed` and belong to no window.
+    """
+
+    def __init__(self, events):
+        timed = []
+        times = []
+        self.untimed = []
+        for e in events:
+            _, fields = _event_fields(e)
+            ns = timestamp_ns(fields.get("startTime"))
+            if ns == NAT_NS:
+                self.untimed.append(e)
+            else:
+                timed.append(e)
+                times.append(ns)
+        times = np.asarray(times, dtype=np.int64)
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.events = [timed[i] for i in order]
+
+    def __len__(self):
+        return len(self.events)
+
+    def bounds(self):
+        """(first, last) start time as epoch ns, or None for an empty index."""
+        if not len(self.times):
+            return None
+        return int(self.times[0]), int(self.times[-1])
+
+    def _positions(self, start_ns, end_ns):
+        lo = 0 if start_ns is None else int(np.searchsorted(self.times, start_ns, side="left"))
+        hi = len(self.times) if end_ns is None else int(np.searchsorted(self.times, end_ns, side="left"))
+        return lo, max(lo, hi)
+
+    def _range(self, start_ns, end_ns):
+        lo, hi = self._positions(start_ns, end_ns)
+        return self.events[lo:hi]
+
+    def slice(self, start=None, end=None):
+        """Events with start <= startTime < end; either bound may be None (open)."""
+        return self._range(None if start is None else to_epoch_ns(start), None if end is None else to_epoch_ns(end))
+
+    def windows(self, size_seconds, start=None, end=None):
+        """
+        Fixed-size windows over [start, end) (default: the whole recording), aligned to
+        `start` or the first event. Yields (window start ns, window end ns, events); empty
+        windows are included so gaps stay visible.
+        """
+        bounds = self.bounds()
+        if bounds is None:
+            return
+        size_ns = int(size_seconds * 1_000_000_000)
+        if size_ns <= 0:
+            raise ValueError("Window size must be positive")
+        start_ns = bounds[0] if start is None else to_epoch_ns(start)
+        end_ns = bounds[1] + 1 if end is None else to_epoch_ns(end)
+        lo_ns = start_ns
+        while lo_ns < end_ns:
+            hi_ns = min(lo_ns + size_ns, end_ns)
+            yield lo_ns, hi_ns, self._range(lo_ns, hi_ns)
+            lo_ns = hi_ns
+
+
+class _SpilledEvents:
+    """
+    Events of a SpilledTimeIndex in one time range, read back lazily in start-time order.
+    Every iteration opens its own connection and the range pickles as just the file path and
+    its bounds, so windows can be read from worker processes without copying their events.
+    """
+
+    def __init__(self, path, where, params):
+        self._path = path
+        self._where = where
+        self._params = params
+
+    def __len__(self):
+        with contextlib.closing(sqlite3.connect(self._path)) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM events WHERE {self._where}", self._params).fetchone()[0]
+
+    def __iter__(self):
+        with contextlib.closing(sqlite3.connect(self._path)) as conn:
+            rows = conn.execute(
+                f"SELECT event FROM events WHERE {self._where} ORDER BY start_ns, rowid", self._params)
+            for (blob,) in rows:
+                yield marshal.loads(blob)
+
+
+class SpilledTimeIndex(TimeIndex):
+    """
+    TimeIndex whose events live in an embedded SQLite file (marshal-encoded, indexed by start
+    time) instead of in memory, for recordings too large to hold decoded. slice() and windows()
+    return lazy, re-iterable ranges that stream rows back, so windowed features and stack
+    aggregation never load the whole recording. The file is deleted with the index.
+    """
+
+    def __init__(self, events):
+        directory = make_spill_dir()
+        self._finalizer = weakref.finalize(self, shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, "events.sqlite")
+        self._count = 0
+        self._bounds = None
+        with contextlib.closing(sqlite3.connect(self.path)) as conn:
+            # Scratch data: no journal or fsync, it is rebuilt if anything goes wrong
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE events (start_ns INTEGER, event BLOB)")
+            rows = (self._row(e) for e in events)
+            while True:
+                batch = list(itertools.islice(rows, SPILL_BATCH_ROWS))
+                if not batch:
+                    break
+                conn.executemany("INSERT INTO events VALUES (?, ?)", batch)
+            # Built after loading, which is much faster than maintaining it per insert
+            conn.execute("CREATE INDEX events_start ON events (start_ns)")
+            conn.commit()
+
+    def _row(self, e):
+        _, fields = _event_fields(e)
+        ns = timestamp_ns(fields.get("startTime"))
+        if ns == NAT_NS:
+            ns = None
+        else:
+            self._count += 1
+            self._bounds = (ns, ns) if self._bounds is None else (min(self._bounds[0], ns), max(self._bounds[1], ns))
+        return ns, marshal.dumps(e)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def untimed(self):
+        return _SpilledEvents(self.path, "start_ns IS NULL", ())
+
+    def bounds(self):
+        return self._bounds
+
+    def _range(self, start_ns, end_ns):
+        clauses, params = ["start_ns IS NOT NULL"], []
+        if start_ns is not None:
+            clauses.append("start_ns >= ?")
+            params.append(start_ns)
+        if end_ns is not None:
+            clauses.append("start_ns < ?")
+            params.append(end_ns)
+        return _SpilledEvents(self.path, " AND ".join(clauses), tuple(params))
+
+    def close(self):
+        """Deletes the spill file now rather than when the index is collected."""
+        self._finalizer()
+
+
+def build_time_index(events, memory_budget=None):
+    """
+    TimeIndex over `events`. Once their estimated in-memory size passes `memory_budget` bytes,
+    they all go to a SpilledTimeIndex instead.
+    """
+    if memory_budget is None:
+        return TimeIndex(events)
+    events = iter(events)
+    buffered = []
+    size = 0
+    for e in events:
+        buffered.append(e)
+        size += len(marshal.dumps(e)) * EVENT_SIZE_FACTOR
+        if size >= memory_budget:
+            return SpilledTimeIndex(itertools.chain(buffered, events))
+    return TimeIndex(buffered)
+
+
+def map_windows(function, windows, workers=1):
+    """
+    [function(window) for window in windows]. With several workers the windows are processed
+    on a process pool, since aggregating them is pure-Python work that threads would serialize
+    on the GIL; `function` must then be a module-level function, and windows and results are
+    pickled (a SpilledTimeIndex window only carries its time range and spill path).
+    """
+    if workers <= 1 or len(windows) <= 1:
+        return [function(window) for window in windows]
+    workers = min(workers, len(windows))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, windows, chunksize=max(1, len(windows) // (workers * 4))))
+
+
+def _window_features(window):
+    start_ns, end_ns, events = window
+    aggregator = StreamingAggregator().update(events)
+    return {
+        "start": str(_ns_to_datetime(start_ns)),
+        "end": str(_ns_to_datetime(end_ns)),
+        "num_events": aggregator.num_events,
+        "num_stuck_threads": aggregator.num_stuck_threads,
+        "longest_gc_pause": None if aggregator.longest_gc_pause is None else _plain_number(aggregator.longest_gc_pause),
+        "gc_pause_p99": aggregator.gc_pauses.quantile(0.99),
+    }, aggregator
+
+
+def _spikes(values, floor=0.0):
+    """Indexes of values above median + ANOMALY_MADS * MAD (and above `floor`)."""
+    if not values:
+        return set()
+    median = statistics.median(values)
+    mad = statistics.median(abs(v - median) for v in values)
+    threshold = max(median + ANOMALY_MADS * mad, floor)
+    return {i for i, v in enumerate(values) if v > threshold and v > median}
+
+
+def flag_anomalies(windows):
+    """
+    Marks windows whose GC pauses or stuck-thread counts spike relative to the rest of the
+    recording (median + ANOMALY_MADS * MAD). Sets window["reasons"] and returns the flagged ones.
+    """
+    gc = _spikes([w["longest_gc_pause"] or 0.0 for w in windows], floor=MIN_GC_PAUSE_SPIKE_MS)
+    stuck = _spikes([w["num_stuck_threads"] for w in windows])
+    flagged = []
+    for i, w in enumerate(windows):
+        w["reasons"] = []
+        if i in gc:
+            w["reasons"].append("GC pause spike")
+        if i in stuck:
+            w["reasons"].append("stuck-thread burst")
+        if w["reasons"]:
+            flagged.append(w)
+    return flagged
+
+
+def analyze_windows(index, window_seconds, start=None, end=None, workers=1):
+    """
+    Computes features for every fixed-size window, on `workers` processes (see map_windows),
+    and flags anomalous ones.
+    Returns (overall feature dict, per-window list); the overall features cover the selected
+    range and their `high_usage_periods` hold the flagged windows.
+    """
+    windows = list(index.windows(window_seconds, start=start, end=end))
+    results = map_windows(_window_features, windows, workers)
+    overall = StreamingAggregator()
+    for _, aggregator in results:
+        overall.merge(aggregator)
+    per_window = [w for w, _ in results]
+    features = overall.features()
+    features["high_usage_periods"] = flag_anomalies(per_window)
+    return features, per_window
+
+
+def extract_windowed_features(events, window_seconds=None, start=None, end=None, workers=1, memory_budget=None):
+    """
+    Summary of the events between `start` and `end` (ISO strings or datetimes, either optional).
+    With `window_seconds`, the range is split into fixed-size windows analyzed on `workers` processes, and
+    only the flagged windows are described in the summary, so the prompt focuses on the spikes.
+    Past `memory_budget` bytes the events are spilled to disk and read back window by window.
+    """
+    index = build_time_index(events, memory_budget=memory_budget)
+    if window_seconds:
+        features, _ = analyze_windows(index, window_seconds, start=start, end=end, workers=workers)
+    else:
+        features = StreamingAggregator().update(index.slice(start, end)).features()
+    return render_summary(features, features["num_stuck_threads"])
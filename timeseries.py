@@ -0,0 +1,231 @@
+import math
+import os
+from operator import itemgetter
+
+from event_schema import timestamp_ns
+from feature_extractor import _event_fields
+from utils import NAT_NS, to_millis
+
+DEFAULT_CHART_POINTS = 500
+DEFAULT_MAX_BUCKETS = 16384
+DEFAULT_RESOLUTION_MS = 10
+
+# What a thread is doing while it emits an event of each type
+THREAD_STATES = ("running", "blocked", "waiting", "io", "stuck")
+_STATE_OF_TYPE = {
+    "jdk.ExecutionSample": "running",
+    "jdk.JavaMonitorEnter": "blocked",
+    "jdk.JavaMonitorWait": "waiting",
+    "jdk.ThreadPark": "waiting",
+    "jdk.ThreadSleep": "waiting",
+    "jdk.SocketRead": "io",
+    "jdk.SocketWrite": "io",
+    "jdk.FileRead": "io",
+    "jdk.FileWrite": "io",
+    "jdk.SQLExecution": "io",
+    "jdk.ThreadStuck": "stuck",
+}
+
+# Bucket row layout: event count, longest GC pause (ms, -1 = no GC), then one count per thread state
+_EVENTS = 0
+_GC_PAUSE = 1
+_STATE_SLOT = {state: 2 + i for i, state in enumerate(THREAD_STATES)}
+_SLOT_OF_TYPE = {event_type: _STATE_SLOT[state] for event_type, state in _STATE_OF_TYPE.items()}
+
+
+def chart_points(points=None):
+    """Point budget of each report chart: `points`, else $REPORT_CHART_POINTS (default 500)."""
+    if points is None:
+        points = int(os.getenv("REPORT_CHART_POINTS", DEFAULT_CHART_POINTS))
+    return max(3, points)
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of (x, y) points sorted by x to `threshold`
+    points: keeps the first and last point and, from each bucket in between, the point that
+    makes the largest triangle with the previously kept point and the next bucket's average,
+    so peaks and the overall shape survive.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        next_bucket = points[avg_start:avg_end]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+        ax, ay = points[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def minmax_downsample(points, threshold):
+    """
+    Min/max bucketing of (x, y) points sorted by x to at most `threshold` points: each of
+    threshold // 2 equal buckets keeps its lowest and highest point, in x order, so the
+    envelope of a noisy series (its spikes and dips) is drawn exactly.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 2:
+        return list(points)
+    buckets = threshold // 2
+    sampled = []
+    for b in range(buckets):
+        chunk = points[b * n // buckets:(b + 1) * n // buckets]
+        lo = min(chunk, key=itemgetter(1))
+        hi = max(chunk, key=itemgetter(1))
+        if lo is hi:
+            sampled.append(lo)
+        else:
+            sampled.extend((lo, hi) if lo[0] <= hi[0] else (hi, lo))
+    return sampled
+
+
+def mean_downsample(keys, columns, threshold, first=None, last=None):
+    """
+    Averages sparse columns, given at sorted integer `keys` (missing keys count as 0), over at
+    most `threshold` equal key ranges between `first` and `last` (default: the first and last
+    key). Returns (first key of each range, averaged columns); work and memory depend on the
+    number of keys and the threshold, never on the span.
+    """
+    first = keys[0] if first is None else first
+    last = keys[-1] if last is None else last
+    span = last - first + 1
+    groups = min(threshold, span)
+    starts = [first - (-g * span // groups) for g in range(groups + 1)]
+    sums = [[0.0] * groups for _ in columns]
+    for i, key in enumerate(keys):
+        g = (key - first) * groups // span
+        for column, total in zip(columns, sums):
+            total[g] += column[i]
+    return starts[:-1], [[total[g] / (starts[g + 1] - starts[g]) for g in range(groups)] for total in sums]
+
+
+class TimeSeriesCollector:
+    """
+    Bounded-memory time series of a recording for report charts, built in the same pass as the
+    summary: per time bucket, the event count, the longest GC pause and the number of events
+    in each thread state (THREAD_STATES, from the event type).
+
+    Buckets start `resolution_ms` wide; whenever more than `max_buckets` would be needed, the
+    width doubles and neighbouring buckets are merged, so memory stays fixed however long the
+    recording is (a 12-hour recording ends up with buckets of a few seconds). series() then
+    downsamples the buckets to the chart point budget.
+    """
+
+    def __init__(self, max_buckets=None, resolution_ms=DEFAULT_RESOLUTION_MS):
+        if max_buckets is None:
+            max_buckets = int(os.getenv("REPORT_MAX_BUCKETS", DEFAULT_MAX_BUCKETS))
+        self.max_buckets = max(2, max_buckets)
+        self.width_ns = max(1, int(resolution_ms * 1_000_000))
+        self.buckets = {}
+        self.num_events = 0
+        self.untimed = 0
+
+    def _coarsen(self):
+        self.width_ns *= 2
+        merged = {}
+        for key, row in self.buckets.items():
+            target = merged.get(key // 2)
+            if target is None:
+                merged[key // 2] = row
+                continue
+            target[_EVENTS] += row[_EVENTS]
+            target[_GC_PAUSE] = max(target[_GC_PAUSE], row[_GC_PAUSE])
+            for i in range(2, len(row)):
+                target[i] += row[i]
+        self.buckets = merged
+
+    def add(self, e):
+        self.num_events += 1
+        event_type, fields = _event_fields(e)
+        start = timestamp_ns(fields.get("startTime"))
+        if start == NAT_NS:
+            self.untimed += 1
+            return
+        key = start // self.width_ns
+        row = self.buckets.get(key)
+        while row is None and len(self.buckets) >= self.max_buckets:
+            self._coarsen()
+            key = start // self.width_ns
+            row = self.buckets.get(key)
+        if row is None:
+            row = self.buckets[key] = [0, -1.0] + [0] * len(THREAD_STATES)
+        row[_EVENTS] += 1
+        slot = _SLOT_OF_TYPE.get(event_type)
+        if slot is not None:
+            row[slot] += 1
+        if isinstance(event_type, str) and event_type.startswith("jdk.GarbageCollection"):
+            pause = fields.get("longestPause")
+            if pause:
+                pause_ms = pause if isinstance(pause, (int, float)) else to_millis(pause)
+                if not math.isnan(pause_ms) and pause_ms > row[_GC_PAUSE]:
+                    row[_GC_PAUSE] = pause_ms
+
+    def update(self, events):
+        for e in events:
+            self.add(e)
+        return self
+
+    def observe(self, events):
+        """Passes events through unchanged while collecting their time series."""
+        for e in events:
+            self.add(e)
+            yield e
+
+    def series(self, points=None):
+        """
+        The charts' data, downsampled to `points` per series (see chart_points), with times
+        in epoch nanoseconds:
+        - gc_pause_ms: (time, longest GC pause) of buckets with a GC, by LTTB
+        - event_rate: (time, events per second), by min/max bucketing
+        - thread_states: {"times": [...], state: [events per second, ...] for each of
+          THREAD_STATES}, averaged over equal groups of buckets so the stack stays aligned
+        None when no event had a start time.
+        """
+        if not self.buckets:
+            return None
+        points = chart_points(points)
+        # Only the occupied buckets are walked: a recording with a few events hours apart
+        # costs as little as a short one
+        keys = sorted(self.buckets)
+        first, last = keys[0], keys[-1]
+        width = self.width_ns
+        seconds = width / 1e9
+        rows = [self.buckets[key] for key in keys]
+        gc = [(key * width, row[_GC_PAUSE]) for key, row in zip(keys, rows) if row[_GC_PAUSE] >= 0]
+        rate = []
+        previous = None
+        for key, row in zip(keys, rows):
+            if previous is not None and key > previous + 1:
+                # Empty buckets in between drop the rate to zero
+                rate.append(((previous + 1) * width, 0.0))
+                if key > previous + 2:
+                    rate.append(((key - 1) * width, 0.0))
+            rate.append((key * width, row[_EVENTS] / seconds))
+            previous = key
+        state_keys, states = mean_downsample(
+            keys, [[row[_STATE_SLOT[state]] / seconds for row in rows] for state in THREAD_STATES], points)
+        return {
+            "start_ns": first * width,
+            "end_ns": (last + 1) * width,
+            "bucket_seconds": seconds,
+            "points": points,
+            "num_events": self.num_events,
+            "gc_pause_ms": lttb(gc, points),
+            "event_rate": minmax_downsample(rate, points),
+            "thread_states": dict(zip(THREAD_STATES, states), times=[key * width for key in state_keys]),
+        }
@@ -1,6 +1,16 @@
+import datetime
+import math
+import re
+
+_ISO_DURATION = re.compile(r"^PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?$")
+# Missing timestamps use the int64 minimum, the datetime64 NaT sentinel
+NAT_NS = -(1 << 63)
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
 def flatten_dict(d, parent_key='', sep='.'):
     """
     Flattens a nested dictionary for easier serialization or feature engineering.
+    For streams of events, event_schema.EventNormalizer flattens each event type's layout once.
     """
     items = []
     for k, v in d.items():
@@ -16,3 +26,32 @@ def flatten_dict(d, parent_key='', sep='.'):
         else:
             items.append((new_key, v))
     return dict(items)
+
+def to_millis(value):
+    """
+    Converts a duration field to milliseconds. Numeric values are taken as milliseconds (the unit of the pre-extracted JSON snippets);
+    ISO-8601 durations as printed by `jfr print` ("PT0.37S") are converted. Returns NaN otherwise.
+    """
+    if isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        m = _ISO_DURATION.match(value)
+        if m and any(m.groups()):
+            hours, minutes, seconds = m.groups()
+            return (int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds or 0)) * 1000.0
+    return math.nan
+
+def parse_timestamp_ns(value):
+    """Converts an ISO-8601 timestamp string to epoch nanoseconds, or NAT_NS if it can't be parsed."""
+    if not isinstance(value, str):
+        return NAT_NS
+    try:
+        ts = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return NAT_NS
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    delta = ts - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
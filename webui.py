@@ -1,16 +1,32 @@
+import asyncio
+import hashlib
+import html
+import json
 import os
 import tempfile
 
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import (
+    HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse)
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from dotenv import load_dotenv
 
-from jfr_parser import parse_jfr
-from feature_extractor import extract_features
-from llm_prompter import analyze_with_llm
-from report_generator import write_report
+from jfr_parser import iter_jfr_events
+from parse_cache import ParseCache
+from comparison import ProfileStore, compare_profiles, profile_recording, render_comparison
+from llm_prompter import analyze_with_llm, stream_llm, warm_up_local_llms, local_batching_enabled, get_batch_scheduler
+from report_generator import render_report
+from timeseries import TimeSeriesCollector
+from jobs import JobQueue, QueueFullError, DONE, FAILED
+from metrics import REGISTRY, stage
+
+STREAM_POLL_SECONDS = 0.1
+DEFAULT_MAX_UPLOAD_MB = 4096
+# Room for the multipart boundaries, part headers and small form fields around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+MAX_FORM_FIELD_BYTES = 4096
 
 SUPPORTED_LLM_MODELS = [
     ("google/gemma-2b-it", "Gemma 2B (Google, Efficient)"),
@@ -19,6 +35,13 @@ SUPPORTED_LLM_MODELS = [
     ("meta-llama/Llama-2-7b-chat-hf", "Llama-2 7B Chat"),
 ]
 
+# Re-uploads of the same recording reuse its decoded events (see parse_cache)
+parse_cache = ParseCache()
+# Analyses run in the background so uploads never block the event loop
+job_queue = JobQueue()
+# Compact per-recording aggregates, so /compare never re-parses a recording
+profile_store = ProfileStore()
+
 app = FastAPI(
     title="LLM JFR Analyzer Web UI",
     description="Analyze Java Flight Recorder (.jfr, .json) files with a local or cloud LLM, via web interface."
@@ -30,6 +53,23 @@ app.add_middleware(
     allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
+@app.on_event("startup")
+def warm_up_models():
+    """
+    Optionally preloads local models so the first request doesn't pay the weight load.
+    LOCAL_LLM_WARMUP is a comma-separated list of supported model names, or "1" for LOCAL_LLM_MODEL.
+    """
+    load_dotenv()
+    requested = os.getenv("LOCAL_LLM_WARMUP", "").strip()
+    if not requested or requested.lower() in ("0", "false", "no"):
+        return
+    allowed_models = [m[0] for m in SUPPORTED_LLM_MODELS]
+    if requested.lower() in ("1", "true", "yes"):
+        names = [os.getenv("LOCAL_LLM_MODEL", allowed_models[0])]
+    else:
+        names = [name.strip() for name in requested.split(",")]
+    warm_up_local_llms([name for name in names if name in allowed_models])
+
 def render_llm_model_select(selected="google/gemma-2b-it"):
     html = '<label for="llmmodel">LLM Model (local, supported for JVM diagnostics):</label><br>'
     html += '<select id="llmmodel" name="llmmodel">'
@@ -52,6 +92,8 @@ async def index():
                 {render_llm_model_select()}
                 <label for="chunkthresh">Chunking Threshold (MB, for large .jfrs):</label><br>
                 <input type="number" id="chunkthresh" name="chunkthresh" value="50" min="1" max="1024" step="1"><br>
+                <label for="workers">Parallel Chunk Workers:</label><br>
+                <input type="number" id="workers" name="workers" value="1" min="1" max="64" step="1"><br>
                 <label>
                     <input type="checkbox" name="uselocal" value="1" checked> Use Local LLM (no API key required)
                 </label><br><br>
@@ -62,44 +104,370 @@ async def index():
     </html>
     """
 
+def _count_events(job, events):
+    """Passes events through while publishing a running count as job progress."""
+    count = 0
+    for e in events:
+        count += 1
+        if count % 10000 == 0:
+            job.progress["events_parsed"] = count
+        yield e
+    job.progress["events_parsed"] = count
+
+def run_analysis(job, tmp_path, content_digest, chunkthresh, workers, use_local, model_name):
+    """
+    Background body of an /analyze job: parse + extract features, then query the LLM,
+    each inside its own concurrency-limited stage. The findings are streamed into job.output
+    as they are generated (see /jobs/{id}/stream). The Markdown and HTML reports are rendered
+    in memory and served from the job result.
+    """
+    timeline = TimeSeriesCollector()
+    try:
+        with job_queue.stage(job, "parsing"):
+            events = iter_jfr_events(
+                tmp_path, chunking_threshold_mb=chunkthresh, workers=workers,
+                cache=parse_cache, content_digest=content_digest)
+            with stage("extract"):
+                summary, profile = profile_recording(timeline.observe(_count_events(job, events)))
+    finally:
+        os.remove(tmp_path)
+    profile_id = ProfileStore.key_for(content_digest)
+    try:
+        profile_store.put(profile_id, profile)
+    except OSError as e:
+        print(f"Could not store the recording profile: {e}")
+        profile_id = None
+    with job_queue.stage(job, "analyzing"):
+        for piece in stream_llm(summary, use_local=use_local, model_name=model_name):
+            job.output.append(piece)
+        findings = "".join(job.output).strip()
+    with stage("report_write"):
+        report = render_report(findings)
+        html_report = render_report(findings, "html", timeline.series())
+    return {"findings": findings, "report": report, "html_report": html_report, "profile_id": profile_id}
+
+class UploadTooLargeError(ValueError):
+    """Raised while spooling an upload that exceeds MAX_UPLOAD_MB."""
+
+class UploadFormatError(ValueError):
+    """Raised for an /analyze request that isn't a well-formed multipart upload."""
+
+def max_upload_bytes():
+    return int(float(os.getenv("MAX_UPLOAD_MB", DEFAULT_MAX_UPLOAD_MB)) * 1024 * 1024)
+
+def _upload_suffix(filename):
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return suffix if suffix in (".jfr", ".json") else ""
+
+async def spool_upload(request, max_bytes, file_field="jfrfile"):
+    """
+    Streams a multipart/form-data request body from the socket through a streaming multipart
+    parser: the `file_field` part goes straight to a temp file in the blocks the client sends,
+    hashed on the way, so the recording is never buffered by the framework, held in memory or
+    copied twice, and never has to be re-read to key the parse cache. The .jfr/.json extension
+    is kept so the parser picks the right decoder. Bytes are counted while writing, and the
+    upload is aborted with UploadTooLargeError as soon as the file passes max_bytes.
+    Returns (other form fields as str, path, sha256 hex digest, size in bytes); path is None
+    when the request has no file part. Raises UploadFormatError for a non-multipart body or a
+    repeated file part.
+    """
+    from python_multipart import MultipartParser
+    from python_multipart.multipart import parse_options_header
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise UploadFormatError("Expected a multipart/form-data upload")
+
+    fields = {}
+    digest = hashlib.sha256()
+    state = {"tmp": None, "size": 0, "name": None, "header": b"", "value": b"", "headers": {}, "data": []}
+    pending = []
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["name"] = None
+        state["data"] = []
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header"].lower()] = state["value"]
+        state["header"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        state["name"] = disposition.get(b"name", b"").decode("utf-8", "replace")
+        if state["name"] == file_field:
+            if state["tmp"] is not None:
+                # A second file part would be appended to the first one's spool file and digest
+                raise UploadFormatError(f"Only one {file_field} file can be uploaded")
+            filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+            state["tmp"] = tempfile.NamedTemporaryFile(delete=False, suffix=_upload_suffix(filename))
+
+    def on_part_data(data, start, end):
+        if state["name"] == file_field:
+            state["size"] += end - start
+            if state["size"] > max_bytes:
+                raise UploadTooLargeError(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+            block = bytes(data[start:end])
+            digest.update(block)
+            pending.append(block)
+        elif sum(map(len, state["data"])) < MAX_FORM_FIELD_BYTES:
+            state["data"].append(bytes(data[start:end]))
+
+    def on_part_end():
+        if state["name"] != file_field and state["name"]:
+            fields[state["name"]] = b"".join(state["data"])[:MAX_FORM_FIELD_BYTES].decode("utf-8", "replace")
+
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data, "on_part_end": on_part_end})
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except (UploadTooLargeError, UploadFormatError):
+                raise
+            except Exception as e:
+                raise UploadFormatError(f"Malformed multipart upload: {e}") from e
+            if pending:
+                # File writes happen off the event loop, one client chunk at a time
+                await run_in_threadpool(state["tmp"].write, b"".join(pending))
+                pending.clear()
+        parser.finalize()
+        if state["tmp"] is not None:
+            state["tmp"].close()
+    except BaseException:
+        if state["tmp"] is not None:
+            state["tmp"].close()
+            os.remove(state["tmp"].name)
+        raise
+    path = state["tmp"].name if state["tmp"] is not None else None
+    return fields, path, digest.hexdigest(), state["size"]
+
+def _form_int(fields, name, default):
+    try:
+        return int(fields.get(name, default))
+    except ValueError:
+        return default
+
+def _too_large_response(message):
+    return HTMLResponse(
+        f"<html><body><h2>File too large</h2><p>{html.escape(message)}</p><a href=\"/\">Back</a></body></html>",
+        status_code=413
+    )
+
+def _queue_full_response():
+    return HTMLResponse(
+        "<html><body><h2>Server busy</h2><p>Too many analyses are queued right now. "
+        "Please retry in a minute.</p><a href=\"/\">Back</a></body></html>",
+        status_code=429, headers={"Retry-After": "30"}
+    )
+
+def _bad_upload_response(message):
+    return HTMLResponse(
+        f"<html><body><h2>Bad upload</h2><p>{html.escape(message)}</p><a href=\"/\">Back</a></body></html>",
+        status_code=400
+    )
+
 @app.post("/analyze")
-async def analyze_jfr(
-    jfrfile: UploadFile = File(...),
-    llmmodel: str = Form("google/gemma-2b-it"),
-    chunkthresh: int = Form(50),
-    uselocal: str = Form("1")
-):
+async def analyze_jfr(request: Request):
+    """
+    Queues an analysis and redirects to its status page; the work itself runs on job_queue.
+    Takes a multipart form with a `jfrfile` file and optional llmmodel, chunkthresh, workers
+    and uselocal fields. The body is read straight from the request stream (see spool_upload).
+    Returns 429 when the queue is full and 413 when the upload exceeds MAX_UPLOAD_MB, before
+    reading the body when Content-Length already says so.
+    """
     # Load environment
     load_dotenv()
 
-    # Set local LLM/model config for this run - only accept supported!
-    if uselocal in ("1", "true", "yes", "on"):
-        os.environ["USE_LOCAL_LLM"] = "1"
-        # Ensure only supported models are allowed
-        allowed_models = [m[0] for m in SUPPORTED_LLM_MODELS]
-        model_to_use = llmmodel if llmmodel in allowed_models else allowed_models[0]
-        os.environ["LOCAL_LLM_MODEL"] = model_to_use
-    else:
-        os.environ["USE_LOCAL_LLM"] = "0"
+    # Reject early, before spending time on the upload
+    if not job_queue.has_capacity():
+        return _queue_full_response()
 
-    # Save uploaded JFR to a temp file
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        content = await jfrfile.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    limit = max_upload_bytes()
+    try:
+        content_length = int(request.headers.get("content-length", ""))
+    except ValueError:
+        content_length = None
+    if content_length is not None and content_length > limit + MULTIPART_OVERHEAD_BYTES:
+        return _too_large_response(f"Upload exceeds the {limit // (1024 * 1024)} MB limit")
 
+    # Stream the uploaded JFR to a temp file, hashing as we go
     try:
-        events = parse_jfr(tmp_path, chunking_threshold_mb=chunkthresh)
-        summary = extract_features(events)
-        findings = analyze_with_llm(summary)
-        # Write findings to a temp markdown file for download
-        report_path = tmp_path + "_report.md"
-        write_report(findings, report_path)
-        with open(report_path, "r", encoding="utf-8") as f:
-            report_md = f.read()
-    finally:
+        fields, tmp_path, content_digest, _ = await spool_upload(request, limit)
+    except UploadTooLargeError as e:
+        return _too_large_response(str(e))
+    except UploadFormatError as e:
+        return _bad_upload_response(str(e))
+    if tmp_path is None:
+        return _bad_upload_response("No jfrfile was uploaded")
+
+    # Local LLM/model config for this run - only accept supported!
+    use_local = fields.get("uselocal", "1") in ("1", "true", "yes", "on")
+    # Ensure only supported models are allowed
+    allowed_models = [m[0] for m in SUPPORTED_LLM_MODELS]
+    llmmodel = fields.get("llmmodel", allowed_models[0])
+    model_to_use = llmmodel if llmmodel in allowed_models else allowed_models[0]
+    chunkthresh = _form_int(fields, "chunkthresh", 50)
+    # Client-supplied: never more chunk workers than this machine has CPUs
+    workers = max(1, min(_form_int(fields, "workers", 1), os.cpu_count() or 1))
+
+    try:
+        job = job_queue.submit(
+            run_analysis, tmp_path, content_digest, chunkthresh, workers, use_local, model_to_use if use_local else None)
+    except QueueFullError:
         os.remove(tmp_path)
+        return _queue_full_response()
+    return RedirectResponse(f"/jobs/{job.id}/view", status_code=303)
+
+def _get_job_or_404(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """JSON status of a job: queued/running/done/failed, current stage and progress counters."""
+    job = _get_job_or_404(job_id)
+    status = job.to_dict()
+    status["queue_length"] = job_queue.queued()
+    return JSONResponse(status)
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """
+    JSON findings of a finished job; 409 while it is still queued or running. A failed job is
+    a result too: 200 with status "failed" and its error.
+    """
+    job = _get_job_or_404(job_id)
+    if job.status == FAILED:
+        return JSONResponse({"id": job.id, "status": job.status, "error": job.error})
+    if not job.finished:
+        return JSONResponse({"id": job.id, "status": job.status, "stage": job.stage}, status_code=409)
+    return JSONResponse({
+        "id": job.id,
+        "status": job.status,
+        "findings": job.result["findings"],
+        "report_url": f"/jobs/{job.id}/report",
+        "html_report_url": f"/jobs/{job.id}/report.html",
+        "profile_id": job.result.get("profile_id")
+    })
+
+def _get_finished_job(job_id):
+    job = _get_job_or_404(job_id)
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail="Job has not finished")
+    return job
+
+@app.get("/jobs/{job_id}/report")
+def job_report(job_id: str):
+    """The Markdown report, straight from memory."""
+    job = _get_finished_job(job_id)
+    return Response(
+        job.result["report"], media_type="text/markdown",
+        headers={"Content-Disposition": 'attachment; filename="jfr_report.md"'})
+
+@app.get("/jobs/{job_id}/report.html", response_class=HTMLResponse)
+def job_html_report(job_id: str):
+    """The self-contained HTML report with GC-pause, event-rate and thread-state charts."""
+    job = _get_finished_job(job_id)
+    return HTMLResponse(job.result["html_report"])
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _job_events(job):
+    sent = 0
+    last_status = None
+    while True:
+        finished = job.finished
+        status = {"status": job.status, "stage": job.stage, "progress": dict(job.progress)}
+        if status != last_status:
+            yield _sse("status", status)
+            last_status = status
+        while sent < len(job.output):
+            yield _sse("token", job.output[sent])
+            sent += 1
+        if finished:
+            break
+        await asyncio.sleep(STREAM_POLL_SECONDS)
+    if job.status == FAILED:
+        yield _sse("error", {"error": job.error})
+    else:
+        yield _sse("done", {"report_url": f"/jobs/{job.id}/report"})
+
+@app.get("/jobs/{job_id}/stream")
+def job_stream(job_id: str):
+    """
+    Server-Sent Events for a job: "status" on every stage/progress change, "token" for each
+    piece of LLM output as it is generated, then a final "done" (with the report URL) or "error".
+    Connecting late replays the output generated so far.
+    """
+    job = _get_job_or_404(job_id)
+    return StreamingResponse(
+        _job_events(job), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
+@app.get("/jobs/{job_id}/view", response_class=HTMLResponse)
+def job_view(job_id: str):
+    job = _get_job_or_404(job_id)
+    if job.status == FAILED:
+        return HTMLResponse(f"""
+    <html>
+    <head><title>LLM JFR Analyzer Results</title></head>
+    <body style="font-family:sans-serif; margin:2em;">
+        <h2>Analysis Failed</h2>
+        <pre>{html.escape(job.error or "")}</pre>
+        <a href="/">Analyze another file</a>
+    </body>
+    </html>
+    """, status_code=500)
+    if not job.finished:
+        events_parsed = job.progress.get("events_parsed")
+        progress = f"<p>Events parsed so far: {events_parsed}</p>" if events_parsed is not None else ""
+        return HTMLResponse(f"""
+    <html>
+    <head>
+    <title>LLM JFR Analyzer - Job {job.id}</title>
+    <noscript><meta http-equiv="refresh" content="2"></noscript>
+    <style>
+        pre {{ background:#eee; padding:1em; white-space:pre-wrap; }}
+    </style>
+    </head>
+    <body style="font-family:sans-serif; margin:2em;">
+        <h2>Analysis in progress</h2>
+        <p id="status">Job <code>{job.id}</code> is {job.status}{f" ({job.stage})" if job.stage else ""}.</p>
+        <div id="progress">{progress}</div>
+        <pre id="findings"></pre>
+        <script>
+            const source = new EventSource("/jobs/{job.id}/stream");
+            const findings = document.getElementById("findings");
+            source.addEventListener("status", (e) => {{
+                const s = JSON.parse(e.data);
+                document.getElementById("status").textContent =
+                    "Job {job.id} is " + s.status + (s.stage ? " (" + s.stage + ")" : "") + ".";
+                if (s.progress.events_parsed !== undefined) {{
+                    document.getElementById("progress").textContent = "Events parsed so far: " + s.progress.events_parsed;
+                }}
+            }});
+            source.addEventListener("token", (e) => {{ findings.textContent += JSON.parse(e.data); }});
+            source.addEventListener("done", () => {{ source.close(); location.reload(); }});
+            source.addEventListener("error", () => {{ source.close(); location.reload(); }});
+        </script>
+    </body>
+    </html>
+    """)
+
+    findings = html.escape(job.result["findings"])
     # Present result as HTML, link to download markdown
     return HTMLResponse(f"""
     <html>
@@ -115,7 +483,8 @@ async def analyze_jfr(
         <h2>Analysis Results</h2>
         <div class="box"><pre>{findings}</pre></div>
         <h3>Download</h3>
-        <a href="/download?path={report_path}" download="jfr_report.md">Download Report as Markdown</a><br>
+        <a href="/jobs/{job.id}/report.html">View Report with Timeline Charts</a><br>
+        <a href="/jobs/{job.id}/report" download="jfr_report.md">Download Report as Markdown</a><br>
         <a href="/">Analyze another file</a>
         <br>
         <p><small>Note: If your file was larger than the chosen threshold, it was automatically chunked (via <code>jfr disassemble</code>) and the result aggregated for analysis.</small></p>
@@ -123,6 +492,42 @@ async def analyze_jfr(
     </html>
     """)
 
-@app.get("/download")
-def download(path: str):
-    return FileResponse(path, filename="jfr_report.md", media_type="text/markdown")
+@app.get("/stats/inference")
+def inference_stats():
+    """Queue depth and batch-size statistics of the local-model batch scheduler."""
+    if not local_batching_enabled():
+        return JSONResponse({"batching": False})
+    stats = get_batch_scheduler().stats()
+    stats["batching"] = True
+    return JSONResponse(stats)
+
+def _get_profile_or_404(profile_id):
+    try:
+        profile = profile_store.get(profile_id)
+    except ValueError:
+        profile = None
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile id {profile_id}")
+    return profile
+
+@app.get("/compare")
+async def compare(current: str, baseline: str, analyze: bool = False):
+    """
+    Statistically significant differences between two analyzed recordings, identified by the
+    profile_id of their /jobs/{id}/result. Uses the stored profiles only, so nothing is re-parsed.
+    With analyze=true, the differences (and nothing else) are also sent to the LLM.
+    """
+    current_profile = _get_profile_or_404(current)
+    baseline_profile = _get_profile_or_404(baseline)
+    differences = compare_profiles(current_profile, baseline_profile)
+    summary = render_comparison(differences, current_profile, baseline_profile).strip()
+    result = {"differences": differences, "summary": summary}
+    if analyze and differences:
+        load_dotenv()
+        result["findings"] = await run_in_threadpool(analyze_with_llm, summary)
+    return JSONResponse(result)
+
+@app.get("/metrics")
+def metrics():
+    """Per-stage timings, peak RSS, event and token counts in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.prometheus_text(), media_type="text/plain; version=0.0.4")